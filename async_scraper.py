@@ -0,0 +1,197 @@
+import asyncio
+import inspect
+
+from scraper import ESSScraper, FETCH_MONTHS_JS, complete_months, scrape_step
+from fingerprint import ScheduleUnchanged
+from portal import is_outage
+from metrics import BROWSER_LAUNCHES
+from tracing import span
+
+
+class AsyncESSScraper(ESSScraper):
+    """
+    ESSScraper on playwright.async_api, used by the async pipeline.
+    stream_schedule() yields each month's shifts as soon as that month is parsed
+    instead of returning everything at the end, so syncing can start while the
+    remaining months are still loading. The browser is closed after every run.
+    Given a running `browser` (fleet mode), it only opens and closes its own
+    isolated context in it. The ESS page sequence is ESSScraper's page scripts;
+    only running them (_drive) and the month streaming are async here.
+    """
+
+    def __init__(self, *args, browser=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.browser = browser
+
+    async def scrape_schedule(self):
+        """Collects the whole stream, same result as ESSScraper.scrape_schedule()."""
+        return self._merge([events async for events in self.stream_schedule()])
+
+    async def stream_schedule(self):
+        """Async generator of event dict lists, one per month view, without duplicates."""
+        # Playwright is the heaviest import we have, only pay for it when a browser is needed
+        from playwright.async_api import async_playwright
+
+        if self.request_filter:
+            self.request_filter.reset()
+        seen = set()
+        total = months = 0
+        self.months, self._parsed = (), []
+        if self.portal:
+            # The probe blocks, keep the event loop (and the Calendar prefetch) going meanwhile
+            await asyncio.to_thread(self.portal.check)
+
+        playwright = browser = context = None
+        if self.browser is None:
+            # A shared browser (fleet) is measured and recycled by its own governor
+            self.governor.start_run()
+        try:
+            if self.browser is None:
+                playwright = await async_playwright().start()
+                self.logger.info(f"Launching Browser (Headless: {self.headless}, Profile: {self.profile_mode})")
+                with span("browser.launch", profile=self.profile_mode):
+                    browser, context = await self._launch(playwright)
+                BROWSER_LAUNCHES.inc()
+            else:
+                with span("browser.new_context"):
+                    context = await self._new_context(self.browser, self._load_session())
+            await self.governor.attach_async(context)
+            if self.request_filter:
+                await self.request_filter.attach_async(context)
+
+            page = context.pages[0] if context.pages else await context.new_page()
+            if not await self._drive(page, self._open_schedule(context)):
+                return
+
+            if self.portal:
+                self.portal.succeeded()
+            pages = self._with_next_months(await page.content(), page)
+            if self.fingerprints:
+                # Nothing may be synced before we know whether any month changed
+                with scrape_step("fetch"):
+                    fetched = [html async for html in pages]
+                self.fingerprints.check(fetched, force=self.force)
+                pages = _replay(fetched)
+
+            async for html in pages:
+                events = self._fresh(self._parse_calendar(html), seen)
+                months += 1
+                total += len(events)
+                if events:
+                    yield events
+            self.months = complete_months(self._parsed, self.months_ahead)
+            self.logger.info(f"Scraped {total} events across {months} month(s).")
+
+        except ScheduleUnchanged:
+            raise
+        except Exception as e:
+            self.logger.error(f"Scrape Error: {e}")
+            if self.portal and is_outage(e):
+                self.portal.failed(f"{type(e).__name__}: {e}")
+        finally:
+            self.governor.end_run()
+            if self.request_filter:
+                self.logger.info(self.request_filter.summary())
+            for closer in (context.close if context else None, browser.close if browser else None,
+                           playwright.stop if playwright else None):
+                if closer:
+                    try:
+                        await closer()
+                    except Exception as e:
+                        self.logger.debug(f"Ignoring error while closing browser: {e}")
+
+    def _fresh(self, events, seen):
+        """Drops shifts an earlier month view already produced."""
+        fresh = []
+        for evt in events:
+            if evt not in seen:
+                seen.add(evt)
+                fresh.append(evt)
+        return fresh
+
+    async def _launch(self, p):
+        args = self.governor.launch_args
+        viewport = self.governor.viewport
+        session = self._load_session()
+
+        if self.profile_mode == "ephemeral":
+            browser = await p.chromium.launch(headless=self.headless, args=args)
+            return browser, await self._new_context(browser, session)
+
+        if self.profile_mode == "pruned":
+            self._prune_profile()
+        context = await p.chromium.launch_persistent_context(
+            self.user_data_dir,
+            headless=self.headless,
+            args=args,
+            viewport=viewport
+        )
+        cookies = session.get("state", {}).get("cookies")
+        if cookies:
+            await context.add_cookies(cookies)
+        return None, context
+
+    async def _new_context(self, browser, session):
+        return await browser.new_context(viewport=self.governor.viewport, storage_state=session.get("state"))
+
+    async def _drive(self, page, steps):
+        """Runs a page script (see scraper.run_steps) on this engine's async page."""
+        return await run_steps_async(page, steps)
+
+    async def _with_next_months(self, html, page):
+        """
+        Yields `html`, then the next `months_ahead` month views in the order they arrive.
+        Postback months are all requested at once; if any of them fails, the months
+        are clicked through one at a time instead (repeats are dropped by _fresh).
+        """
+        yield html
+        if self.months_ahead <= 0:
+            return
+
+        href, postback = await self._drive(page, self._month_links())
+        if not href:
+            return
+        if postback:
+            target, args = postback
+            self.logger.info(f"Fetching {len(args)} more month(s) concurrently...")
+            fetches = [asyncio.ensure_future(page.evaluate(FETCH_MONTHS_JS, [target, [arg]])) for arg in args]
+            failed = False
+            for fetch in asyncio.as_completed(fetches):
+                try:
+                    yield (await fetch)[0]
+                except Exception as e:
+                    self.logger.warning(f"Month fetch failed: {e}")
+                    failed = True
+            if not failed:
+                return
+            self.logger.warning("Clicking through the months instead.")
+
+        for _ in range(self.months_ahead):
+            html, href = await self._drive(page, self._next_month(href))
+            if html is None:
+                break
+            yield html
+            if not href:
+                break
+
+
+async def run_steps_async(page, steps):
+    """scraper.run_steps() for a playwright.async_api page: steps returning awaitables are awaited."""
+    value = error = None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        value = error = None
+        try:
+            value = step(page)
+            if inspect.isawaitable(value):
+                value = await value
+        except Exception as e:
+            error = e
+
+
+async def _replay(items):
+    for item in items:
+        yield item
@@ -0,0 +1,179 @@
+"""
+Offline end-to-end benchmark: the whole bot against local stand-in servers.
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --shifts 10 1000 --latency 0.05 --rate-limit 0.002 --conflicts 0.01
+    python benchmarks/bench_e2e.py --save e2e_baseline.json
+    python benchmarks/bench_e2e.py --baseline e2e_baseline.json --tolerance 0.25
+
+For every schedule size a fake ESS portal (benchmarks/fake_ess.py) and a fake
+Calendar API (benchmarks/fake_calendar.py) are started and `python main.py
+--json` runs against them (ESS_URL / GCAL_API_URL) from a scratch folder,
+three times in a row:
+
+    cold       empty calendar and ledger, every shift is inserted
+    repeat     --force on the same schedule, the ledger answers every shift
+    unchanged  no --force, the schedule fingerprints end the run after fetching
+
+Each phase reports wall time (one full sync's latency) and shifts per second.
+A run fails if the bot exits non-zero or the cold run didn't leave exactly
+the scraped shifts in the calendar. With --baseline, a phase more than
+--tolerance slower than the saved result fails too, so performance changes
+can be gated on it (exit code 1).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_ess import FakeESSServer
+from benchmarks.fake_calendar import FakeCalendarServer
+
+PHASES = (("cold", []), ("repeat", ["--force"]), ("unchanged", []))
+# At most one shift a day per month view, every month has at least 28 days
+SHIFTS_PER_MONTH = 28
+LOGIN = {"ESS_VENUE_ID": "1000", "ESS_USERNAME": "user", "ESS_PASSWORD": "1234"}
+
+
+def bot_env(ess, calendar, months, workdir, args):
+    """Environment for main.py; every setting that matters is pinned so a local .env can't leak in."""
+    return dict(
+        os.environ, **LOGIN,
+        ESS_URL=ess.url, GCAL_API_URL=calendar.url,
+        GOOGLE_CALENDAR_ID="primary", ICS_FILE="",
+        SCRAPER_ENGINE=args.engine, SYNC_PIPELINE=args.pipeline, HEADLESS="True",
+        SYNC_MONTHS_AHEAD=str(months - 1), GCAL_MAX_QPS=str(args.qps), GCAL_INCREMENTAL="False",
+        SYNC_LEDGER="True", SKIP_UNCHANGED="True", ESS_PROBE="True", ESS_BREAKER="False",
+        METRICS_TEXTFILE="", TRACE_DIR="", LOG_FILE=os.path.join(workdir, "bot.log"),
+    )
+
+
+def run_phase(phase, flags, env, workdir, calendar):
+    before = dict(calendar.stats)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "--json"] + flags,
+                          cwd=workdir, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    summary = {}
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('{"type": "summary"'):
+            summary = json.loads(line)
+            break
+    return {
+        "phase": phase,
+        "seconds": elapsed,
+        "exit_code": proc.returncode,
+        "events": summary.get("events", 0),
+        "counts": summary.get("counts", {}),
+        "error": summary.get("error") or (None if summary else (proc.stderr.strip().splitlines() or ["no output"])[-1]),
+        "calendar_requests": calendar.stats["requests"] - before["requests"],
+        "calendar_calls": calendar.stats["calls"] - before["calls"],
+    }
+
+
+def run_size(shifts, args):
+    """All phases for one schedule size, on fresh servers and a fresh folder. Returns the phase results."""
+    months = max(1, -(-shifts // SHIFTS_PER_MONTH))
+    ess = FakeESSServer(shifts_per_month=min(shifts, SHIFTS_PER_MONTH), total_shifts=shifts,
+                        latency=args.ess_latency).start()
+    calendar = FakeCalendarServer(latency=args.latency, call_latency=args.call_latency,
+                                  conflict_rate=args.conflicts, rate_limit_rate=args.rate_limit).start()
+    workdir = tempfile.mkdtemp(prefix="abi_bot_e2e_")
+    try:
+        env = bot_env(ess, calendar, months, workdir, args)
+        results = []
+        for phase, flags in PHASES:
+            result = run_phase(phase, flags, env, workdir, calendar)
+            result["shifts"] = shifts
+            if result["exit_code"] != 0:
+                result["failed"] = f"exit code {result['exit_code']}: {result['error']}"
+            elif phase == "cold" and (result["events"] != shifts or len(calendar.events()) != shifts):
+                result["failed"] = (f"scraped {result['events']}, calendar holds {len(calendar.events())}, "
+                                    f"expected {shifts}")
+            results.append(result)
+        return results
+    finally:
+        ess.stop()
+        calendar.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def median_results(runs):
+    """Collapses repeated runs of the same phases into one result each, with the median time."""
+    merged = []
+    for samples in zip(*runs):
+        result = dict(samples[0])
+        result["seconds"] = statistics.median(s["seconds"] for s in samples)
+        failed = [s["failed"] for s in samples if s.get("failed")]
+        if failed:
+            result["failed"] = failed[0]
+        merged.append(result)
+    return merged
+
+
+def regressions(results, baseline, tolerance):
+    saved = {(r["shifts"], r["phase"]): r for r in baseline}
+    found = []
+    for r in results:
+        old = saved.get((r["shifts"], r["phase"]))
+        if old and not r.get("failed") and r["seconds"] > old["seconds"] * (1 + tolerance):
+            found.append(f"{r['shifts']} shifts / {r['phase']}: {r['seconds']:.2f}s vs {old['seconds']:.2f}s "
+                         f"(+{(r['seconds'] / old['seconds'] - 1) * 100:.0f}%)")
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the whole bot against local fake ESS and Calendar servers.")
+    ap.add_argument("--shifts", type=int, nargs="+", default=[10, 1000, 10000])
+    ap.add_argument("--runs", type=int, default=1, help="repeat every size, report the median")
+    ap.add_argument("--engine", choices=["http", "playwright"], default="http")
+    ap.add_argument("--pipeline", choices=["sequential", "async"], default="sequential")
+    ap.add_argument("--qps", type=float, default=1000.0,
+                    help="GCAL_MAX_QPS for the bot (the real default, 10, would only measure the pacing)")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every Calendar request")
+    ap.add_argument("--call-latency", type=float, default=0.0, help="seconds added to every call in a batch")
+    ap.add_argument("--conflicts", type=float, default=0.0, help="share of inserts answered 409")
+    ap.add_argument("--rate-limit", type=float, default=0.0,
+                    help="share of Calendar calls answered 429 (keep it small, the bot halves its pace "
+                         "for every limited batch)")
+    ap.add_argument("--ess-latency", type=float, default=0.0, help="seconds added to every ESS page")
+    ap.add_argument("--save", help="write results as JSON")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against --baseline")
+    args = ap.parse_args()
+
+    results = []
+    for shifts in args.shifts:
+        results.extend(median_results([run_size(shifts, args) for _ in range(args.runs)]))
+
+    print(f"{'shifts':>7}  {'phase':<10}{'seconds':>9}{'shifts/s':>10}{'API reqs':>10}{'API calls':>10}  result")
+    print("-" * 72)
+    for r in results:
+        rate = r["shifts"] / r["seconds"] if r["seconds"] else 0.0
+        outcome = r.get("failed") or ", ".join(f"{v} {k.lower()}" for k, v in sorted(r["counts"].items())) or "ok"
+        print(f"{r['shifts']:>7}  {r['phase']:<10}{r['seconds']:>9.2f}{rate:>10.0f}"
+              f"{r['calendar_requests']:>10}{r['calendar_calls']:>10}  {outcome}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    problems = [f"{r['shifts']} shifts / {r['phase']}: {r['failed']}" for r in results if r.get("failed")]
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            problems += regressions(results, json.load(f), args.tolerance)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Parser benchmark on synthetic ESS pages.
+
+    python benchmarks/bench_parser.py
+    python benchmarks/bench_parser.py --sizes 1 100 5000 --backends lxml bs4
+    python benchmarks/bench_parser.py --save baseline.json
+    python benchmarks/bench_parser.py --compare baseline.json --tolerance 0.25
+
+Each backend/size pair runs in its own process so peak memory numbers are
+not polluted by earlier runs. Throughput is shifts parsed per second (best
+of --repeat runs); peak memory is the Python heap peak (tracemalloc) and,
+where the OS reports it, the growth in peak RSS, which also covers C parsers.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ess_parser  # noqa: E402
+from benchmarks.ess_pages import schedule  # noqa: E402
+
+DEFAULT_SIZES = [1, 20, 200, 2000, 5000]
+
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset // 1024
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _measure(backend, size, repeat, overnight, malformed, out):
+    pages = schedule(size, overnight_ratio=overnight, malformed_ratio=malformed)
+    htmls = [html for html, _ in pages]
+    expected = sum(n for _, n in pages)
+
+    # Warm up imports so they don't count as parse memory
+    ess_parser.parse_calendar(htmls[0], backend)
+    rss_before = _peak_rss_kb()
+
+    tracemalloc.start()
+    found = sum(len(ess_parser.parse_calendar(html, backend)) for html in htmls)
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _peak_rss_kb()
+
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for html in htmls:
+            ess_parser.parse_calendar(html, backend)
+        best = min(best, time.perf_counter() - t0)
+
+    out.put({
+        "backend": backend,
+        "shifts": expected,
+        "pages": len(htmls),
+        "bytes": sum(len(h) for h in htmls),
+        "correct": found == expected,
+        "seconds": best,
+        "shifts_per_sec": expected / best if best and expected else 0.0,
+        "pages_per_sec": len(htmls) / best if best else 0.0,
+        "heap_peak_kb": heap_peak // 1024,
+        "rss_growth_kb": (rss_after - rss_before) if rss_before is not None else None,
+    })
+
+
+def run(backends, sizes, repeat, overnight, malformed):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for backend in backends:
+        for size in sizes:
+            out = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(backend, size, repeat, overnight, malformed, out))
+            proc.start()
+            results.append(out.get())
+            proc.join()
+    return results
+
+
+def print_table(results):
+    header = f"{'backend':<11}{'shifts':>8}{'pages':>7}{'ms':>10}{'shifts/s':>12}{'heap KB':>10}{'rss KB':>9}  ok"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rss = "-" if r["rss_growth_kb"] is None else r["rss_growth_kb"]
+        print(f"{r['backend']:<11}{r['shifts']:>8}{r['pages']:>7}{r['seconds'] * 1000:>10.2f}"
+              f"{r['shifts_per_sec']:>12.0f}{r['heap_peak_kb']:>10}{rss:>9}  {'yes' if r['correct'] else 'NO'}")
+
+
+def compare(results, baseline_path, tolerance):
+    """Returns the rows whose throughput dropped more than `tolerance` below the baseline."""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["backend"], r["shifts"]): r for r in json.load(f)}
+    regressions = []
+    for r in results:
+        base = baseline.get((r["backend"], r["shifts"]))
+        if base and base["shifts_per_sec"] and r["shifts_per_sec"] < base["shifts_per_sec"] * (1 - tolerance):
+            regressions.append((r, base))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the ESS calendar parser on synthetic pages.")
+    ap.add_argument("--backends", nargs="+", default=None, help="default: every installed backend")
+    ap.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="total shifts per run")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--overnight", type=float, default=0.1, help="share of shifts that cross midnight")
+    ap.add_argument("--malformed", type=float, default=0.05, help="share of broken entries")
+    ap.add_argument("--save", help="write results as JSON")
+    ap.add_argument("--compare", help="baseline JSON from --save; exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs baseline")
+    args = ap.parse_args()
+
+    backends = args.backends or list(ess_parser.available_backends())
+    results = run(backends, args.sizes, args.repeat, args.overnight, args.malformed)
+    print_table(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = any(not r["correct"] for r in results)
+    if args.compare:
+        for r, base in compare(results, args.compare, args.tolerance):
+            failed = True
+            print(f"REGRESSION {r['backend']} @ {r['shifts']} shifts: "
+                  f"{r['shifts_per_sec']:.0f}/s vs baseline {base['shifts_per_sec']:.0f}/s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
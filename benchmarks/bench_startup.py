@@ -0,0 +1,135 @@
+"""
+Cold-start benchmark for the bot's entry points.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --importtime
+
+Every sample is a fresh interpreter, like the tray launching a process.
+"Time to first useful work" is measured up to the point each entry point
+can start doing its job:
+
+    main.py         config loaded, scraper built, Calendar service ready to build
+    tray.py         icon image ready to hand to pystray
+    settings_ui.py  module imported, settings read from .env
+
+The interpreter's own startup ("python") is reported for reference.
+Entry points whose dependencies aren't installed are reported as skipped.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe runs until its entry point could start doing real work, then exits
+PROBES = {
+    "python": "pass",
+    "main.py": (
+        "import main\n"
+        "from utils import load_config\n"
+        "from worker import build_scraper\n"
+        "from gcal import load_discovery_document\n"
+        "build_scraper(load_config())\n"
+        "load_discovery_document()\n"
+    ),
+    "tray.py": (
+        "import tray\n"
+        "tray.create_image(64, 64, 'black', 'orange')\n"
+    ),
+    "settings_ui.py": (
+        "import settings_ui\n"
+        "settings_ui.SettingsApp.load_settings(None)\n"
+    ),
+}
+
+WRAPPER = """
+import sys
+sys.path.insert(0, {root!r})
+{probe}
+"""
+
+DUMMY_ENV = {"ESS_VENUE_ID": "bench", "ESS_USERNAME": "bench", "ESS_PASSWORD": "bench"}
+
+
+def run_probe(name, runs, workdir):
+    code = WRAPPER.format(root=ROOT, probe=PROBES[name])
+    env = dict(os.environ, **DUMMY_ENV)
+    samples = []
+    for _ in range(runs):
+        # Timed from the parent so interpreter startup counts, as it does for the tray
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                              capture_output=True, text=True)
+        elapsed = time.perf_counter() - t0
+        if proc.returncode != 0:
+            last = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            return {"name": name, "skipped": last}
+        samples.append(elapsed)
+    return {
+        "name": name,
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def top_imports(name, workdir, limit):
+    """Slowest imports (cumulative) for an entry point, from -X importtime."""
+    code = WRAPPER.format(root=ROOT, probe=PROBES[name])
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=workdir,
+                          env=dict(os.environ, **DUMMY_ENV), capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, module = [p.strip() for p in line.replace("import time:", "|").split("|")]
+        rows.append((int(cumulative_us), module))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure cold-start time of the bot's entry points.")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--only", nargs="+", choices=list(PROBES), default=list(PROBES))
+    ap.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    ap.add_argument("--save", help="write results as JSON")
+    args = ap.parse_args()
+
+    # Run from a scratch folder so caches (discovery document, logs) from the repo don't skew results
+    workdir = tempfile.mkdtemp(prefix="abi_bot_startup_")
+    try:
+        results = [run_probe(name, args.runs, workdir) for name in args.only]
+        imports = {}
+        if args.importtime:
+            imports = {r["name"]: top_imports(r["name"], workdir, 10)
+                       for r in results if r["name"] != "python" and "skipped" not in r}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'entry point':<16}{'median ms':>11}{'min ms':>9}{'max ms':>9}")
+    print("-" * 45)
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['name']:<16}  skipped: {r['skipped']}")
+        else:
+            print(f"{r['name']:<16}{r['median_ms']:>11.1f}{r['min_ms']:>9.1f}{r['max_ms']:>9.1f}")
+
+    for name, rows in imports.items():
+        print(f"\nSlowest imports for {name}:")
+        for cumulative_us, module in rows:
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {module}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
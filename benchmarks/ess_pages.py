@@ -0,0 +1,107 @@
+"""
+Synthetic ESS schedule pages.
+
+Builds month views with the same markup the live portal uses
+(span.MonthTitle, td.calendar_day_box / other_month_box, div.day_details
+anchors calling showDetails('id') and the matching "<id>evt" / "<id>fac"
+divs), so the parser can be measured and exercised without logging in.
+"""
+import random
+import calendar
+import datetime
+
+EVENT_NAMES = ["Concert", "Hockey Game", "Basketball Game", "Family Show", "Comedy Night", "Private Event"]
+LOCATIONS = ["Main Arena", "Club Level", "Suite Level", "Concourse A", "Loge Bar", "Stand 112"]
+SHIFT_TIMES = [("4:00 pm", "11:30 pm"), ("10:00 am", "6:00 pm"), ("5:30 pm", "10:45 pm")]
+OVERNIGHT_TIMES = [("9:00 pm", "2:00 am"), ("11:00 pm", "3:30 am")]
+
+
+def _postback_day(year, month):
+    """ASP.NET calendar argument for the first day of a month (month may be 0 or 13)."""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return (datetime.date(year, month, 1) - datetime.date(2000, 1, 1)).days
+
+
+def month_page(year, month, shifts, first_id=1000, overnight_ratio=0.1, malformed_ratio=0.0, seed=0):
+    """
+    Returns (html, expected) for one month view with `shifts` shifts (at most one per day).
+    `expected` is the number of shifts a correct parser should return; malformed
+    entries (bad time ranges, missing ids, empty details) are not counted.
+    """
+    rng = random.Random(seed)
+    days_in_month = calendar.monthrange(year, month)[1]
+    shift_days = set(rng.sample(range(1, days_in_month + 1), min(shifts, days_in_month)))
+
+    cells = []
+    details = []
+    expected = 0
+    next_id = first_id
+
+    # Leading boxes from the previous month, like the real grid
+    lead = datetime.date(year, month, 1).weekday()
+    for n in range(lead):
+        cells.append(f'<td class="calendar_day_box other_month_box">{28 + n}'
+                     f'<div class="day_details"><a href="javascript:showDetails(\'{next_id}\')">4:00 pm - 11:00 pm</a></div></td>')
+        next_id += 1
+
+    for day in range(1, days_in_month + 1):
+        if day not in shift_days:
+            cells.append(f'<td class="calendar_day_box"><span class="day_num">{day}</span><div class="day_details"></div></td>')
+            continue
+
+        evt_id = next_id
+        next_id += 1
+        roll = rng.random()
+        if roll < malformed_ratio:
+            kind = rng.choice(["bad_time", "no_id", "empty"])
+            if kind == "bad_time":
+                link = f'<a href="javascript:showDetails(\'{evt_id}\')">TBA</a>'
+            elif kind == "no_id":
+                link = '<a href="#">4:00 pm - 11:00 pm</a>'
+            else:
+                link = ''
+        else:
+            start, end = rng.choice(OVERNIGHT_TIMES if rng.random() < overnight_ratio else SHIFT_TIMES)
+            link = f'<a href="javascript:showDetails(\'{evt_id}\')">{start} - {end}</a>'
+            expected += 1
+
+        cells.append(f'<td class="calendar_day_box"><span class="day_num">{day}</span>'
+                     f'<div class="day_details">{link}</div></td>')
+        details.append(
+            f'<div id="{evt_id}evt" class="hidden_detail">{rng.choice(EVENT_NAMES)} #{evt_id}</div>'
+            f'<div id="{evt_id}fac" class="hidden_detail">{rng.choice(LOCATIONS)}</div>'
+        )
+
+    rows = "".join(f"<tr>{''.join(cells[i:i + 7])}</tr>" for i in range(0, len(cells), 7))
+    title = datetime.date(year, month, 1).strftime("%B %Y")
+    html = f"""<html><head><title>My Schedule</title></head><body>
+<form method="post" action="./Request.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{'x' * 2048}" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{'y' * 256}" />
+<table class="calendar_header"><tr>
+<td><a href="javascript:__doPostBack('Calendar1','V{_postback_day(year, month - 1)}')" title="Previous month">&lt;</a></td>
+<td><span class="MonthTitle">{title}</span></td>
+<td><a href="javascript:__doPostBack('Calendar1','V{_postback_day(year, month + 1)}')" title="Next month">&gt;</a></td>
+</tr></table>
+<table class="calendar">{rows}</table>
+<div id="details">{''.join(details)}</div>
+</form></body></html>"""
+    return html, expected
+
+
+def schedule(total_shifts, start=datetime.date(2026, 1, 1), per_month=20, **kwargs):
+    """Returns [(html, expected)] month pages adding up to `total_shifts` shifts."""
+    pages = []
+    year, month = start.year, start.month
+    remaining = total_shifts
+    first_id = 1000
+    seed = kwargs.pop("seed", 0)
+    while remaining > 0 or not pages:
+        count = min(per_month, remaining)
+        pages.append(month_page(year, month, count, first_id=first_id, seed=seed + len(pages), **kwargs))
+        first_id += 100
+        remaining -= count
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return pages
@@ -0,0 +1,251 @@
+"""
+Local stand-in for the Google Calendar API (events only).
+
+Implements what gcal.py uses: events insert/list/patch/delete under
+/calendar/v3/calendars/<id>/events, sync tokens on list, and multipart batch
+requests at /batch/calendar/v3. Events are kept in memory per calendar.
+
+    server = FakeCalendarServer(latency=0.05, conflict_rate=0.01, rate_limit_rate=0.002).start()
+    GoogleCalendarManager(api_url=server.url)   # or GCAL_API_URL=<server.url> for the whole bot
+    server.stop()
+
+`latency` is added to every HTTP request (a batch is one request) and
+`call_latency` to every call inside a batch. With `conflict_rate` that share
+of inserts is answered 409 as if an earlier run had already created the
+event (it is stored anyway); with `rate_limit_rate` that share of calls is
+answered 429 rateLimitExceeded and has to be retried by the client. The
+bot's RateLimiter halves its pace for every batch with a 429 in it, so a few
+percent already drives it down to its floor; a tenth of a percent or so
+looks more like real quota trouble.
+"""
+import json
+import uuid
+import email
+import random
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+EVENTS_PREFIX = "/calendar/v3/calendars/"
+BATCH_PATH = "/batch/calendar/v3"
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 409: "Conflict",
+           410: "Gone", 429: "Too Many Requests"}
+
+
+def _error(status, reason, message):
+    return status, {"error": {"code": status, "message": message,
+                              "errors": [{"domain": "global", "reason": reason, "message": message}]}}
+
+
+class FakeCalendarServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, call_latency=0.0, conflict_rate=0.0,
+                 rate_limit_rate=0.0, seed=0):
+        self.latency = latency
+        self.call_latency = call_latency
+        self.conflict_rate = conflict_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.calendars = {}
+        # Every change gets the next sequence number; a sync token is the sequence it was issued at
+        self.seq = 0
+        self.stats = {"requests": 0, "batches": 0, "calls": 0, "conflicts": 0, "rate_limited": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def events(self, calendar_id="primary"):
+        """Live (not deleted) events of a calendar, by ID."""
+        with self._lock:
+            return {k: v for k, v in self.calendars.get(calendar_id, {}).items() if v["status"] != "cancelled"}
+
+    def call(self, method, path, body=None):
+        """Handles one API call. Returns (status, JSON-able body or None)."""
+        with self._lock:
+            self.stats["calls"] += 1
+            if self.rate_limit_rate and self._rng.random() < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return _error(429, "rateLimitExceeded", "Rate Limit Exceeded")
+
+            url = urlsplit(path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if not url.path.startswith(EVENTS_PREFIX):
+                return _error(404, "notFound", "Not Found")
+            parts = url.path[len(EVENTS_PREFIX):].split("/")
+            if len(parts) < 2 or parts[1] != "events":
+                return _error(404, "notFound", "Not Found")
+            calendar = self.calendars.setdefault(unquote(parts[0]), {})
+            event_id = unquote(parts[2]) if len(parts) > 2 else None
+
+            if event_id is None and method == "POST":
+                return self._insert(calendar, body or {})
+            if event_id is None and method == "GET":
+                return self._list(calendar, query)
+            if event_id is not None and method in ("PATCH", "PUT"):
+                return self._patch(calendar, event_id, body or {})
+            if event_id is not None and method == "DELETE":
+                return self._delete(calendar, event_id)
+            if event_id is not None and method == "GET":
+                event = calendar.get(event_id)
+                return (200, event) if event and event["status"] != "cancelled" else _error(404, "notFound", "Not Found")
+            return _error(400, "badRequest", f"Unsupported call {method} {url.path}")
+
+    def _stamp(self, event):
+        self.seq += 1
+        event["_seq"] = self.seq
+        event["etag"] = f'"{self.seq}"'
+        event["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        return event
+
+    def _public(self, event):
+        return {k: v for k, v in event.items() if not k.startswith("_")}
+
+    def _insert(self, calendar, body):
+        event_id = body.get("id") or uuid.uuid4().hex
+        existing = calendar.get(event_id)
+        if existing and existing["status"] != "cancelled":
+            return _error(409, "duplicate", "The requested identifier already exists.")
+        event = self._stamp(dict(body, id=event_id, status="confirmed"))
+        calendar[event_id] = event
+        if self.conflict_rate and self._rng.random() < self.conflict_rate:
+            self.stats["conflicts"] += 1
+            return _error(409, "duplicate", "The requested identifier already exists.")
+        return 200, self._public(event)
+
+    def _patch(self, calendar, event_id, body):
+        event = calendar.get(event_id)
+        if not event or event["status"] == "cancelled":
+            return _error(404, "notFound", "Not Found")
+        event.update({k: v for k, v in body.items() if k != "id"})
+        self._stamp(event)
+        return 200, self._public(event)
+
+    def _delete(self, calendar, event_id):
+        event = calendar.get(event_id)
+        if not event:
+            return _error(404, "notFound", "Not Found")
+        if event["status"] == "cancelled":
+            return _error(410, "deleted", "Resource has been deleted")
+        event["status"] = "cancelled"
+        self._stamp(event)
+        return 204, None
+
+    def _list(self, calendar, query):
+        sync_token = query.get("syncToken")
+        if sync_token is not None:
+            if not sync_token.isdigit() or int(sync_token) > self.seq:
+                return _error(410, "fullSyncRequired", "Sync token is no longer valid, a full sync is required.")
+            since = int(sync_token)
+            items = [e for e in calendar.values() if e["_seq"] > since]
+        else:
+            # Naive local times on both sides; good enough for windows made of whole months
+            time_min = query.get("timeMin", "")[:19]
+            time_max = query.get("timeMax", "")[:19]
+            items = [e for e in calendar.values() if e["status"] != "cancelled"
+                     and (not time_max or e.get("start", {}).get("dateTime", "")[:19] < time_max)
+                     and (not time_min or e.get("end", {}).get("dateTime", "")[:19] > time_min)]
+        items.sort(key=lambda e: e["_seq"])
+
+        offset = int(query.get("pageToken") or 0)
+        size = min(int(query.get("maxResults") or 250), 2500)
+        page = items[offset:offset + size]
+        resp = {"kind": "calendar#events", "items": [self._public(e) for e in page]}
+        if offset + size < len(items):
+            resp["nextPageToken"] = str(offset + size)
+        else:
+            resp["nextSyncToken"] = str(self.seq)
+        return 200, resp
+
+    def batch(self, content_type, body):
+        """Answers a multipart/mixed batch. Returns (content type, body bytes)."""
+        message = email.message_from_bytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        out = []
+        for part in message.get_payload():
+            request = part.get_payload(decode=False)
+            if isinstance(request, list):
+                continue
+            head, _, payload = request.replace("\r\n", "\n").partition("\n\n")
+            method, path, _ = head.split("\n", 1)[0].split(" ", 2)
+            data = json.loads(payload) if payload.strip() else None
+            if self.call_latency:
+                threading.Event().wait(self.call_latency)
+            status, result = self.call(method, path, data)
+            text = json.dumps(result) if result is not None else ""
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\nContent-Length: {len(text.encode())}\r\n\r\n"
+                f"{text}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode("utf-8")
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length) if length else b""
+
+            def _send(self, status, content_type, data):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                with server._lock:
+                    server.stats["requests"] += 1
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                body = self._body()
+                if self.path.startswith(BATCH_PATH):
+                    with server._lock:
+                        server.stats["batches"] += 1
+                    content_type, data = server.batch(self.headers.get("Content-Type", ""), body)
+                    self._send(200, content_type, data)
+                    return
+                status, result = server.call(method, self.path, json.loads(body) if body.strip() else None)
+                data = json.dumps(result).encode("utf-8") if result is not None else b""
+                self._send(status, "application/json; charset=UTF-8", data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        return Handler
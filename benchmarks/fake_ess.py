@@ -0,0 +1,164 @@
+"""
+Local stand-in for the ESS portal.
+
+Serves the venue form, the LoginId/PIN form, a menu with a "My Schedule"
+postback link and generated month views (benchmarks/ess_pages.py) at
+/ABIMM_ASP/Request.aspx, tracking each client through an
+ASP.NET_SessionId cookie like the real site.
+
+    server = FakeESSServer(venue_id="123", username="u", password="p").start()
+    HTTPScraper("123", "u", "p", base_url=server.url).scrape_schedule()
+    server.stop()
+
+With `total_shifts`, months are filled with `shifts_per_month` shifts (at
+most one a day) until that many have been handed out; later months are empty.
+The whole bot is pointed at it with ESS_URL=<server.url>.
+"""
+import uuid
+import datetime
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from benchmarks.ess_pages import month_page
+
+PATH = "/ABIMM_ASP/Request.aspx"
+ASPNET_EPOCH = datetime.date(2000, 1, 1)
+
+VENUE_PAGE = """<html><head><title>ESS</title></head><body>
+<form method="post" action="./Request.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" value="venue-state" />
+<input type="text" id="input_venue" name="input_venue" />
+<input type="button" value="Submit" onclick="document.forms[0].submit()" />
+</form></body></html>"""
+
+LOGIN_PAGE = """<html><head><title>ESS Login</title></head><body>
+<form method="post" action="./Request.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" value="login-state" />
+{error}
+<input type="text" id="LoginId" name="LoginId" />
+<input type="password" id="PIN" name="PIN" />
+<input type="submit" id="loginButton" name="loginButton" value="Log In" />
+</form></body></html>"""
+
+MENU_PAGE = """<html><head><title>ESS Home</title></head><body>
+<form method="post" action="./Request.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" value="menu-state" />
+<input type="hidden" name="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" value="" />
+<a href="javascript:__doPostBack('MenuSchedule','')">My Schedule</a>
+<a href="javascript:__doPostBack('MenuAvailability','')">Availability</a>
+</form></body></html>"""
+
+
+class FakeESSServer:
+    def __init__(self, venue_id="1000", username="user", password="1234", start_month=None,
+                 shifts_per_month=20, host="127.0.0.1", port=0, latency=0.0, total_shifts=None):
+        self.venue_id = venue_id
+        self.username = username
+        self.password = password
+        self.start_month = start_month or datetime.date.today().replace(day=1)
+        self.shifts_per_month = shifts_per_month
+        self.total_shifts = total_shifts
+        self.latency = latency
+        self.sessions = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def month_html(self, month_start):
+        offset = (month_start.year - self.start_month.year) * 12 + month_start.month - self.start_month.month
+        shifts = self.shifts_per_month
+        if self.total_shifts is not None:
+            shifts = max(0, min(shifts, self.total_shifts - offset * self.shifts_per_month))
+        html, _ = month_page(month_start.year, month_start.month, shifts,
+                             first_id=1000 + 100 * offset, seed=offset)
+        return html
+
+    def respond(self, session, form):
+        """Returns the page for a request given the session stage and posted fields."""
+        stage = session.get("stage", "venue")
+        target = form.get("__EVENTTARGET", "")
+
+        if stage == "venue":
+            if form.get("input_venue") == self.venue_id:
+                session["stage"] = "login"
+                return LOGIN_PAGE.format(error="")
+            return VENUE_PAGE
+        if stage == "login":
+            if "LoginId" in form:
+                if form.get("LoginId") == self.username and form.get("PIN") == self.password:
+                    session["stage"] = "menu"
+                    return MENU_PAGE
+                return LOGIN_PAGE.format(error='<span class="error">Invalid login</span>')
+            return LOGIN_PAGE.format(error="")
+
+        if target == "MenuSchedule":
+            return self.month_html(self.start_month)
+        if target == "Calendar1" and form.get("__EVENTARGUMENT", "").startswith("V"):
+            day = ASPNET_EPOCH + datetime.timedelta(days=int(form["__EVENTARGUMENT"][1:]))
+            return self.month_html(day.replace(day=1))
+        return MENU_PAGE
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _session(self):
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                sid = cookie["ASP.NET_SessionId"].value if "ASP.NET_SessionId" in cookie else None
+                with server._lock:
+                    server.requests += 1
+                    if sid not in server.sessions:
+                        sid = uuid.uuid4().hex
+                        server.sessions[sid] = {}
+                    return sid, server.sessions[sid]
+
+            def _reply(self, sid, body):
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Set-Cookie", f"ASP.NET_SessionId={sid}; path=/; HttpOnly")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if not self.path.startswith(PATH):
+                    self.send_error(404)
+                    return
+                sid, session = self._session()
+                self._reply(sid, server.respond(session, {}))
+
+            def do_POST(self):
+                if not self.path.startswith(PATH):
+                    self.send_error(404)
+                    return
+                sid, session = self._session()
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length).decode("utf-8")
+                form = {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+                self._reply(sid, server.respond(session, form))
+
+        return Handler
@@ -0,0 +1,235 @@
+"""
+Parser for the ESS month calendar page.
+
+parse_calendar() takes the page HTML and returns the ShiftEvents used by the
+rest of the bot (parse_month() also returns the month the page shows). The detail divs ("<id>evt" / "<id>fac") are indexed in a
+single pass, so cost grows linearly with the number of shifts. selectolax or
+lxml are used when installed, BeautifulSoup otherwise.
+"""
+import re
+import datetime
+import logging
+import functools
+from datetime import timedelta
+
+from shift import ShiftEvent
+
+logger = logging.getLogger("ABI_Bot.Parser")
+
+DAY_RE = re.compile(r'^(\d{1,2})')
+SHOW_DETAILS_RE = re.compile(r"showDetails\('(\d+)'\)")
+TIME_RANGE_RE = re.compile(r"(\d{1,2}:\d{2}\s*[ap]m)\s*-\s*(\d{1,2}:\d{2}\s*[ap]m)", re.IGNORECASE)
+DETAIL_ID_RE = re.compile(r'^(\d+)(evt|fac)$')
+
+# Fastest first; "auto" picks the first one that imports
+BACKEND_ORDER = ("selectolax", "lxml", "bs4")
+
+
+def parse_calendar(html, backend="auto"):
+    """Parses one ESS month page. Returns a list of ShiftEvents."""
+    return parse_month(html, backend)[1]
+
+
+def parse_month(html, backend="auto"):
+    """
+    parse_calendar() that also says which month the page shows: ("YYYY-MM", events),
+    with None for a page without a calendar month (error or login pages).
+    """
+    name = resolve_backend(backend)
+    month_title, cells, details = _EXTRACTORS[name](html)
+    return _month_key(month_title), _build_events(month_title, cells, details)
+
+
+def _month_key(month_text):
+    try:
+        return datetime.datetime.strptime(month_text, "%B %Y").strftime("%Y-%m") if month_text else None
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def available_backends():
+    """Backends that can be imported in this environment, fastest first."""
+    found = []
+    for name in BACKEND_ORDER:
+        try:
+            _import_backend(name)
+            found.append(name)
+        except ImportError:
+            pass
+    return tuple(found)
+
+
+def resolve_backend(backend="auto"):
+    """The backend to parse with. ValueError for an unknown name, ImportError when it isn't installed."""
+    if backend and backend != "auto":
+        if backend not in _EXTRACTORS:
+            raise ValueError(f"Unknown parser backend: {backend}")
+        try:
+            _import_backend(backend)
+        except ImportError:
+            raise ImportError(f"Parser backend {backend} is not installed")
+        return backend
+    available = available_backends()
+    if not available:
+        raise ImportError("No HTML parser installed (need selectolax, lxml or beautifulsoup4)")
+    return available[0]
+
+
+def _import_backend(name):
+    if name == "selectolax":
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+            return LexborHTMLParser
+        except ImportError:
+            # selectolax < 0.3 only ships the modest engine
+            from selectolax.parser import HTMLParser
+            return HTMLParser
+    if name == "lxml":
+        import lxml.html
+        return lxml.html
+    from bs4 import BeautifulSoup
+    return BeautifulSoup
+
+
+# Each extractor returns (month title text, [(day text, link href, time range)], {detail id: text})
+# Texts follow BeautifulSoup's get_text(strip=True): stripped pieces joined with nothing, except the
+# day text which keeps a space between pieces so "5" and "9:00 pm" don't read as day 59.
+
+def _extract_bs4(html):
+    BeautifulSoup = _import_backend("bs4")
+    soup = BeautifulSoup(html, 'html.parser')
+
+    month_title = soup.find('span', class_='MonthTitle')
+    month_text = month_title.get_text(strip=True) if month_title else None
+
+    cells = []
+    for box in soup.find_all('td', class_='calendar_day_box'):
+        if 'other_month_box' in box.get('class', []):
+            continue
+        details_div = box.find('div', class_='day_details')
+        link = details_div.find('a') if details_div else None
+        if not link:
+            continue
+        cells.append((box.get_text(" ", strip=True), link.get('href', ''), link.get_text(strip=True)))
+
+    details = {}
+    for div in soup.find_all('div', id=DETAIL_ID_RE):
+        details[div['id']] = div.get_text(strip=True)
+    return month_text, cells, details
+
+
+def _lxml_has_class(el, name):
+    return name in (el.get('class') or '').split()
+
+
+def _lxml_text(el, sep=""):
+    return sep.join(t.strip() for t in el.itertext() if t.strip())
+
+
+def _extract_lxml(html):
+    lxml_html = _import_backend("lxml")
+    root = lxml_html.fromstring(html)
+
+    month_text = None
+    cells = []
+    details = {}
+    # Single walk over the tree collects everything we need
+    for el in root.iter('span', 'td', 'div'):
+        if el.tag == 'span':
+            if month_text is None and _lxml_has_class(el, 'MonthTitle'):
+                month_text = _lxml_text(el)
+        elif el.tag == 'td':
+            if not _lxml_has_class(el, 'calendar_day_box') or _lxml_has_class(el, 'other_month_box'):
+                continue
+            details_div = next((d for d in el.iter('div') if _lxml_has_class(d, 'day_details')), None)
+            link = next(details_div.iter('a'), None) if details_div is not None else None
+            if link is None:
+                continue
+            cells.append((_lxml_text(el, " "), link.get('href', ''), _lxml_text(link)))
+        else:
+            div_id = el.get('id')
+            if div_id and DETAIL_ID_RE.match(div_id):
+                details[div_id] = _lxml_text(el)
+    return month_text, cells, details
+
+
+def _extract_selectolax(html):
+    HTMLParser = _import_backend("selectolax")
+    tree = HTMLParser(html)
+
+    month_title = tree.css_first('span.MonthTitle')
+    month_text = month_title.text(strip=True) if month_title else None
+
+    cells = []
+    for box in tree.css('td.calendar_day_box'):
+        if 'other_month_box' in (box.attributes.get('class') or '').split():
+            continue
+        link = box.css_first('div.day_details a')
+        if link is None:
+            continue
+        cells.append((box.text(separator=" ", strip=True), link.attributes.get('href') or '', link.text(strip=True)))
+
+    details = {}
+    for div in tree.css('div[id$="evt"], div[id$="fac"]'):
+        div_id = div.attributes.get('id') or ''
+        if DETAIL_ID_RE.match(div_id):
+            details[div_id] = div.text(strip=True)
+    return month_text, cells, details
+
+
+_EXTRACTORS = {
+    "selectolax": _extract_selectolax,
+    "lxml": _extract_lxml,
+    "bs4": _extract_bs4,
+}
+
+
+def _build_events(month_text, cells, details):
+    if not month_text:
+        return []
+    try:
+        current_month_date = datetime.datetime.strptime(month_text, "%B %Y")
+    except ValueError:
+        logger.error(f"Failed to parse month date: {month_text}")
+        return []
+
+    events = []
+    for day_text, href, time_range in cells:
+        match = DAY_RE.match(day_text)
+        if not match:
+            continue
+        day_num = int(match.group(1))
+
+        id_match = SHOW_DETAILS_RE.search(href)
+        if not id_match:
+            continue
+        evt_id = id_match.group(1)
+
+        t_match = TIME_RANGE_RE.search(time_range)
+        if not t_match:
+            continue
+
+        try:
+            s_str, e_str = t_match.groups()
+            base_date = current_month_date.replace(day=day_num)
+            day_str = base_date.strftime('%Y-%m-%d')
+
+            start_dt = datetime.datetime.strptime(f"{day_str} {s_str}", "%Y-%m-%d %I:%M %p")
+            end_dt = datetime.datetime.strptime(f"{day_str} {e_str}", "%Y-%m-%d %I:%M %p")
+
+            if end_dt < start_dt:
+                end_dt += timedelta(days=1)
+
+            events.append(ShiftEvent(
+                summary=details.get(f"{evt_id}evt", "Unknown Event"),
+                location=details.get(f"{evt_id}fac", "Unknown Location"),
+                start=start_dt,
+                end=end_dt,
+                time_str=time_range,
+                ess_id=evt_id,
+            ))
+        except Exception as e:
+            logger.warning(f"Error parsing event on day {day_num}: {e}")
+
+    return events
@@ -0,0 +1,111 @@
+"""
+Schedule fingerprints.
+
+Each fetched ESS month page is reduced to a hash of its content with the
+volatile markup (view state, scripts, resource cache-busters, clock stamps)
+stripped. When every month matches the last successful sync to the same
+calendars, the run stops right after the fetch: nothing is parsed and Google
+is never called.
+"""
+import re
+import json
+import time
+import hashlib
+import logging
+
+from tracing import span, profiled
+
+logger = logging.getLogger("ABI_Bot.Fingerprint")
+
+VOLATILE_RES = (
+    re.compile(r"<script\b.*?</script>", re.S | re.I),
+    re.compile(r"<style\b.*?</style>", re.S | re.I),
+    re.compile(r"<!--.*?-->", re.S),
+    # __VIEWSTATE, __EVENTVALIDATION, __VIEWSTATEGENERATOR and friends
+    re.compile(r"<input\b[^>]*\btype=[\"']?hidden\b[^>]*>", re.I),
+    re.compile(r"<(?:link|meta)\b[^>]*>", re.I),
+    re.compile(r"\b(?:Web|Script)Resource\.axd\?[^\"'\s>]*", re.I),
+    # Cookieless session IDs in URLs
+    re.compile(r"\(S\([a-z0-9]+\)\)", re.I),
+    # "Generated at" clocks; shift times never carry seconds
+    re.compile(r"\d{1,2}:\d{2}:\d{2}(?:\.\d+)?(?:\s*[ap]m)?", re.I),
+)
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Fingerprints older than this are ignored, so a full sync still happens now and then
+MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+def schedule_fingerprint(html):
+    """Hash of one month page with the markup that changes on every request removed."""
+    for pattern in VOLATILE_RES:
+        html = pattern.sub("", html)
+    return hashlib.sha1(WHITESPACE_RE.sub(" ", html).strip().encode("utf-8")).hexdigest()
+
+
+class ScheduleUnchanged(Exception):
+    """Every fetched month matches the last successful sync."""
+
+
+class FingerprintStore:
+    """
+    Fingerprints of the last successfully synced schedule, kept in a JSON file.
+    Scrapers call check() after fetching; callers commit() once the sync succeeded.
+    `targets` describes where the shifts go (calendar IDs, ICS file); the schedule
+    only counts as unchanged for the same targets, so a new calendar gets a full sync.
+    """
+
+    def __init__(self, path="schedule_fingerprints.json", max_age=MAX_AGE_SECONDS, targets=None):
+        self.path = path
+        self.max_age = max_age
+        self.targets = hashlib.sha1(json.dumps(targets, sort_keys=True).encode("utf-8")).hexdigest()
+        self.pending = None
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable fingerprint file: {e}")
+            return {}
+
+    def check(self, pages, force=False):
+        """
+        Fingerprints the fetched month pages. Raises ScheduleUnchanged when they all
+        match the last successful sync, unless `force` is set.
+        """
+        # Sorted because concurrent month fetches finish in any order
+        with span("fingerprint", pages=len(pages)), profiled():
+            self.pending = sorted(schedule_fingerprint(html) for html in pages)
+        if force:
+            return
+        state = self.load()
+        if state.get("fingerprints") != self.pending:
+            return
+        if state.get("targets") != self.targets:
+            logger.info("Schedule looks unchanged, but the calendars changed since the last sync; syncing anyway.")
+            return
+        if time.time() - state.get("synced_at", 0) > self.max_age:
+            logger.info("Schedule looks unchanged, but the last full sync is old; syncing anyway.")
+            return
+        state["checked_at"] = time.time()
+        self._write(state)
+        logger.info(f"All {len(pages)} month(s) unchanged since the last sync.")
+        raise ScheduleUnchanged(f"{len(pages)} month(s) unchanged")
+
+    def commit(self):
+        """Stores the fingerprints from the last check() as the synced schedule."""
+        if self.pending is None:
+            return
+        now = time.time()
+        self._write({"fingerprints": self.pending, "targets": self.targets, "synced_at": now, "checked_at": now})
+        self.pending = None
+
+    def _write(self, state):
+        try:
+            with open(self.path, "w") as f:
+                json.dump(state, f)
+        except OSError as e:
+            logger.warning(f"Could not save schedule fingerprints: {e}")
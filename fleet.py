@@ -0,0 +1,354 @@
+"""
+Fleet mode: syncs many ESS employees' schedules from one process.
+
+    python fleet.py
+    python fleet.py --accounts team.json --workers 4 --memory-mb 2048
+
+The accounts file (FLEET_ACCOUNTS_FILE, default accounts.json) lists one entry per employee:
+
+    [
+        {"name": "alex", "username": "1234", "password": "5678"},
+        {"name": "sam", "username": "4321", "password": "8765", "venue_id": "other_venue",
+         "calendar_id": "shifts@group.calendar.google.com"}
+    ]
+
+venue_id falls back to ESS_VENUE_ID and calendar_id (one ID or a list) to
+GOOGLE_CALENDAR_ID. Every account keeps its Google token, ledger, Calendar
+sync state, ESS session, .ics feed (with ICS_FILE set) and last summary in
+accounts/<name>/.
+All accounts share one Chromium with an isolated context each. At most
+--workers accounts run at once, and no new one starts while the bot and its
+browser would go over --memory-mb. The shared browser is relaunched between
+accounts after BROWSER_RECYCLE_RUNS of them or above BROWSER_RECYCLE_MB (see
+governor.py).
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import logging
+
+from utils import setup_logging, load_config, process_tree_rss_mb, calendar_ids
+from gcal import GoogleCalendarManager
+from pipeline import run_pipeline
+from worker import summarize, portal_guard, browser_governor
+from governor import SharedBrowser
+from fingerprint import ScheduleUnchanged
+from portal import PortalUnavailable
+from tracing import span
+import tracing
+import metrics
+
+logger = logging.getLogger("ABI_Bot.Fleet")
+
+ACCOUNTS_DIR = "accounts"
+ACCOUNT_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+FLEET_SUMMARY_FILE = "fleet_summary.json"
+# Assumed cost of one more account until a running one has been measured
+DEFAULT_ACCOUNT_MB = 150
+
+
+def load_accounts(path, default_venue=None):
+    """Reads the accounts file. Returns a list of account dicts, raises ValueError on bad entries."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except OSError as e:
+        raise ValueError(f"Cannot read accounts file {path}: {e}")
+    except ValueError as e:
+        raise ValueError(f"Accounts file {path} is not valid JSON: {e}")
+
+    if isinstance(data, dict):
+        data = data.get("accounts")
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"Accounts file {path} has no accounts")
+
+    accounts = []
+    names = set()
+    for n, entry in enumerate(data, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Account #{n} is not an object")
+        name = str(entry.get("name") or entry.get("username") or "")
+        if not ACCOUNT_NAME_RE.match(name):
+            raise ValueError(f"Account #{n}: name must use only letters, digits, '.', '_' or '-'")
+        if name in names:
+            raise ValueError(f"Account name {name} is used twice")
+        names.add(name)
+
+        account = {
+            "name": name,
+            "venue_id": entry.get("venue_id") or default_venue,
+            "username": entry.get("username"),
+            "password": entry.get("password"),
+            "dir": os.path.join(ACCOUNTS_DIR, name),
+            "calendar_ids": calendar_ids(entry["calendar_id"]) if entry.get("calendar_id") else None,
+        }
+        missing = [k for k in ("venue_id", "username", "password") if not account[k]]
+        if missing:
+            raise ValueError(f"Account {name}: missing {', '.join(missing)}")
+        accounts.append(account)
+    return accounts
+
+
+def account_config(config, account):
+    """The bot config for one account: its own login, calendars, session snapshot and feed, no browser profile."""
+    return dict(
+        config,
+        venue_id=account["venue_id"], username=account["username"], password=account["password"],
+        calendar_ids=account.get("calendar_ids") or config["calendar_ids"],
+        ics_file=(os.path.join(account["dir"], os.path.basename(config["ics_file"]))
+                  if config["ics_file"] else None),
+        profile_mode="ephemeral",
+        session_file=os.path.join(account["dir"], "ess_session.json") if config["session_file"] else None,
+        fingerprint_file=(os.path.join(account["dir"], "schedule_fingerprints.json")
+                          if config["fingerprint_file"] else None),
+    )
+
+
+def authorize(account, config):
+    """
+    Calendar manager with the account's own token.json (runs the consent flow if there is none).
+    None when the account syncs to no Google calendar.
+    """
+    os.makedirs(account["dir"], exist_ok=True)
+    if not account_config(config, account)["calendar_ids"]:
+        return None
+    logger.info(f"[{account['name']}] Authorizing Google Calendar...")
+    return GoogleCalendarManager(
+        max_qps=config["gcal_max_qps"], max_retries=config["gcal_max_retries"], api_url=config["gcal_api_url"],
+        token_file=os.path.join(account["dir"], "token.json"),
+        sync_state_file=os.path.join(account["dir"], "gcal_sync.json"),
+    )
+
+
+class MemoryGate:
+    """
+    Async context manager that holds new accounts back while the process tree
+    (the bot plus Chromium) would go over `ceiling_mb`. One account may always
+    run so the fleet can't stall. With no ceiling, or no way to measure
+    memory, only the worker limit applies.
+    """
+
+    def __init__(self, ceiling_mb=0, poll_seconds=0.5):
+        self.ceiling_mb = ceiling_mb
+        self.poll_seconds = poll_seconds
+        self.running = 0
+        self.baseline_mb = process_tree_rss_mb()
+        self.peak_mb = self.baseline_mb or 0.0
+        self.held = 0
+        if ceiling_mb and self.baseline_mb is None:
+            logger.warning(f"Can't measure memory here (is psutil installed?): FLEET_MEMORY_MB={ceiling_mb} "
+                           "has no effect, only FLEET_WORKERS limits the fleet")
+
+    def sample(self):
+        rss = process_tree_rss_mb()
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb, rss)
+        return rss
+
+    async def watch(self, interval=1.0):
+        """Samples memory until cancelled so short peaks between accounts are seen too."""
+        while True:
+            self.sample()
+            await asyncio.sleep(interval)
+
+    def _has_room(self):
+        if not self.ceiling_mb or not self.running:
+            return True
+        rss = self.sample()
+        if rss is None:
+            return True
+        per_account = DEFAULT_ACCOUNT_MB
+        if self.baseline_mb is not None:
+            per_account = max(per_account, (rss - self.baseline_mb) / self.running)
+        return rss + per_account <= self.ceiling_mb
+
+    async def __aenter__(self):
+        if not self._has_room():
+            self.held += 1
+            while not self._has_room():
+                await asyncio.sleep(self.poll_seconds)
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.sample()
+        self.running -= 1
+
+
+def write_summary(account, result):
+    path = os.path.join(account["dir"], "summary.json")
+    try:
+        os.makedirs(account["dir"], exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+    except OSError as e:
+        logger.warning(f"[{account['name']}] Could not write {path}: {e}")
+
+
+def new_result(account):
+    return {"account": account["name"], "ok": False, "error": None, "events": 0, "counts": {}, "duration": 0.0}
+
+
+def finish_result(account, result):
+    metrics.record_run(result["ok"], result["duration"], unchanged=result.get("unchanged", False),
+                       unavailable=result.get("unavailable", False))
+    result["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    write_summary(account, result)
+    return result
+
+
+def mark_unavailable(result, error):
+    result.update(error=str(error), unavailable=True, retry_in=error.retry_in)
+    return result
+
+
+async def sync_account(account, config, gcal, browser, pool, gate, force=False):
+    """Runs the async pipeline for one account. Returns its summary dict."""
+    name = account["name"]
+    result = new_result(account)
+    async with pool, gate:
+        started = time.time()
+        logger.info(f"[{name}] Sync started")
+        try:
+            with span("account", account=name):
+                events, statuses, removed = await run_pipeline(
+                    account_config(config, account), gcal=gcal, browser=browser,
+                    ledger_path=os.path.join(account["dir"], "sync_ledger.db"), force=force
+                )
+            if events:
+                counts = summarize(statuses, removed)
+                result.update(ok=not counts.get("ERROR"), events=len(events), counts=counts)
+            else:
+                result["error"] = "No events found or scraping failed"
+        except ScheduleUnchanged:
+            result.update(ok=True, unchanged=True)
+        except PortalUnavailable as e:
+            logger.warning(f"[{name}] {e}")
+            mark_unavailable(result, e)
+        except Exception as e:
+            logger.exception(f"[{name}] Sync crashed")
+            result["error"] = str(e)
+        result["duration"] = time.time() - started
+    finish_result(account, result)
+    logger.info(f"[{name}] Sync {'finished' if result['ok'] else 'failed'} in {result['duration']:.1f}s")
+    return result
+
+
+async def run_fleet(config, accounts, workers, memory_mb=0, force=False):
+    """Syncs every account. Returns (per-account results, peak memory in MB)."""
+    # ESS is the same portal for every account: one probe instead of a shared browser that can only time out
+    guard = portal_guard(config)
+    try:
+        if guard:
+            await asyncio.to_thread(guard.check)
+    except PortalUnavailable as e:
+        logger.warning(f"Skipping all {len(accounts)} account(s): {e}")
+        results = [finish_result(account, mark_unavailable(new_result(account), e)) for account in accounts]
+        return results, process_tree_rss_mb() or 0.0
+
+    # One at a time: an account without a token opens a consent page in the desktop browser
+    gcals = []
+    for account in accounts:
+        gcals.append(await asyncio.to_thread(authorize, account, config))
+
+    playwright = browser = None
+    if config["engine"] == "playwright":
+        from playwright.async_api import async_playwright
+
+        playwright = await async_playwright().start()
+        # Launched with the first account's context, relaunched when the governor recycles it
+        browser = SharedBrowser(playwright, browser_governor(config), headless=config["headless"])
+
+    gate = MemoryGate(memory_mb)
+    watcher = asyncio.create_task(gate.watch())
+    pool = asyncio.Semaphore(workers)
+    try:
+        results = await asyncio.gather(*(
+            sync_account(account, config, gcal, browser, pool, gate, force)
+            for account, gcal in zip(accounts, gcals)
+        ))
+    finally:
+        watcher.cancel()
+        if browser:
+            await browser.close()
+            await playwright.stop()
+    if gate.held:
+        logger.info(f"Memory ceiling held back {gate.held} account start(s)")
+    return results, gate.peak_mb
+
+
+def main():
+    from rich.console import Console
+    from rich.table import Table
+
+    ap = argparse.ArgumentParser(description="Sync the schedules of every account in an accounts file.")
+    ap.add_argument("--accounts", help="accounts file (default: FLEET_ACCOUNTS_FILE or accounts.json)")
+    ap.add_argument("--workers", type=int, help="accounts synced at once (default: FLEET_WORKERS or 3)")
+    ap.add_argument("--memory-mb", type=int, help="don't start more accounts above this much memory (0 = off)")
+    ap.add_argument("--force", action="store_true", help="sync even if a schedule looks unchanged")
+    ap.add_argument("--trace", action="store_true", help="write a Chrome trace-event file to traces/")
+    args = ap.parse_args()
+
+    setup_logging()
+    console = Console()
+    try:
+        config = load_config(require_account=False)
+        accounts = load_accounts(args.accounts or config["fleet_accounts_file"], default_venue=config["venue_id"])
+    except ValueError as e:
+        console.print(f"[bold red]Configuration Error:[/bold red] {e}")
+        logger.error(str(e))
+        return 2
+
+    metrics.setup(config)
+    workers = max(1, args.workers or config["fleet_workers"])
+    memory_mb = config["fleet_memory_mb"] if args.memory_mb is None else args.memory_mb
+
+    trace_dir = config["trace_dir"] or ("traces" if args.trace else None)
+    if trace_dir:
+        tracing.start(trace_path=tracing.run_path(trace_dir, "fleet-trace", ".json"))
+    started = time.time()
+    try:
+        results, peak_mb = asyncio.run(run_fleet(config, accounts, workers, memory_mb, args.force))
+    finally:
+        tracing.finish()
+    duration = time.time() - started
+
+    if config["metrics_textfile"]:
+        metrics.write_textfile(config["metrics_textfile"])
+    with open(FLEET_SUMMARY_FILE, "w") as f:
+        json.dump({"duration": duration, "workers": workers, "memory_ceiling_mb": memory_mb,
+                   "peak_memory_mb": peak_mb, "accounts": results}, f, indent=2)
+
+    table = Table(title="Fleet Results", show_header=True, header_style="bold magenta")
+    table.add_column("Account", style="cyan")
+    table.add_column("Events", justify="right")
+    table.add_column("Added", justify="right", style="green")
+    table.add_column("Updated", justify="right", style="blue")
+    table.add_column("Deleted", justify="right", style="yellow")
+    table.add_column("Time", justify="right")
+    table.add_column("Status")
+    for r in results:
+        counts = r["counts"]
+        if r.get("unchanged"):
+            status = "[dim]UNCHANGED[/dim]"
+        elif r.get("unavailable"):
+            status = f"[bold yellow]{r['error']}[/bold yellow]"
+        elif r["ok"]:
+            status = "[green]OK[/green]"
+        else:
+            status = f"[bold red]{r['error'] or 'ERRORS'}[/bold red]"
+        table.add_row(r["account"], str(r["events"]), str(counts.get("ADDED", 0)), str(counts.get("UPDATED", 0)),
+                      str(counts.get("DELETED", 0)), f"{r['duration']:.0f}s", status)
+    console.print(table)
+    console.print(f"{len(accounts)} account(s) in {duration:.0f}s with {workers} worker(s), "
+                  f"peak memory {peak_mb:.0f} MB")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
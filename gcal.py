@@ -1,24 +1,81 @@
 import os
+import re
+import copy
+import json
+import time
 import datetime
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 import logging
 
+from transport import (RateLimiter, classify_error, backoff_delay, execute_with_retry,
+                       RETRYABLE, RATE_LIMITED, DUPLICATE, NOT_FOUND, GONE)
+from metrics import CALENDAR_SECONDS, count_event
+from tracing import span, traced, profiled
+
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Google caps Calendar batches at 50 calls; larger batches get rejected outright.
+BATCH_SIZE = 50
+TIME_ZONE = 'America/Denver'
+
+# Every event we create carries this private property so we can tell our events apart.
+BOT_PROPERTY = ('abiBot', '1')
+# Events created before the property existed are recognised by their generate_event_id() ID.
+BOT_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+SYNC_STATE_FILE = 'gcal_sync.json'
+
+# Calendar discovery document trimmed to the events resource, built once from the copy
+# bundled with google-api-python-client and reused by every later run
+DISCOVERY_CACHE_FILE = 'calendar_v3_discovery.json'
+
+# Fields compared to decide whether an existing event needs a patch
+COMPARED_FIELDS = ('summary', 'location', 'description', 'start', 'end')
+
+
+def calendar_file(path, calendar_id):
+    """
+    Per-calendar variant of a state file: `path` itself for the primary calendar,
+    e.g. sync_ledger-work_group_calendar_google_com.db for any other.
+    """
+    if calendar_id == 'primary':
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{re.sub(r'[^A-Za-z0-9]+', '_', calendar_id).strip('_')[:60]}{ext}"
+
+
 class GoogleCalendarManager:
-    def __init__(self):
+    def __init__(self, max_qps=10.0, max_retries=5, http_timeout=30, token_file='token.json',
+                 sync_state_file=SYNC_STATE_FILE, calendar_id='primary', api_url=None):
         self.logger = logging.getLogger("ABI_Bot.GCal")
+        # Root URL of a stand-in Calendar API (benchmarks/fake_calendar.py); used without OAuth
+        self.api_url = api_url
+        # Fleet mode gives every account its own token and sync state
+        self.token_file = token_file
+        self.calendar_id = calendar_id
+        self._state_base = sync_state_file
+        self.sync_state_file = calendar_file(sync_state_file, calendar_id)
         self.service = None
+        self.limiter = RateLimiter(max_qps=max_qps)
+        self.max_retries = max_retries
+        self.http_timeout = http_timeout
+        self.creds = None
         self.authenticate()
 
+    @traced("gcal.authenticate", cat="calendar")
     def authenticate(self):
         """Authenticates with Google API."""
+        if self.api_url:
+            self.service = self._build_service()
+            self.logger.info(f"Using the Calendar API at {self.api_url} without authentication")
+            return
+
+        # Imported here so tools that never talk to Google don't pay for these imports
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         creds = None
-        if os.path.exists('token.json'):
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        if os.path.exists(self.token_file):
+            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
@@ -38,41 +95,418 @@ class GoogleCalendarManager:
                 flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
                 creds = flow.run_local_server(port=0)
             
-            with open('token.json', 'w') as token:
+            with open(self.token_file, 'w') as token:
                 token.write(creds.to_json())
 
-        self.service = build('calendar', 'v3', credentials=creds)
+        self.creds = creds
+        self.service = self._build_service()
         self.logger.info("Google Service Authenticated")
 
+    def _build_service(self):
+        from googleapiclient.discovery import build_from_document
+        from google_auth_httplib2 import AuthorizedHttp
+        import httplib2
+
+        if self.api_url:
+            # Batch requests go to rootUrl + batchPath, so the document itself is pointed at the server
+            doc = json.loads(load_discovery_document())
+            doc['rootUrl'] = self.api_url.rstrip('/') + '/'
+            return build_from_document(doc, http=httplib2.Http(timeout=self.http_timeout))
+
+        # One long-lived Http object keeps the TLS connection to Google open across calls
+        http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.http_timeout))
+        return build_from_document(load_discovery_document(), http=http)
+
+    def fork(self):
+        """
+        Copy for use on another thread. httplib2 connections aren't thread-safe, so the copy
+        gets its own; credentials and the rate limiter are shared.
+        """
+        clone = copy.copy(self)
+        if self.service:
+            clone.service = self._build_service()
+        return clone
+
+    def for_calendar(self, calendar_id):
+        """Manager for another calendar of the same Google account, with its own connection and sync state."""
+        if calendar_id == self.calendar_id:
+            return self
+        clone = self.fork()
+        clone.calendar_id = calendar_id
+        clone.sync_state_file = calendar_file(self._state_base, calendar_id)
+        return clone
+
+    def _build_body(self, event_data, unique_id):
+        """Calendar API request body for a ShiftEvent: its cached body plus the event ID."""
+        body = dict(event_data.calendar_body)
+        if unique_id is not None:
+            body['id'] = unique_id
+        return body
+
     def sync_event(self, event_data, unique_id):
         """Syncs a single event. Returns status string."""
         if not self.service:
             return "NO_SERVICE"
 
-        event_body = {
-            'summary': event_data['summary'],
-            'location': event_data['location'],
-            'description': event_data['description'],
-            'start': {
-                'dateTime': event_data['start'].isoformat(),
-                'timeZone': 'America/Denver',
-            },
-            'end': {
-                'dateTime': event_data['end'].isoformat(),
-                'timeZone': 'America/Denver',
-            },
-            'id': unique_id,
-            'colorId': '6',
-            'reminders': {'useDefault': False, 'overrides': [{'method': 'popup', 'minutes': 24 * 60}]},
-        }
+        event_body = self._build_body(event_data, unique_id)
 
         try:
-            self.service.events().insert(calendarId='primary', body=event_body).execute()
-            self.logger.info(f"Added event: {event_data['summary']}")
+            self._execute(self.service.events().insert(calendarId=self.calendar_id, body=event_body))
+            self.logger.info(f"Added event: {event_data.summary}")
+            count_event("ADDED", "inserted")
             return "ADDED"
         except Exception as e:
-            if "already exists" in str(e) or "409" in str(e):
+            error = classify_error(e)
+            if error == DUPLICATE:
                 # Optional details update could go here
+                count_event("SKIPPED", DUPLICATE)
                 return "SKIPPED"
-            self.logger.error(f"Failed to add event {event_data['summary']}: {e}")
+            self.logger.error(f"Failed to add event {event_data.summary}: {e}")
+            count_event("ERROR", error)
             return f"ERROR: {e}"
+
+    def sync_events(self, events, unique_ids, progress=None):
+        """Inserts many events using batched requests. Returns one status per event."""
+        on_done = (lambda kind, i, status: progress(i, status)) if progress else None
+        return self.apply_changes(adds=zip(events, unique_ids), progress=on_done)['adds']
+
+    @traced("gcal.reconcile_events", cat="calendar")
+    def reconcile_events(self, events, unique_ids, incremental=False, progress=None, existing=None):
+        """
+        Syncs events by diffing against what is already on the calendar.
+        Existing events are fetched once, so only new or changed events cost a write.
+        `existing` skips the fetch when the caller already has the listing.
+        Returns one status per event.
+        """
+        if not self.service:
+            return ["NO_SERVICE"] * len(events)
+        if not events:
+            return []
+
+        time_min = min(e.start for e in events)
+        time_max = max(e.end for e in events)
+        try:
+            if existing is None:
+                existing = (self.fetch_changed_events() if incremental
+                            else self.list_bot_events(time_min, time_max))
+        except Exception as e:
+            # Fall back to blind inserts, duplicates still resolve to SKIPPED
+            self.logger.warning(f"Could not prefetch existing events, inserting blindly: {e}")
+            return self.sync_events(events, unique_ids, progress=progress)
+
+        statuses = [None] * len(events)
+        adds, add_idx, updates, update_idx = [], [], [], []
+        with span("gcal.diff", cat="calendar", events=len(events)), profiled():
+            for i, (evt, uid) in enumerate(zip(events, unique_ids)):
+                current = existing.get(uid)
+                if current is None:
+                    adds.append((evt, uid))
+                    add_idx.append(i)
+                elif current != _comparable(evt.calendar_body):
+                    updates.append((evt, uid))
+                    update_idx.append(i)
+                else:
+                    statuses[i] = "SKIPPED"
+                    count_event("SKIPPED", "unchanged")
+                    if progress:
+                        progress(i, "SKIPPED")
+
+        self.logger.info(f"Reconcile plan: {len(adds)} to add, {len(updates)} to update, "
+                         f"{len(events) - len(adds) - len(updates)} unchanged")
+
+        index = {'adds': add_idx, 'updates': update_idx}
+
+        def on_done(kind, i, status):
+            if progress:
+                progress(index[kind][i], status)
+
+        results = self.apply_changes(adds=adds, updates=updates, progress=on_done)
+        for kind in ('adds', 'updates'):
+            for i, status in zip(index[kind], results[kind]):
+                statuses[i] = status
+        return statuses
+
+    @traced("gcal.list_bot_events", cat="calendar")
+    def list_bot_events(self, time_min, time_max):
+        """Lists the bot's events between two naive local datetimes. Returns {event_id: comparable fields}."""
+        found = {}
+        page_token = None
+        while True:
+            resp = self._execute(self.service.events().list(
+                calendarId=self.calendar_id,
+                timeMin=_rfc3339(time_min),
+                timeMax=_rfc3339(time_max + datetime.timedelta(days=1)),
+                timeZone=TIME_ZONE,
+                singleEvents=True,
+                maxResults=2500,
+                pageToken=page_token,
+            ))
+            for item in resp.get('items', []):
+                if _is_bot_event(item):
+                    found[item['id']] = _comparable(item)
+            page_token = resp.get('nextPageToken')
+            if not page_token:
+                break
+        self.logger.info(f"Prefetched {len(found)} existing bot events")
+        return found
+
+    @traced("gcal.fetch_changed_events", cat="calendar")
+    def fetch_changed_events(self):
+        """
+        Incremental listing using Calendar sync tokens.
+        The bot's events are cached in self.sync_state_file; after the first full listing
+        only events changed since the last run are downloaded.
+        Returns {event_id: comparable fields} for every known bot event.
+        """
+        state = {}
+        if os.path.exists(self.sync_state_file):
+            try:
+                with open(self.sync_state_file, 'r') as f:
+                    state = json.load(f)
+            except Exception as e:
+                self.logger.warning(f"Ignoring unreadable sync state: {e}")
+                state = {}
+
+        cached = state.get('events', {})
+        sync_token = state.get('syncToken')
+        if not sync_token:
+            self.logger.info("No sync token yet, doing a full listing...")
+            cached = {}
+
+        page_token = None
+        while True:
+            # Sync token requests must repeat the parameters of the initial listing
+            params = {'calendarId': self.calendar_id, 'timeZone': TIME_ZONE, 'singleEvents': True,
+                      'maxResults': 2500, 'pageToken': page_token}
+            if sync_token:
+                params['syncToken'] = sync_token
+            try:
+                resp = self._execute(self.service.events().list(**params))
+            except Exception as e:
+                if sync_token and classify_error(e) == GONE:
+                    # Token expired server side, start over with a full listing
+                    self.logger.warning("Sync token expired, doing a full listing...")
+                    sync_token, cached, page_token = None, {}, None
+                    continue
+                raise
+
+            for item in resp.get('items', []):
+                if item.get('status') == 'cancelled':
+                    cached.pop(item['id'], None)
+                elif _is_bot_event(item):
+                    cached[item['id']] = _comparable(item)
+
+            page_token = resp.get('nextPageToken')
+            if not page_token:
+                state = {'syncToken': resp.get('nextSyncToken'), 'events': cached}
+                break
+
+        with open(self.sync_state_file, 'w') as f:
+            json.dump(state, f)
+        self.logger.info(f"Tracking {len(cached)} bot events (incremental listing)")
+        return cached
+
+    @traced("gcal.apply_changes", cat="calendar")
+    def apply_changes(self, adds=(), updates=(), deletes=(), progress=None):
+        """
+        Sends inserts, patches and deletes as Calendar batch requests.
+        adds/updates are (ShiftEvent, event ID) pairs, deletes are event IDs.
+        Returns {'adds': [...], 'updates': [...], 'deletes': [...]} with a status per item,
+        in the same order they were passed in.
+        """
+        adds, updates, deletes = list(adds), list(updates), list(deletes)
+        if not self.service:
+            return {'adds': ["NO_SERVICE"] * len(adds),
+                    'updates': ["NO_SERVICE"] * len(updates),
+                    'deletes': ["NO_SERVICE"] * len(deletes)}
+        results = {'adds': [None] * len(adds), 'updates': [None] * len(updates), 'deletes': [None] * len(deletes)}
+
+        # Requests are built lazily so a retried call gets a fresh request object
+        events = self.service.events
+        calls = []
+        for i, (event_data, unique_id) in enumerate(adds):
+            body = self._build_body(event_data, unique_id)
+            calls.append((('adds', i), lambda body=body: events().insert(calendarId=self.calendar_id, body=body),
+                          event_data.summary))
+        for i, (event_data, event_id) in enumerate(updates):
+            body = self._build_body(event_data, None)
+            calls.append((('updates', i),
+                          lambda body=body, event_id=event_id: events().patch(
+                              calendarId=self.calendar_id, eventId=event_id, body=body),
+                          event_data.summary))
+        for i, event_id in enumerate(deletes):
+            calls.append((('deletes', i), lambda event_id=event_id: events().delete(
+                calendarId=self.calendar_id, eventId=event_id), event_id))
+
+        def finish(kind, i, status):
+            results[kind][i] = status
+            if progress:
+                progress(kind, i, status)
+
+        attempt = 0
+        pending = calls
+        while pending:
+            retry = []
+            for start in range(0, len(pending), BATCH_SIZE):
+                retry.extend(self._run_batch(pending[start:start + BATCH_SIZE], attempt, finish))
+            if not retry:
+                break
+            delay = backoff_delay(attempt)
+            self.logger.info(f"Retrying {len(retry)} call(s) in {delay:.1f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+            attempt += 1
+            pending = retry
+
+        return results
+
+    def _run_batch(self, calls, attempt, finish):
+        """Sends one batch. Returns the calls worth retrying; every other call is passed to finish()."""
+        chunk = {str(n): call for n, call in enumerate(calls)}
+        retry = []
+        answered = set()
+        rate_limited = [False]
+
+        def on_done(request_id, response, exception):
+            answered.add(request_id)
+            call = chunk[request_id]
+            (kind, i), _, name = call
+            if exception is not None:
+                error = classify_error(exception)
+                if error in RETRYABLE and attempt < self.max_retries:
+                    rate_limited[0] = rate_limited[0] or error == RATE_LIMITED
+                    retry.append(call)
+                    return
+            finish(kind, i, self._call_status(kind, exception, name))
+
+        self.limiter.acquire(len(chunk))
+        batch = self.service.new_batch_http_request(callback=on_done)
+        for request_id, (_, make_request, _) in chunk.items():
+            batch.add(make_request(), request_id=request_id)
+
+        try:
+            with CALENDAR_SECONDS.time(method="batch"), span("gcal.batch", cat="calendar",
+                                                             calls=len(chunk), attempt=attempt):
+                batch.execute()
+        except Exception as e:
+            # Whole batch failed (network, auth). Only the calls the callback never reached are affected.
+            unanswered = [call for request_id, call in chunk.items() if request_id not in answered]
+            if classify_error(e) in RETRYABLE and attempt < self.max_retries:
+                self.logger.warning(f"Batch request failed, will retry: {e}")
+                retry.extend(unanswered)
+            else:
+                self.logger.error(f"Batch request failed: {e}")
+                for (kind, i), _, _ in unanswered:
+                    count_event("ERROR", classify_error(e))
+                    finish(kind, i, f"ERROR: {e}")
+            return retry
+
+        if rate_limited[0]:
+            self.limiter.on_rate_limited()
+        else:
+            self.limiter.on_success()
+        return retry
+
+    def _execute(self, request):
+        return execute_with_retry(request, limiter=self.limiter, max_retries=self.max_retries)
+
+    def _call_status(self, kind, exception, name):
+        """
+        Maps the outcome of one batched call to the status strings shown in the results table,
+        counting it in abi_bot_events_total on the way.
+        """
+        if exception is None:
+            if kind == 'adds':
+                self.logger.info(f"Added event: {name}")
+                count_event("ADDED", "inserted")
+                return "ADDED"
+            if kind == 'updates':
+                self.logger.info(f"Updated event: {name}")
+                count_event("UPDATED", "patched")
+                return "UPDATED"
+            self.logger.info(f"Deleted event: {name}")
+            count_event("DELETED", "deleted")
+            return "DELETED"
+
+        error = classify_error(exception)
+        if kind == 'adds' and error == DUPLICATE:
+            count_event("SKIPPED", DUPLICATE)
+            return "SKIPPED"
+        if kind == 'deletes' and error in (NOT_FOUND, GONE):
+            # Already gone from the calendar, nothing left to do
+            count_event("DELETED", "already_gone")
+            return "DELETED"
+        self.logger.error(f"Failed to sync event {name}: {exception}")
+        count_event("ERROR", error)
+        return f"ERROR: {exception}"
+
+
+def _rfc3339(dt):
+    """Calendar list bounds need an explicit offset; naive datetimes are treated as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.isoformat()
+
+
+def _is_bot_event(item):
+    props = item.get('extendedProperties', {}).get('private', {})
+    return props.get(BOT_PROPERTY[0]) == BOT_PROPERTY[1] or bool(BOT_ID_RE.match(item.get('id', '')))
+
+
+def _comparable(body):
+    """Reduces an event resource to the fields we own, in a form comparable across our body and API responses."""
+    out = {}
+    for field in COMPARED_FIELDS:
+        value = body.get(field)
+        if field in ('start', 'end'):
+            # API responses carry an offset ("...-07:00"), our bodies don't
+            value = (value or {}).get('dateTime', '')[:19]
+        out[field] = value or ''
+    return out
+
+
+def _schema_refs(node, found):
+    """Collects every schema name referenced with $ref under `node`."""
+    if isinstance(node, dict):
+        ref = node.get('$ref')
+        if isinstance(ref, str):
+            found.add(ref)
+        for value in node.values():
+            _schema_refs(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _schema_refs(value, found)
+    return found
+
+
+def prune_discovery_document(doc, resources=('events',)):
+    """Drops every resource except `resources` and the schemas they don't use."""
+    doc = dict(doc)
+    doc['resources'] = {k: v for k, v in doc['resources'].items() if k in resources}
+    needed = _schema_refs(doc['resources'], set())
+    pending = list(needed)
+    while pending:
+        for ref in _schema_refs(doc['schemas'].get(pending.pop(), {}), set()):
+            if ref not in needed:
+                needed.add(ref)
+                pending.append(ref)
+    doc['schemas'] = {k: v for k, v in doc['schemas'].items() if k in needed}
+    return doc
+
+
+def load_discovery_document(path=DISCOVERY_CACHE_FILE):
+    """Returns the trimmed Calendar discovery document, creating the local cache if needed. Never hits the network."""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except OSError:
+            pass
+
+    from googleapiclient.discovery_cache import get_static_doc
+    doc = json.dumps(prune_discovery_document(json.loads(get_static_doc('calendar', 'v3'))), separators=(',', ':'))
+    try:
+        with open(path, 'w') as f:
+            f.write(doc)
+    except OSError as e:
+        logging.getLogger("ABI_Bot.GCal").warning(f"Could not cache discovery document: {e}")
+    return doc
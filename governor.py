@@ -0,0 +1,223 @@
+"""
+Resource governor for the Playwright layer.
+
+A warm tray browser or the fleet's shared Chromium only ever grows: renderer
+caches, leaked pages, V8 heaps. The governor keeps that footprint predictable:
+- low-memory launch flags and a smaller viewport (BROWSER_LOW_MEMORY)
+- at most BROWSER_MAX_PAGES pages per context, popups beyond that are closed
+- at most BROWSER_MAX_CONTEXTS contexts at once in a shared browser (fleet.py)
+- the browser process tree is sampled during every run and its peak recorded
+  (log and abi_bot_browser_peak_memory_mb)
+- a browser that served BROWSER_RECYCLE_RUNS runs, or went over
+  BROWSER_RECYCLE_MB, is closed and relaunched for the next run
+"""
+import time
+import asyncio
+import logging
+import threading
+
+from utils import process_tree_rss_mb
+from metrics import BROWSER_LAUNCHES, BROWSER_PEAK_MB, BROWSER_RECYCLES
+
+logger = logging.getLogger("ABI_Bot.Governor")
+
+BASE_ARGS = ["--disable-blink-features=AutomationControlled"]
+
+# Nothing the schedule pages need: extensions, background services, GPU, translation,
+# the back/forward cache. The renderer and V8 heap limits keep a leaking page in check.
+LOW_MEMORY_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-gpu",
+    "--no-first-run",
+    "--mute-audio",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,BackForwardCache",
+    "--renderer-process-limit=2",
+    "--disk-cache-size=33554432",
+    "--js-flags=--max-old-space-size=256",
+]
+
+VIEWPORT = {"width": 1280, "height": 720}
+# The calendar lays out fine at this size and every frame buffer is smaller
+LOW_MEMORY_VIEWPORT = {"width": 1024, "height": 640}
+
+SAMPLE_SECONDS = 1.0
+
+
+class BrowserGovernor:
+    def __init__(self, low_memory=True, max_pages=2, max_contexts=0, recycle_runs=20, recycle_mb=1024,
+                 sample_seconds=SAMPLE_SECONDS):
+        self.low_memory = low_memory
+        self.max_pages = max_pages
+        self.max_contexts = max_contexts
+        self.recycle_runs = recycle_runs
+        self.recycle_mb = recycle_mb
+        self.sample_seconds = sample_seconds
+        # Runs served and highest memory seen by the current browser
+        self.runs = 0
+        self.browser_peak_mb = 0.0
+        self.run_peak_mb = 0.0
+        self.last_peak_mb = None
+        self._sampler = None
+        self._unmeasured = False
+
+    @property
+    def launch_args(self):
+        return BASE_ARGS + (LOW_MEMORY_ARGS if self.low_memory else [])
+
+    @property
+    def viewport(self):
+        return dict(LOW_MEMORY_VIEWPORT if self.low_memory else VIEWPORT)
+
+    def attach(self, context):
+        """Closes pages beyond max_pages as soon as they open (sync API)."""
+        if not self.max_pages:
+            return
+
+        def on_page(page):
+            if self._over_cap(context, page):
+                page.close()
+        context.on("page", on_page)
+
+    async def attach_async(self, context):
+        """attach() for a playwright.async_api context."""
+        if not self.max_pages:
+            return
+
+        async def on_page(page):
+            if self._over_cap(context, page):
+                await page.close()
+        context.on("page", on_page)
+
+    def _over_cap(self, context, page):
+        if len(context.pages) <= self.max_pages:
+            return False
+        logger.info(f"Closing extra page {page.url or 'about:blank'} ({len(context.pages)} open, cap {self.max_pages})")
+        return True
+
+    def sample(self):
+        """RSS of the browser process tree (everything this process started) in MB, None if unknown."""
+        rss = process_tree_rss_mb(children_only=True)
+        if rss is None:
+            if not self._unmeasured:
+                self._unmeasured = True
+                logger.warning("Can't measure the browser's memory here (is psutil installed?): "
+                               "no peaks are recorded and BROWSER_RECYCLE_MB has no effect")
+        else:
+            self.browser_peak_mb = max(self.browser_peak_mb, rss)
+            self.run_peak_mb = max(self.run_peak_mb, rss)
+        return rss
+
+    def start_run(self):
+        """Samples the browser's memory in the background until end_run()."""
+        self.run_peak_mb = 0.0
+        self._run_started = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_until, args=(self._stop,), name="browser-rss",
+                                         daemon=True)
+        self._sampler.start()
+
+    def _sample_until(self, stop):
+        self.sample()
+        while not stop.wait(self.sample_seconds):
+            self.sample()
+
+    def end_run(self):
+        """Stops sampling and records the run's peak. Returns it in MB."""
+        if self._sampler is None:
+            return None
+        self._stop.set()
+        self._sampler.join()
+        self._sampler = None
+        self.sample()
+        self.runs += 1
+        self.last_peak_mb = self.run_peak_mb
+        BROWSER_PEAK_MB.set(round(self.run_peak_mb, 1))
+        logger.info(f"Browser peak memory {self.run_peak_mb:.0f} MB over {time.perf_counter() - self._run_started:.1f}s "
+                    f"(run {self.runs} of this browser)")
+        return self.run_peak_mb
+
+    def recycle_reason(self):
+        """Why the current browser should be replaced before the next run, None if it can stay."""
+        if self.recycle_runs and self.runs >= self.recycle_runs:
+            return "runs"
+        if self.recycle_mb and self.browser_peak_mb >= self.recycle_mb:
+            return "memory"
+        return None
+
+    def recycled(self, reason):
+        """Counts a recycle; the caller closes the browser."""
+        logger.info(f"Recycling the browser after {self.runs} run(s), peak {self.browser_peak_mb:.0f} MB ({reason})")
+        BROWSER_RECYCLES.inc(reason=reason)
+
+    def new_browser(self):
+        """Call when a fresh browser was launched: its run count and peak start over."""
+        self.runs = 0
+        self.browser_peak_mb = 0.0
+
+
+class SharedBrowser:
+    """
+    A Chromium several async scrapers open their contexts in (fleet.py), with
+    the governor's context cap. Once the governor wants it recycled, new
+    contexts wait until the open ones are closed, then get a fresh browser.
+    Duck-types the one Browser method AsyncESSScraper uses, new_context().
+    """
+
+    def __init__(self, playwright, governor, headless=True):
+        self.playwright = playwright
+        self.governor = governor
+        self.headless = headless
+        self._browser = None
+        self._active = 0
+        self._cond = asyncio.Condition()
+
+    async def new_context(self, **kwargs):
+        async with self._cond:
+            while self._busy():
+                await self._cond.wait()
+            self.governor.sample()
+            reason = self.governor.recycle_reason() if self._browser else None
+            if reason:
+                self.governor.recycled(reason)
+                await self._close_browser()
+            if self._browser is None:
+                await self._launch()
+            context = await self._browser.new_context(**kwargs)
+            self._active += 1
+        context.on("close", lambda _: asyncio.ensure_future(self._released()))
+        return context
+
+    def _busy(self):
+        if self.governor.max_contexts and self._active >= self.governor.max_contexts:
+            return True
+        # Drain before recycling instead of pulling the browser out from under running scrapes
+        return bool(self._active and self._browser and self.governor.recycle_reason())
+
+    async def _released(self):
+        async with self._cond:
+            self._active -= 1
+            self.governor.runs += 1
+            self.governor.sample()
+            self._cond.notify_all()
+
+    async def _launch(self):
+        logger.info(f"Launching shared browser (Headless: {self.headless}, low memory: {self.governor.low_memory})")
+        self._browser = await self.playwright.chromium.launch(headless=self.headless, args=self.governor.launch_args)
+        BROWSER_LAUNCHES.inc()
+        self.governor.new_browser()
+
+    async def _close_browser(self):
+        browser, self._browser = self._browser, None
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.debug(f"Ignoring error while closing browser: {e}")
+
+    async def close(self):
+        if self._browser:
+            await self._close_browser()
@@ -0,0 +1,247 @@
+import re
+import logging
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+from ess_parser import parse_month
+from scraper import ESS_URL, SCHEDULE_LINKS, complete_months, month_postbacks, scrape_step
+from portal import USER_AGENT
+from tracing import profiled
+
+DO_POSTBACK_RE = re.compile(r"__doPostBack\('([^']*)'\s*,\s*'([^']*)'\)")
+# Month posts in flight at once, what a browser allows per host; more just gets connections reset
+MAX_PARALLEL_MONTHS = 6
+
+
+def _is_outage(error):
+    """Connection problems, timeouts and server errors, as opposed to e.g. a 404 or a rejected login."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code >= 500
+
+
+class UnsupportedPage(Exception):
+    """The portal served something the HTTP engine can't drive without a browser."""
+
+
+class HTTPScraper:
+    """
+    Browserless ESS scraper with the same scrape_schedule() contract as ESSScraper.
+    Replays the venue and login form posts and the schedule postbacks over a
+    pooled requests.Session, carrying cookies and hidden ASP.NET fields.
+    Pages it doesn't recognise hand the run over to `fallback` (normally an ESSScraper).
+    With a `portal` guard (see portal.py), connection failures, timeouts and 5xx
+    answers raise PortalUnavailable instead of falling back to a browser.
+    """
+
+    def __init__(self, venue_id, username, password, months_ahead=0, parser_backend="auto",
+                 base_url=ESS_URL, fallback=None, timeout=20, fingerprints=None, force=False, portal=None):
+        self.venue_id = venue_id
+        self.username = username
+        self.password = password
+        self.months_ahead = months_ahead
+        self.parser_backend = parser_backend
+        self.base_url = base_url
+        self.fallback = fallback
+        self.timeout = timeout
+        self.fingerprints = fingerprints
+        self.force = force
+        self.portal = portal
+        # Months the last scrape parsed completely (see scraper.complete_months), for deletions
+        self.months = ()
+        self.logger = logging.getLogger("ABI_Bot.HTTPScraper")
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_PARALLEL_MONTHS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def scrape_schedule(self):
+        """Scrapes the ESS schedule and returns a list of event dicts."""
+        self.months = ()
+        if self.portal:
+            # The login GET is as cheap as a probe, so only the breaker is asked here
+            self.portal.check(probe=False)
+        try:
+            with scrape_step("login"):
+                url, html = self._login()
+            with scrape_step("navigation"):
+                url, html = self._navigate_to_schedule(url, html)
+            with scrape_step("fetch"):
+                pages = [html] + self._fetch_next_months(url, html)
+        except UnsupportedPage as e:
+            if self.fallback:
+                self.logger.warning(f"HTTP engine can't handle this page ({e}), falling back to the browser.")
+                events = self.fallback.scrape_schedule()
+                self.months = getattr(self.fallback, "months", ())
+                return events
+            self.logger.error(f"Scrape Error: {e}")
+            return []
+        except requests.RequestException as e:
+            self.logger.error(f"Scrape Error: {e}")
+            if self.portal and _is_outage(e):
+                self.portal.failed(f"{type(e).__name__}: {e}")
+            return []
+        if self.portal:
+            self.portal.succeeded()
+
+        if self.fingerprints:
+            self.fingerprints.check(pages, force=self.force)
+
+        events = []
+        seen = set()
+        months = []
+        for html in pages:
+            with scrape_step("parse"), profiled():
+                month, parsed = parse_month(html, self.parser_backend)
+            months.append(month)
+            for evt in parsed:
+                if evt not in seen:
+                    seen.add(evt)
+                    events.append(evt)
+        events.sort()
+        self.months = complete_months(months, self.months_ahead)
+        self.logger.info(f"Scraped {len(events)} events across {len(pages)} month(s) over HTTP.")
+        return events
+
+    def _get(self, url):
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.url, resp.text
+
+    def _post(self, url, form, fields):
+        action = urljoin(url, form.get("action") or url)
+        resp = self.session.post(action, data=fields, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.url, resp.text
+
+    def _login(self):
+        self.logger.info("Navigating to ESS (HTTP)...")
+        url, html = self._get(self.base_url)
+        soup = BeautifulSoup(html, "html.parser")
+
+        venue = soup.find("input", id="input_venue")
+        if venue is not None:
+            self.logger.info("Entering Venue ID...")
+            form = _form_of(venue, soup)
+            fields = _form_fields(form)
+            fields[venue.get("name") or "input_venue"] = self.venue_id
+            url, html = self._post(url, form, fields)
+            soup = BeautifulSoup(html, "html.parser")
+            if soup.find("input", id="input_venue") is not None:
+                raise UnsupportedPage("venue form did not advance")
+
+        login = soup.find("input", id="LoginId")
+        if login is not None:
+            self.logger.info("Logging in...")
+            form = _form_of(login, soup)
+            pin = soup.find("input", id="PIN")
+            if pin is None:
+                raise UnsupportedPage("login form without a PIN field")
+            fields = _form_fields(form)
+            fields[login.get("name") or "LoginId"] = self.username
+            fields[pin.get("name") or "PIN"] = self.password
+            button = soup.find(id="loginButton")
+            if button is not None and button.get("name") and button.get("type", "submit") == "submit":
+                fields[button["name"]] = button.get("value", "")
+            url, html = self._post(url, form, fields)
+            if 'id="LoginId"' in html:
+                raise UnsupportedPage("still on the login form after posting it")
+        return url, html
+
+    def _navigate_to_schedule(self, url, html):
+        self.logger.info("Locating Schedule...")
+        if "calendar_day_box" in html:
+            return url, html
+
+        soup = BeautifulSoup(html, "html.parser")
+        link = None
+        for link_text in SCHEDULE_LINKS:
+            link = soup.find("a", string=lambda s: s and link_text in s)
+            if link is not None:
+                break
+        if link is None:
+            raise UnsupportedPage("no schedule link")
+
+        href = link.get("href", "")
+        postback = DO_POSTBACK_RE.search(href)
+        if postback:
+            url, html = self._postback(url, soup, *postback.groups())
+        elif href and not href.lower().startswith("javascript:"):
+            url, html = self._get(urljoin(url, href))
+        else:
+            raise UnsupportedPage(f"schedule link needs scripting: {href}")
+
+        if "calendar_day_box" not in html:
+            raise UnsupportedPage("schedule page has no calendar")
+        return url, html
+
+    def _postback(self, url, soup, target, argument):
+        form = soup.find("form")
+        if form is None:
+            raise UnsupportedPage("postback without a form")
+        fields = _form_fields(form)
+        fields["__EVENTTARGET"] = target
+        fields["__EVENTARGUMENT"] = argument
+        return self._post(url, form, fields)
+
+    def _fetch_next_months(self, url, html):
+        """Posts the extra month views over the pooled session, MAX_PARALLEL_MONTHS at a time."""
+        if self.months_ahead <= 0:
+            return []
+        soup = BeautifulSoup(html, "html.parser")
+        link = soup.find("a", title=re.compile("next", re.I)) or soup.find(
+            "a", string=lambda s: s and s.strip() in (">", ">>", "»", "Next"))
+        postback = month_postbacks(link.get("href") if link else None, self.months_ahead)
+        if not postback:
+            self.logger.warning("No next-month postback found, only the current month is synced.")
+            return []
+
+        target, args = postback
+        self.logger.info(f"Fetching {len(args)} more month(s) concurrently...")
+        with ThreadPoolExecutor(max_workers=min(len(args), MAX_PARALLEL_MONTHS)) as pool:
+            results = list(pool.map(lambda arg: self._month(url, soup, target, arg), args))
+        return results
+
+    def _month(self, url, soup, target, argument):
+        """One month view. A page without a calendar (error, expired session) is not an empty month."""
+        _, html = self._postback(url, soup, target, argument)
+        if "calendar_day_box" not in html:
+            raise UnsupportedPage(f"month {argument} came back without a calendar")
+        return html
+
+
+def _form_of(element, soup):
+    form = element.find_parent("form") or soup.find("form")
+    if form is None:
+        raise UnsupportedPage("input outside of a form")
+    return form
+
+
+def _form_fields(form):
+    """What a browser would submit for `form` without clicking any button."""
+    fields = {}
+    for inp in form.find_all("input"):
+        name = inp.get("name")
+        kind = (inp.get("type") or "text").lower()
+        if not name or kind in ("submit", "button", "image", "reset", "file"):
+            continue
+        if kind in ("checkbox", "radio") and not inp.has_attr("checked"):
+            continue
+        fields[name] = inp.get("value", "on" if kind in ("checkbox", "radio") else "")
+    for select in form.find_all("select"):
+        if not select.get("name"):
+            continue
+        option = select.find("option", selected=True) or select.find("option")
+        if option is not None:
+            fields[select["name"]] = option.get("value", option.get_text())
+    for area in form.find_all("textarea"):
+        if area.get("name"):
+            fields[area["name"]] = area.get_text()
+    return fields
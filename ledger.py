@@ -0,0 +1,127 @@
+import sqlite3
+import datetime
+import logging
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shifts (
+    shift_key    TEXT PRIMARY KEY,
+    event_id     TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    shift_date   TEXT NOT NULL,
+    summary      TEXT,
+    synced_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_shifts_event_id ON shifts(event_id);
+CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts(shift_date);
+"""
+
+
+class SyncLedger:
+    """
+    Local record of every shift we have pushed to the calendar.
+    Lets a run skip unchanged shifts without touching the API, patch the
+    original event when a shift changes, and delete events for shifts that
+    disappeared from ESS.
+    """
+
+    def __init__(self, path="sync_ledger.db"):
+        self.logger = logging.getLogger("ABI_Bot.Ledger")
+        self.path = path
+        # Shared by the async pipeline's sync threads, every method holds the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def plan(self, events, months=()):
+        """
+        Splits scraped events by what the ledger knows about them.
+        Returns a dict with:
+          'unchanged':  [event index]
+          'changed':    [(event index, calendar event ID)]
+          'new':        [event index]
+          'removed':    [(shift_key, calendar event ID, shift_date, summary)]
+          'superseded': [shift_key] of gone shifts whose calendar event is now a scraped
+                        shift's (re-keyed, e.g. it got an ESS ID); only the row should go
+        Only ledger rows in `months` ("YYYY-MM", the months the scrape fully parsed) can be
+        'removed', so a month that wasn't scraped, or didn't load, never loses its shifts.
+        """
+        with self.lock:
+            return self._plan(events, months)
+
+    def _plan(self, events, months):
+        plan = {'unchanged': [], 'changed': [], 'new': [], 'removed': [], 'superseded': []}
+        if not events:
+            return plan
+
+        columns = "SELECT shift_key, event_id, content_hash, shift_date, summary FROM shifts "
+        first = min(e.start for e in events).date().isoformat()
+        last = max(e.start for e in events).date().isoformat()
+        known = {row[0]: row for row in self.conn.execute(
+            columns + "WHERE shift_date BETWEEN ? AND ?", (first, last))}
+        months = sorted(set(months or ()))
+        candidates = {row[0]: row for row in self.conn.execute(
+            columns + f"WHERE substr(shift_date, 1, 7) IN ({', '.join('?' * len(months))})", months)} if months else {}
+
+        seen = set()
+        live = set()
+        for i, evt in enumerate(events):
+            key = evt.key
+            seen.add(key)
+            row = known.get(key) or candidates.get(key)
+            if row is None:
+                # Might still be in the ledger if it moved in from outside the range
+                row = self.conn.execute(columns + "WHERE shift_key = ?", (key,)).fetchone()
+            if row is None:
+                plan['new'].append(i)
+                live.add(evt.event_id)
+            elif row[2] == evt.content_hash:
+                plan['unchanged'].append(i)
+                live.add(row[1])
+            else:
+                plan['changed'].append((i, row[1]))
+                live.add(row[1])
+
+        for key, row in candidates.items():
+            if key in seen:
+                continue
+            if row[1] in live:
+                # Deleting it would take the current shift's event with it
+                plan['superseded'].append(key)
+            else:
+                plan['removed'].append((key, row[1], row[3], row[4]))
+
+        self.logger.info(
+            f"Ledger plan: {len(plan['new'])} new, {len(plan['changed'])} changed, "
+            f"{len(plan['unchanged'])} unchanged, {len(plan['removed'])} removed"
+        )
+        return plan
+
+    def record(self, events_with_ids):
+        """Stores (ShiftEvent, calendar event ID) pairs after a successful write."""
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            self._record(now, events_with_ids)
+
+    def _record(self, now, events_with_ids):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO shifts (shift_key, event_id, content_hash, shift_date, summary, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (evt.key, event_id, evt.content_hash, evt.shift_date, evt.summary, now)
+                for evt, event_id in events_with_ids
+            ]
+        )
+        self.conn.commit()
+
+    def forget(self, keys):
+        """Drops shifts whose calendar events were deleted."""
+        with self.lock:
+            self.conn.executemany("DELETE FROM shifts WHERE shift_key = ?", [(k,) for k in keys])
+            self.conn.commit()
@@ -0,0 +1,124 @@
+"""
+Logging pipeline.
+
+Log calls only put the record on a queue; a background thread formats it and
+writes it to the file (and, with a terminal attached, to the rich console).
+The log file rotates by size (LOG_ROTATE=size, LOG_MAX_MB) or at midnight
+(LOG_ROTATE=daily), keeps LOG_BACKUPS gzipped segments, and can be written
+as one JSON object per line (LOG_FORMAT=json).
+"""
+import os
+import sys
+import copy
+import gzip
+import json
+import queue
+import atexit
+import shutil
+import logging
+import datetime
+import logging.handlers
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.threadName != "MainThread":
+            entry["thread"] = record.threadName
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge the args in the calling thread (they may change later), but keep
+        # exc_info: the queue never leaves the process, and rich/JSON want the real traceback
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def file_handler(path, rotate="size", max_mb=5, backups=5):
+    """Rotating handler for `path` whose old segments are gzipped (bot.log.1.gz, ...)."""
+    if rotate == "daily":
+        handler = logging.handlers.TimedRotatingFileHandler(path, when="midnight", backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=int(max_mb * 1024 * 1024),
+                                                       backupCount=backups, encoding="utf-8", delay=True)
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def _console_handler(console):
+    if console and sys.stdout is not None and sys.stdout.isatty():
+        from rich.logging import RichHandler
+        return RichHandler(rich_tracebacks=True, markup=True)
+    # No terminal (or stdout carries JSON): only warnings and errors, as plain text on stderr
+    if sys.stderr is None:
+        # pythonw / CREATE_NO_WINDOW
+        return None
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setLevel(logging.WARNING)
+    handler.setFormatter(logging.Formatter("%(levelname)s - %(name)s - %(message)s"))
+    return handler
+
+
+def setup(path="bot.log", fmt="text", rotate="size", max_mb=5, backups=5, console=True, level=logging.INFO):
+    """Routes the root logger through a queue to the file and console handlers. Safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return
+
+    handlers = []
+    try:
+        sink = file_handler(path, rotate, max_mb, backups)
+        sink.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+        handlers.append(sink)
+    except OSError as e:
+        print(f"Could not open log file {path}: {e}", file=sys.stderr)
+    console_handler = _console_handler(console)
+    if console_handler:
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(level)
+
+
+def shutdown():
+    """Writes out what is still queued and stops the background thread."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
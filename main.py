@@ -3,96 +3,293 @@ from rich.panel import Panel
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich import print as rprint
+from contextlib import nullcontext
 import time
 import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import threading
 
-from utils import setup_logging, get_env, generate_event_id
-from scraper import ESSScraper
+from utils import setup_logging, load_config
 from gcal import GoogleCalendarManager
+from worker import build_scraper, sync_scraped, summarize
+from fingerprint import ScheduleUnchanged
+from portal import PortalUnavailable
+from tracing import span
+import tracing
+import metrics
 
-# Initialize logging
-logger = setup_logging()
+logger = logging.getLogger("ABI_Bot")
 console = Console()
 
-def run_bot():
-    console.clear()
-    console.print(Panel.fit("[bold orange1]ABI Bot Sync v3.0[/bold orange1]", subtitle="Automated Schedule Sync (Optimized)"))
+# Returned by run_sequential/run_async when the schedule fingerprints matched
+UNCHANGED = "unchanged"
 
-    # Load Config
-    try:
-        venue_id = get_env("ESS_VENUE_ID", required=True)
-        username = get_env("ESS_USERNAME", required=True)
-        password = get_env("ESS_PASSWORD", required=True)
-        headless = get_env("HEADLESS", "False").lower() == "true"
-    except ValueError as e:
-        console.print(f"[bold red]Configuration Error:[/bold red] {e}")
-        logger.error(str(e))
-        return
+# Exit codes, for schedulers
+EXIT_OK = 0            # synced, or nothing to do
+EXIT_FAILED = 1        # the run didn't get through (Google, scrape or pipeline failed)
+EXIT_CONFIG = 2        # missing or invalid settings
+EXIT_SYNC_ERRORS = 3   # ran, but some shifts failed to sync
+EXIT_UNAVAILABLE = 4   # ESS is down (or still in its circuit breaker wait), nothing was scraped
+
+
+class RunFailed(Exception):
+    """The run stopped before syncing anything."""
+
+
+class JsonLines:
+    """
+    Machine-readable output (--json, or whenever stdout isn't a terminal): one
+    JSON object per line, a "shift" record per result as it comes in and a
+    "summary" record at the end.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, kind, **fields):
+        line = json.dumps({"type": kind, **fields}, default=str)
+        # The async pipeline reports from several sync threads
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def shift(self, evt, status):
+        self.emit("shift", date=evt.shift_date, start=evt.start.isoformat(), end=evt.end.isoformat(),
+                  summary=evt.summary, time=evt.time_str, ess_id=evt.ess_id, **_split_status(status))
+
+    def removed(self, shift_date, summary, status):
+        self.emit("shift", date=shift_date, summary=summary, **_split_status(status))
+
+
+def _split_status(status):
+    if status.startswith("ERROR"):
+        return {"status": "ERROR", "error": status.partition(":")[2].strip() or None}
+    return {"status": status}
 
-    # Step 1: Google API
+
+def _status(out, text, spinner):
+    """Spinner in interactive mode, nothing with JSON output."""
+    return nullcontext() if out else console.status(text, spinner=spinner)
+
+
+def _say(out, text):
+    if not out:
+        console.print(text)
+
+
+def run_sequential(config, scraper, out=None):
+    """Google first, then the whole scrape, then the sync. Returns (events, statuses, removed) or UNCHANGED."""
+    # Step 1: Google API (not needed when only writing an ICS feed)
     gcal = None
-    with console.status("[bold green]Initializing Google Calendar API...[/bold green]", spinner="dots"):
-        try:
-            gcal = GoogleCalendarManager()
-            console.print("[bold green]✓ Google Service Initialized[/bold green]")
-        except Exception as e:
-            console.print(f"[bold red]Failed to init Google Service: {e}[/bold red]")
-            return
+    if config["calendar_ids"]:
+        with _status(out, "[bold green]Initializing Google Calendar API...[/bold green]", "dots"), span("google.init"):
+            try:
+                gcal = GoogleCalendarManager(
+                    max_qps=config["gcal_max_qps"], max_retries=config["gcal_max_retries"],
+                    api_url=config["gcal_api_url"]
+                )
+                _say(out, "[bold green]✓ Google Service Initialized[/bold green]")
+            except Exception as e:
+                raise RunFailed(f"Failed to init Google Service: {e}")
 
     # Step 2: Scrape ESS
-    console.print("\n[bold cyan]Step 2: Scrape ESS Schedule[/bold cyan]")
-    
-    scraper = ESSScraper(venue_id, username, password, headless=headless)
+    _say(out, "\n[bold cyan]Step 2: Scrape ESS Schedule[/bold cyan]")
+
     events = []
-    
-    with console.status("[bold blue]Running Scraper...[/bold blue]", spinner="earth"):
-        events = scraper.scrape_schedule()
+
+    with _status(out, "[bold blue]Running Scraper...[/bold blue]", "earth"), span("scrape"):
+        try:
+            events = scraper.scrape_schedule()
+        except ScheduleUnchanged:
+            return UNCHANGED
 
     if not events:
-        console.print("[yellow]No events found or scraping failed (check logs).[/yellow]")
-        return
+        raise RunFailed("No events found or scraping failed (check logs).")
 
-    console.print(f"[bold green]✓ Found {len(events)} events.[/bold green]")
+    _say(out, f"[bold green]✓ Found {len(events)} events.[/bold green]")
 
     # Step 3: Sync
-    console.print("\n[bold cyan]Step 3: Syncing to Google Calendar[/bold cyan]")
-    
+    _say(out, "\n[bold cyan]Step 3: Syncing to your calendars[/bold cyan]")
+
+    # Unchanged shifts are answered by the local ledger, only real changes hit the API
+    with span("sync", events=len(events)):
+        if out:
+            statuses, removed = sync_scraped(config, gcal, events, progress=lambda i, status: out.shift(events[i], status),
+                                             fingerprints=scraper.fingerprints, months=scraper.months)
+            for shift_date, summary, status in removed:
+                out.removed(shift_date, summary, status)
+            return events, statuses, removed
+
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            transient=True
+        ) as progress:
+            task = progress.add_task("[cyan]Syncing events...", total=len(events))
+            statuses, removed = sync_scraped(config, gcal, events, progress=lambda i, status: progress.advance(task),
+                                             fingerprints=scraper.fingerprints, months=scraper.months)
+    return events, statuses, removed
+
+
+def show_unchanged():
+    console.print("[bold green]✓ Schedule unchanged since the last sync, nothing to do.[/bold green] "
+                  "[dim](--force syncs anyway)[/dim]")
+
+
+def run_async(config, force=False, out=None):
+    """Scrape and sync overlapped (SYNC_PIPELINE=async). Returns (events, statuses, removed) or UNCHANGED."""
+    from pipeline import run_pipeline
+
+    _say(out, "\n[bold cyan]Scraping and syncing concurrently[/bold cyan]")
+    with _status(out, "[bold blue]Running pipeline...[/bold blue]", "earth"), span("pipeline"):
+        try:
+            events, statuses, removed = asyncio.run(
+                run_pipeline(config, on_event=out.shift if out else None, force=force)
+            )
+        except ScheduleUnchanged:
+            return UNCHANGED
+        except PortalUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Pipeline failed: {e}")
+            raise RunFailed(f"Pipeline failed: {e}")
+
+    if out:
+        for shift_date, summary, status in removed:
+            out.removed(shift_date, summary, status)
+    if not events:
+        raise RunFailed("No events found or scraping failed (check logs).")
+    _say(out, f"[bold green]✓ Synced {len(events)} events.[/bold green]")
+    return events, statuses, removed
+
+
+def run_bot(force=False, trace=False, profile=False, json_output=False):
+    """One sync run. Returns the process exit code (EXIT_*)."""
+    setup_logging(console=not json_output)
+    out = JsonLines() if json_output else None
+    if not out:
+        console.clear()
+        console.print(Panel.fit("[bold orange1]ABI Bot Sync v3.0[/bold orange1]", subtitle="Automated Schedule Sync (Optimized)"))
+
+    # Load Config
+    try:
+        config = load_config()
+        scraper = build_scraper(config, force=force)
+    except ValueError as e:
+        logger.error(str(e))
+        if out:
+            out.emit("summary", ok=False, unchanged=False, unavailable=False, events=0, counts={}, duration=0.0,
+                     error=f"Configuration Error: {e}", exit_code=EXIT_CONFIG)
+        else:
+            console.print(f"[bold red]Configuration Error:[/bold red] {e}")
+        return EXIT_CONFIG
+
+    # --trace (or TRACE_DIR) writes a Chrome trace of this run, --profile a cProfile dump
+    trace_dir = config["trace_dir"] or ("traces" if trace else None)
+    tracing.start(trace_path=tracing.run_path(trace_dir, "trace", ".json") if trace_dir else None,
+                  profile_path=tracing.run_path(trace_dir or "traces", "profile", ".prof") if profile else None)
+    try:
+        with span("run_bot", pipeline=config["pipeline"], engine=config["engine"]):
+            return _run_bot(config, scraper, force, out)
+    finally:
+        for path in tracing.finish():
+            _say(out, f"[dim]Wrote {path}[/dim]")
+
+
+def _run_bot(config, scraper, force, out):
+    metrics.setup(config)
+    started = time.time()
+    error = unavailable = None
+    try:
+        if config["pipeline"] == "async":
+            result = run_async(config, force=force, out=out)
+        else:
+            result = run_sequential(config, scraper, out=out)
+    except RunFailed as e:
+        result, error = None, str(e)
+    except PortalUnavailable as e:
+        result, error, unavailable = None, str(e), e
+    except Exception as e:
+        # Anything else still ends with a summary and EXIT_FAILED, not a bare traceback
+        logger.exception("Run failed")
+        result, error = None, f"Run failed: {type(e).__name__}: {e}"
+
+    duration = round(time.time() - started, 3)
+    if result is None or result is UNCHANGED:
+        unchanged = result is UNCHANGED
+        metrics.record_run(unchanged, duration, unchanged=unchanged, textfile=config["metrics_textfile"],
+                           unavailable=unavailable is not None)
+        code = EXIT_OK if unchanged else EXIT_UNAVAILABLE if unavailable else EXIT_FAILED
+        if out:
+            extra = {"retry_in": unavailable.retry_in} if unavailable else {}
+            out.emit("summary", ok=unchanged, unchanged=unchanged, unavailable=unavailable is not None, events=0,
+                     counts={}, duration=duration, error=error, exit_code=code, **extra)
+        elif unchanged:
+            show_unchanged()
+        elif unavailable:
+            console.print(f"[bold yellow]{error}[/bold yellow]")
+        else:
+            console.print(f"[bold red]{error}[/bold red]")
+        return code
+
+    events, statuses, removed = result
+    counts = summarize(statuses, removed)
+    metrics.record_run(not counts.get("ERROR"), duration, textfile=config["metrics_textfile"])
+    code = EXIT_SYNC_ERRORS if counts.get("ERROR") else EXIT_OK
+    if out:
+        out.emit("summary", ok=not counts.get("ERROR"), unchanged=False, unavailable=False, events=len(events),
+                 counts=counts, duration=duration, error=None, exit_code=code)
+        return code
+
     table = Table(title="Sync Results", show_header=True, header_style="bold magenta")
     table.add_column("Date", style="cyan")
     table.add_column("Event", style="white")
     table.add_column("Time", style="yellow")
     table.add_column("Status", style="green")
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        transient=True
-    ) as progress:
-        task = progress.add_task("[cyan]Syncing events...", total=len(events))
-        
-        for evt in events:
-            uid = generate_event_id(evt['summary'], evt['start'], evt['end'])
-            status = gcal.sync_event(evt, uid)
-            
-            status_display = status
-            if status == "ADDED":
-                status_display = "[green]ADDED[/green]"
-            elif status == "SKIPPED":
-                status_display = "[dim]SKIPPED[/dim]"
-            else:
-                status_display = f"[bold red]{status}[/bold red]"
-
-            table.add_row(
-                evt['start'].strftime('%Y-%m-%d'),
-                evt['summary'],
-                evt['time_str'],
-                status_display
-            )
-            progress.advance(task)
+    for evt, status in zip(events, statuses):
+        status_display = status
+        if status == "ADDED":
+            status_display = "[green]ADDED[/green]"
+        elif status == "UPDATED":
+            status_display = "[blue]UPDATED[/blue]"
+        elif status == "SKIPPED":
+            status_display = "[dim]SKIPPED[/dim]"
+        else:
+            status_display = f"[bold red]{status}[/bold red]"
+
+        table.add_row(
+            evt.shift_date,
+            evt.summary,
+            evt.time_str,
+            status_display
+        )
+
+    for shift_date, summary, status in removed:
+        status_display = "[yellow]DELETED[/yellow]" if status == "DELETED" else f"[bold red]{status}[/bold red]"
+        table.add_row(shift_date, summary, "-", status_display)
 
     console.print(table)
     console.print(Panel("[bold green]Sync Process Completed Successfully![/bold green]"))
+    # Keeps the results readable when the window closes on exit
     time.sleep(5)
+    return code
 
 if __name__ == "__main__":
-    run_bot()
+    parser = argparse.ArgumentParser(description="Sync the ESS schedule to Google Calendar.")
+    parser.add_argument("--force", action="store_true", help="sync even if the schedule looks unchanged")
+    parser.add_argument("--trace", action="store_true", help="write a Chrome trace-event file to traces/")
+    parser.add_argument("--profile", action="store_true", help="write a cProfile dump of the CPU-bound stages")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--json", dest="json_output", action="store_true", default=None,
+                        help="print JSON lines instead of the interactive display (default when stdout isn't a terminal)")
+    output.add_argument("--interactive", dest="json_output", action="store_false",
+                        help="always use the interactive display")
+    args = parser.parse_args()
+    json_output = not sys.stdout.isatty() if args.json_output is None else args.json_output
+    sys.exit(run_bot(force=args.force, trace=args.trace, profile=args.profile, json_output=json_output))
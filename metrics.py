@@ -0,0 +1,250 @@
+"""
+Prometheus metrics for sync runs, without extra dependencies.
+
+Counters, gauges and histograms live in one registry. After every run the
+values are written in the Prometheus text format to METRICS_TEXTFILE (for
+node_exporter's textfile collector) and the tray can serve them on
+http://127.0.0.1:METRICS_PORT/metrics. The raw values are kept next to the
+textfile (<textfile>.json) so counters keep counting across main.py runs.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("ABI_Bot.Metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _pairs(self, key):
+        return list(zip(self.labelnames, key))
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def restore(self, rows):
+        with self._lock:
+            for key, value in rows:
+                self._values[tuple(key)] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self._pairs(key))} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][n] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the with-block took, also when it raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def restore(self, rows):
+        # Bucket layout changed since the state was saved, start that series over
+        super().restore([(key, value) for key, value in rows if len(value.get("buckets", ())) == len(self.buckets)])
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                pairs = self._pairs(key)
+                for bound, count in zip(self.buckets, state["buckets"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(state['sum'])}")
+                lines.append(f"{self.name}_count{_format_labels(pairs)} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def restore(self, state):
+        for name, rows in state.items():
+            if name in self.metrics:
+                self.metrics[name].restore(rows)
+
+
+REGISTRY = Registry()
+
+EVENTS = Counter("abi_bot_events_total", "Shifts processed, by outcome and reason.", ("status", "reason"))
+RUNS = Counter("abi_bot_runs_total", "Sync runs, by result.", ("result",))
+BROWSER_LAUNCHES = Counter("abi_bot_browser_launches_total", "Chromium instances started.")
+BROWSER_RECYCLES = Counter("abi_bot_browser_recycles_total", "Browsers replaced by the governor, by reason.", ("reason",))
+BROWSER_PEAK_MB = Gauge("abi_bot_browser_peak_memory_mb", "Peak RSS of the browser process tree during the last run.")
+STEP_SECONDS = Histogram(
+    "abi_bot_step_seconds", "Duration of scrape steps (login, navigation, fetch, parse).", ("step",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80),
+)
+CALENDAR_SECONDS = Histogram(
+    "abi_bot_calendar_call_seconds", "Google Calendar API call latency, per attempt.", ("method",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RUN_SECONDS = Histogram("abi_bot_run_seconds", "Duration of whole sync runs.",
+                        buckets=(5, 10, 20, 30, 60, 120, 300, 600))
+LAST_RUN = Gauge("abi_bot_last_run_timestamp_seconds", "Unix time the last sync run finished.")
+LAST_SUCCESS = Gauge("abi_bot_last_success_timestamp_seconds", "Unix time of the last successful sync run.")
+
+
+def count_event(status, reason):
+    """Counts one shift outcome; every 'ERROR: ...' status is counted as ERROR."""
+    EVENTS.inc(status="ERROR" if status.startswith("ERROR") else status, reason=reason)
+
+
+def record_run(ok, duration, unchanged=False, textfile=None, unavailable=False):
+    """Records a finished run and, with a textfile, writes the metrics out."""
+    now = time.time()
+    RUNS.inc(result="unchanged" if unchanged else "unavailable" if unavailable else "success" if ok else "failure")
+    RUN_SECONDS.observe(duration)
+    LAST_RUN.set(now)
+    if ok:
+        LAST_SUCCESS.set(now)
+    if textfile:
+        write_textfile(textfile)
+
+
+def _state_path(textfile):
+    return textfile + ".json"
+
+
+def load_state(textfile):
+    """Picks up the values saved by earlier runs writing `textfile`."""
+    path = _state_path(textfile)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r") as f:
+            REGISTRY.restore(json.load(f))
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable metrics state: {e}")
+
+
+def write_textfile(textfile):
+    """Writes the Prometheus textfile atomically (the collector may read it at any time)."""
+    try:
+        for path, content in ((textfile, REGISTRY.render()), (_state_path(textfile), json.dumps(REGISTRY.snapshot()))):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(content)
+            os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {textfile}: {e}")
+
+
+def setup(config):
+    """Restores saved values when METRICS_TEXTFILE is configured."""
+    if config["metrics_textfile"]:
+        load_state(config["metrics_textfile"])
+
+
+def serve(port, host="127.0.0.1"):
+    """Serves /metrics from a daemon thread. Returns the server (call shutdown() to stop)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,144 @@
+"""
+Async sync pipeline: scraping and the Calendar side run at the same time.
+
+While Chromium logs in, Google is authenticated and the bot's existing events
+for the scraped months are listed. Each month is parsed as soon as its page
+arrives and put on a bounded queue that several sync workers drain at once,
+so a run takes about as long as the slower half instead of both added up.
+
+The sinks (sinks.py) are blocking, so they run in worker threads; Google
+sinks give each thread its own forked connection and share the rate limiter.
+"""
+import time
+import asyncio
+import datetime
+import logging
+
+from sinks import build_sinks
+from sync import sync_succeeded
+from fingerprint import ScheduleUnchanged
+from portal import PortalUnavailable
+
+logger = logging.getLogger("ABI_Bot.Pipeline")
+
+# Months waiting for a sync worker; the scraper pauses once this many are queued
+QUEUE_SIZE = 4
+SYNC_WORKERS = 3
+
+
+def sync_window(months_ahead, today=None):
+    """(start of this month, end of the last scraped month) as naive datetimes."""
+    today = today or datetime.date.today()
+    start = datetime.datetime(today.year, today.month, 1)
+    after = today.month + months_ahead  # zero based index of the month after the window
+    end = datetime.datetime(today.year + after // 12, after % 12 + 1, 1) - datetime.timedelta(seconds=1)
+    return start, end
+
+
+async def open_sinks(config, gcal=None, ledger_path="sync_ledger.db"):
+    """
+    Builds the configured sinks (authenticating unless a manager was passed in) and
+    lets them prefetch the existing events of the scraped months.
+    """
+    sink = await asyncio.to_thread(build_sinks, config, gcal, ledger_path)
+    try:
+        await asyncio.to_thread(sink.prepare, sync_window(config["months_ahead"]))
+    except BaseException:
+        sink.close()
+        raise
+    return sink
+
+
+def pipeline_scraper(config, browser=None, force=False):
+    """
+    The scraper for `config`: AsyncESSScraper, or the blocking HTTP engine.
+    `browser` is a running async Chromium to open the scrape's context in.
+    """
+    from worker import build_scraper, browser_options
+
+    if config["engine"] == "http":
+        return build_scraper(config, force=force)
+    from async_scraper import AsyncESSScraper
+    return AsyncESSScraper(browser=browser, **browser_options(config, force=force))
+
+
+async def stream_months(scraper, queue, workers):
+    """
+    Puts each month's events on `queue` as it is scraped, then one None per worker.
+    ScheduleUnchanged and PortalUnavailable are passed on once the workers have been told to stop.
+    """
+    stopped = None
+    try:
+        if hasattr(scraper, "stream_schedule"):
+            async for events in scraper.stream_schedule():
+                await queue.put(events)
+        else:
+            # The browserless engine is blocking and hands everything over at once
+            events = await asyncio.to_thread(scraper.scrape_schedule)
+            if events:
+                await queue.put(events)
+    except (ScheduleUnchanged, PortalUnavailable) as e:
+        stopped = e
+    except Exception as e:
+        logger.error(f"Scrape Error: {e}")
+    for _ in range(workers):
+        await queue.put(None)
+    if stopped:
+        raise stopped
+
+
+async def run_pipeline(config, gcal=None, on_event=None, workers=SYNC_WORKERS, queue_size=QUEUE_SIZE,
+                       browser=None, ledger_path="sync_ledger.db", force=False):
+    """
+    Scrapes and syncs in one overlapped run.
+    on_event(event, status) is called from the sync threads as shifts finish.
+    `browser` shares a running async Chromium (see fleet.py).
+    Returns (events, statuses, removed) like the sequential path, events sorted by start.
+    Raises ScheduleUnchanged when no month changed since the last sync, unless `force`,
+    and PortalUnavailable when ESS is down.
+    """
+    started = time.perf_counter()
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    scraper = pipeline_scraper(config, browser, force)
+    producer = asyncio.create_task(stream_months(scraper, queue, workers))
+    try:
+        sink = await open_sinks(config, gcal, ledger_path)
+    except BaseException:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        raise
+    logger.info(f"Calendar ready after {time.perf_counter() - started:.1f}s")
+
+    synced = []
+    removed = []
+
+    async def drain():
+        while True:
+            events = await queue.get()
+            if events is None:
+                return
+            progress = (lambda i, status, batch=events: on_event(batch[i], status)) if on_event else None
+            statuses, gone = await asyncio.to_thread(sink.sync, events, progress)
+            synced.extend(zip(events, statuses))
+            removed.extend(gone)
+
+    try:
+        # Everything has to wind down before the sinks close, even if one part failed
+        for outcome in await asyncio.gather(producer, *(drain() for _ in range(workers)),
+                                            return_exceptions=True):
+            if isinstance(outcome, BaseException):
+                raise outcome
+        synced.sort(key=lambda pair: pair[0])
+        if synced:
+            # Only months the scraper fully parsed; a month that failed or was cut short keeps its shifts
+            removed.extend(await asyncio.to_thread(sink.finish, [evt for evt, _ in synced], scraper.months))
+        if synced and scraper.fingerprints and sync_succeeded([status for _, status in synced], removed):
+            scraper.fingerprints.commit()
+    finally:
+        if not producer.done():
+            producer.cancel()
+        sink.close()
+
+    logger.info(f"Pipeline finished {len(synced)} events in {time.perf_counter() - started:.1f}s")
+    return [evt for evt, _ in synced], [status for _, status in synced], removed
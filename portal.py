@@ -0,0 +1,181 @@
+"""
+ESS availability: a quick probe before Chromium starts and a circuit breaker
+that remembers outages across runs.
+
+When the portal is down a browser run only finds out after its page timeouts,
+20s or more per step, and then reports the same "no events" as an empty
+schedule. PortalGuard.check() instead asks the breaker whether ESS is known to
+be down (ending the run at once) and otherwise sends one GET with a short
+timeout. Every failure opens the breaker for ESS_RETRY_MINUTES, doubled per
+consecutive failure up to ESS_MAX_RETRY_HOURS; the first run after that is the
+trial, and a successful scrape closes the breaker again. Both cases raise
+PortalUnavailable, which callers report separately from scrape failures.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+import datetime
+import urllib.error
+import urllib.request
+
+from tracing import span
+
+logger = logging.getLogger("ABI_Bot.Portal")
+
+PROBE_TIMEOUT = 5.0
+BREAKER_FILE = "ess_breaker.json"
+# +/- fraction added to every wait so a fleet of bots doesn't retry in lockstep
+JITTER = 0.1
+# Playwright calls whose timeout means ESS didn't answer
+NAVIGATION_CALLS = ("Page.goto:", "Page.reload:", "Frame.goto:")
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+
+class PortalUnavailable(Exception):
+    """ESS is down or too slow; `retry_at` (Unix time) is when the breaker allows the next try."""
+
+    def __init__(self, message, retry_at=None):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+    @property
+    def retry_in(self):
+        """Seconds until the next try, None if unknown."""
+        return max(0.0, self.retry_at - time.time()) if self.retry_at else None
+
+
+def ping(url, timeout=PROBE_TIMEOUT):
+    """
+    One GET of `url`. Returns None if the server answered below 500 (a login
+    page or a redirect is fine), otherwise a short reason.
+    """
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            resp.read(1)
+        return None
+    except urllib.error.HTTPError as e:
+        return None if e.code < 500 else f"HTTP {e.code}"
+    except urllib.error.URLError as e:
+        return f"{type(e.reason).__name__}: {e.reason}"
+    except OSError as e:
+        # socket.timeout while reading, connection resets
+        return f"{type(e).__name__}: {e}"
+
+
+def is_outage(error):
+    """
+    Whether a browser scrape error looks like the portal being down rather than a login or page problem:
+    network errors, connection errors and pages that never load. An element or selector timing out
+    means the page changed, which a breaker can't fix, so that stays an ordinary scrape error.
+    """
+    text = str(error)
+    if "net::ERR_" in text or isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # Playwright names the call that failed at the start of the message ("Page.goto: Timeout ...")
+    return type(error).__name__ == "TimeoutError" and text.startswith(NAVIGATION_CALLS)
+
+
+class CircuitBreaker:
+    """
+    Consecutive ESS failures and when the next try is allowed, kept in a JSON
+    file so separate runs (cron, tray restarts) share it.
+    """
+
+    def __init__(self, path=BREAKER_FILE, base_delay=300.0, max_delay=6 * 3600.0):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def state(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable breaker state: {e}")
+            return {}
+
+    def retry_at(self):
+        """Unix time the breaker opens up again, None while it's closed."""
+        until = self.state().get("open_until", 0)
+        return until if until > time.time() else None
+
+    def record_failure(self, reason):
+        """Opens the breaker for the next backoff step. Returns the time it opens up again."""
+        state = self.state()
+        failures = state.get("failures", 0) + 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        delay *= 1 + random.uniform(-JITTER, JITTER)
+        retry_at = time.time() + delay
+        self._save({"failures": failures, "open_until": retry_at, "reason": reason,
+                    "since": state.get("since", time.time())})
+        logger.warning(f"ESS unavailable ({reason}), failure {failures}; "
+                       f"no retry before {_clock(retry_at)}")
+        return retry_at
+
+    def record_success(self):
+        state = self.state()
+        if state.get("failures"):
+            logger.info(f"ESS is back after {state['failures']} failed attempt(s)")
+        if state:
+            self._save({})
+
+    def _save(self, state):
+        try:
+            # Fleet accounts share the file from several threads
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save breaker state: {e}")
+
+
+class PortalGuard:
+    """The probe and the breaker together, handed to the scrapers (see worker.browser_options)."""
+
+    def __init__(self, url, breaker=None, timeout=PROBE_TIMEOUT, probe=True):
+        self.url = url
+        self.breaker = breaker
+        self.timeout = timeout
+        self.probing = probe
+
+    def check(self, probe=True):
+        """
+        Raises PortalUnavailable while the breaker is open or, with `probe` (and
+        probing enabled), when ESS doesn't answer within the timeout.
+        """
+        retry_at = self.breaker.retry_at() if self.breaker else None
+        if retry_at:
+            state = self.breaker.state()
+            raise PortalUnavailable(
+                f"ESS marked unavailable after {state.get('failures', 1)} failed attempt(s) "
+                f"({state.get('reason')}), next try after {_clock(retry_at)}", retry_at
+            )
+        if probe and self.probing:
+            started = time.perf_counter()
+            with span("portal.probe", cat="scrape"):
+                reason = ping(self.url, self.timeout)
+            if reason:
+                self.failed(reason)
+            logger.debug(f"ESS answered the probe in {time.perf_counter() - started:.2f}s")
+
+    def failed(self, reason):
+        """Records an outage and raises PortalUnavailable."""
+        retry_at = self.breaker.record_failure(reason) if self.breaker else None
+        raise PortalUnavailable(f"ESS unavailable: {reason}", retry_at)
+
+    def succeeded(self):
+        if self.breaker:
+            self.breaker.record_success()
+
+
+def _clock(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
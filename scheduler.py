@@ -0,0 +1,188 @@
+"""
+Adaptive sync scheduler for the tray agent.
+
+Sleeps until the next run is due instead of polling. The interval starts at
+SYNC_INTERVAL_HOURS, stretches while runs find nothing new and shrinks after
+runs that changed the calendar, always within SYNC_MIN_INTERVAL_HOURS and
+SYNC_MAX_INTERVAL_HOURS. Every delay gets +/- SYNC_JITTER of random jitter.
+"Sync Now" pulls the pending automatic run forward instead of adding another.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+
+from utils import ENV_PATH, get_env, reload_env
+
+logger = logging.getLogger("ABI_Bot.Scheduler")
+
+STATE_FILE = "scheduler_state.json"
+
+# Statuses that mean a run found a schedule change
+CHANGE_STATUSES = ("ADDED", "UPDATED", "DELETED")
+# Interval multipliers after a quiet run / a run with changes
+BACKOFF = 1.5
+SPEEDUP = 0.5
+# A failed run is retried after this long (or the current interval, if shorter)
+RETRY_HOURS = 1.0
+
+
+def read_settings():
+    """Scheduler settings from the environment, bad values fall back to the defaults."""
+    def number(key, default, low=0.0):
+        try:
+            value = float(get_env(key, default))
+        except (TypeError, ValueError):
+            return float(default)
+        return value if value > low else float(default)
+
+    base = number("SYNC_INTERVAL_HOURS", 24)
+    return {
+        "interval": base,
+        "min": min(number("SYNC_MIN_INTERVAL_HOURS", base / 4), base),
+        "max": max(number("SYNC_MAX_INTERVAL_HOURS", base * 2), base),
+        "jitter": min(number("SYNC_JITTER", 0.1, low=-1.0), 0.5),
+    }
+
+
+class AdaptiveScheduler:
+    """
+    Runs `run(manual)` on its own thread whenever a sync is due.
+    `run` returns the worker's result dict (see worker.SyncWorker), which decides
+    the next interval. State is kept in `state_file` so restarts keep the rhythm.
+    """
+
+    def __init__(self, run, state_file=STATE_FILE, env_path=ENV_PATH):
+        self.run = run
+        self.state_file = state_file
+        self.env_path = env_path
+        self.settings = None
+        self.interval = None
+        self.last_run = 0.0
+        self.next_due = 0.0
+        self._env_signature = None
+        self._manual = False
+        self._running = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._load_state()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def request_now(self):
+        """Sync Now. Returns False if a sync is already running (the request is folded into it)."""
+        with self._lock:
+            if self._running:
+                return False
+            self._manual = True
+        self._wake.set()
+        return True
+
+    def config_changed(self):
+        """Wakes the scheduler to pick up edited settings (it checks the file itself, too)."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            # Cleared before checking so a request arriving from here on still ends the wait
+            self._wake.clear()
+            self._refresh_settings()
+            with self._lock:
+                manual = self._manual
+            wait = self.next_due - time.time()
+            if wait > 0 and not manual:
+                logger.info(f"Next sync in {wait / 3600:.1f}h")
+                self._wake.wait(wait)
+                continue
+
+            with self._lock:
+                manual, self._manual = self._manual, False
+                self._running = True
+            logger.info("Manual sync requested" if manual else "Automatic sync due")
+            try:
+                result = self.run(manual)
+            except Exception:
+                logger.exception("Scheduled sync crashed")
+                result = None
+            finally:
+                with self._lock:
+                    self._running = False
+            self._after_run(result)
+
+    def _refresh_settings(self):
+        """Reloads .env only when its modification time or size changed."""
+        try:
+            stat = os.stat(self.env_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if self.settings is not None and signature == self._env_signature:
+            return
+        if self._env_signature is not None or self.settings is not None:
+            reload_env()
+        self._env_signature = signature
+
+        old, self.settings = self.settings, read_settings()
+        if self.interval is None or (old and old["interval"] != self.settings["interval"]):
+            # A new base interval from the settings window starts the adaptation over
+            self.interval = self.settings["interval"]
+        self.interval = self._clamp(self.interval)
+        if old is not None and old != self.settings and self.last_run:
+            self.next_due = min(self.next_due, self.last_run + self._jittered(self.interval))
+            logger.info(f"Settings changed, interval now {self.interval:.1f}h")
+
+    def _after_run(self, result):
+        self.last_run = time.time()
+        if result and result.get("retry_in") is not None:
+            # ESS is down: come back when the circuit breaker lets the next try through, not before
+            hours = min(self.interval, result["retry_in"] / 3600)
+            logger.info(f"ESS unavailable, retrying in about {hours * 60:.0f} min")
+            self.next_due = self.last_run + hours * 3600
+            self._save_state()
+            return
+        if not result or not result.get("ok"):
+            hours = min(self.interval, RETRY_HOURS)
+            logger.info(f"Sync failed, retrying in about {hours:.1f}h")
+        else:
+            changes = sum(result.get("counts", {}).get(k, 0) for k in CHANGE_STATUSES)
+            self.interval = self._clamp(self.interval * (SPEEDUP if changes else BACKOFF))
+            hours = self.interval
+            logger.info(f"{changes} change(s) found, next interval {hours:.1f}h")
+        self.next_due = self.last_run + self._jittered(hours)
+        self._save_state()
+
+    def _clamp(self, hours):
+        return max(self.settings["min"], min(self.settings["max"], hours))
+
+    def _jittered(self, hours):
+        jitter = self.settings["jitter"]
+        return hours * 3600 * (1 + random.uniform(-jitter, jitter))
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+            self.interval = float(state["interval"])
+            self.last_run = float(state.get("last_run", 0))
+            self.next_due = float(state.get("next_due", 0))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable scheduler state: {e}")
+            self.interval, self.last_run, self.next_due = None, 0.0, 0.0
+
+    def _save_state(self):
+        try:
+            with open(self.state_file, "w") as f:
+                json.dump({"interval": self.interval, "last_run": self.last_run, "next_due": self.next_due}, f)
+        except OSError as e:
+            logger.warning(f"Could not save scheduler state: {e}")
@@ -1,165 +1,553 @@
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
 import os
+import json
+import shutil
 import datetime
 import re
 from datetime import timedelta
 import logging
 import time
+from contextlib import contextmanager
+
+from ess_parser import parse_month
+from fingerprint import ScheduleUnchanged
+from portal import is_outage
+from governor import BrowserGovernor
+from metrics import STEP_SECONDS, BROWSER_LAUNCHES
+from tracing import span, profiled
+
+ESS_URL = "https://ess.abimm.com/ABIMM_ASP/Request.aspx"
+
+# ASP.NET calendar month links post back "V<days since 2000-01-01>" for the month they show
+POSTBACK_RE = re.compile(r"__doPostBack\('([^']*)'\s*,\s*'V(\d+)'\)")
+ASPNET_EPOCH = datetime.date(2000, 1, 1)
+
+
+def month_postbacks(href, months_ahead):
+    """
+    For an ASP.NET calendar "next month" postback link, returns (event target, [argument per month])
+    for the next `months_ahead` months. None if the link is not a calendar postback.
+    """
+    postback = POSTBACK_RE.search(href or "")
+    if not postback:
+        return None
+    target, days = postback.group(1), int(postback.group(2))
+    first = ASPNET_EPOCH + timedelta(days=days)
+    args = []
+    for offset in range(months_ahead):
+        month_index = first.month - 1 + offset
+        month_start = datetime.date(first.year + month_index // 12, month_index % 12 + 1, 1)
+        args.append(f"V{(month_start - ASPNET_EPOCH).days}")
+    return target, args
+
+
+def complete_months(parsed, months_ahead):
+    """
+    The months ("YYYY-MM") a run may delete vanished shifts in: every month it parsed,
+    but only if all months_ahead + 1 of them came back with a calendar. A month that
+    went missing would otherwise look like a month whose shifts were all cancelled.
+    () means nothing may be deleted.
+    """
+    parsed = sorted(set(month for month in parsed if month))
+    return tuple(parsed) if len(parsed) == months_ahead + 1 else ()
+
+
+@contextmanager
+def scrape_step(name):
+    """Times a scrape step for abi_bot_step_seconds and, when tracing, as a span."""
+    with STEP_SECONDS.time(step=name), span(name, cat="scrape"):
+        yield
+
+
+# Finds the "next month" link on the schedule page and returns its href
+NEXT_MONTH_JS = """() => {
+    const links = Array.from(document.querySelectorAll('a'));
+    const next = links.find(a => /next/i.test(a.title || '') || ['>', '>>', '\u00bb', 'Next'].includes(a.innerText.trim()));
+    return next ? next.getAttribute('href') : null;
+}"""
+
+# Posts the schedule form once per month argument, all in flight at the same time.
+# An error or expired-session page must not pass for a month without shifts, so those reject.
+FETCH_MONTHS_JS = """async ([target, args]) => {
+    const form = document.forms[0];
+    return await Promise.all(args.map(async arg => {
+        const data = new FormData(form);
+        data.set('__EVENTTARGET', target);
+        data.set('__EVENTARGUMENT', arg);
+        const resp = await fetch(form.action, {method: 'POST', body: data, credentials: 'include'});
+        if (!resp.ok) throw new Error(`month ${arg}: HTTP ${resp.status}`);
+        const html = await resp.text();
+        if (!html.includes('calendar_day_box')) throw new Error(`month ${arg}: no calendar on the page`);
+        return html;
+    }));
+}"""
+
+# Fires once the month title differs from the one passed in, i.e. the next month has loaded
+MONTH_CHANGED_JS = "t => { const el = document.querySelector('span.MonthTitle'); return el && el.innerText !== t; }"
+
+# ESS page elements, shared by both browser engines
+VENUE_INPUT = "#input_venue"
+VENUE_SUBMIT = "input[type='button'][value='Submit']"
+LOGIN_INPUT = "#LoginId"
+PIN_INPUT = "#PIN"
+LOGIN_BUTTON = "#loginButton"
+CALENDAR_DAY = ".calendar_day_box"
+MONTH_TITLE = "span.MonthTitle"
+SCHEDULE_LINKS = ("My Schedule", "Schedule")
+
+# Waits in ms: any page call, the saved-session deep link, the login forms showing up, the calendar after login
+PAGE_TIMEOUT = 20000
+RESUME_TIMEOUT = 5000
+FORM_TIMEOUT = 5000
+CALENDAR_TIMEOUT = 10000
+
+
+def run_steps(page, steps):
+    """
+    Runs a page script on a playwright.sync_api page (AsyncESSScraper has the async twin).
+    A page script is a generator that yields steps, callables taking the page; each step's
+    result is sent back into the script and its exception raised inside it, so the script
+    reads like straight page code. Returns what the script returns.
+    """
+    value = error = None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as done:
+            return done.value
+        value = error = None
+        try:
+            value = step(page)
+        except Exception as e:
+            error = e
+
+
+# Resource types the parser never looks at
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font", "stylesheet")
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com", "hotjar.com", "clarity.ms", "newrelic.com", "nr-data.net",
+)
+
+# Profile sub-directories that only hold caches; pruned mode deletes them before each launch
+PROFILE_CACHE_DIRS = (
+    "Cache", "Code Cache", "GPUCache", "GrShaderCache", "ShaderCache", "DawnCache", "GraphiteDawnCache",
+    os.path.join("Service Worker", "CacheStorage"), os.path.join("Service Worker", "ScriptCache"),
+)
+PROFILE_MODES = ("persistent", "pruned", "ephemeral")
+
+
+class RequestFilter:
+    """
+    Route handler that aborts asset and tracker requests for a browser context.
+    URLs containing any `allow` substring are always let through.
+    Keeps per-run counts of blocked requests and of the bytes that were downloaded
+    for the log; aborted requests have no size, so the saving itself isn't known.
+    """
+
+    def __init__(self, blocked_types=BLOCKED_RESOURCE_TYPES, tracker_hosts=TRACKER_HOSTS, allow=()):
+        self.blocked_types = set(blocked_types)
+        self.tracker_hosts = tuple(tracker_hosts)
+        self.allow = tuple(a for a in allow if a)
+        self.reset()
+
+    def reset(self):
+        self.blocked = {}
+        self.allowed = 0
+        self.bytes_received = 0
+
+    def attach(self, context):
+        context.route("**/*", self.handle)
+        context.on("response", self._on_response)
+
+    async def attach_async(self, context):
+        """attach() for a playwright.async_api context."""
+        await context.route("**/*", self.handle_async)
+        context.on("response", self._on_response)
+
+    def should_block(self, url, resource_type):
+        if any(a in url for a in self.allow):
+            return None
+        if resource_type in self.blocked_types:
+            return resource_type
+        host = url.split("://", 1)[-1].split("/", 1)[0].split(":", 1)[0].lower()
+        if any(host == t or host.endswith("." + t) for t in self.tracker_hosts):
+            return "tracker"
+        return None
+
+    def _count(self, request):
+        """Records the decision for `request`. True if it should be aborted."""
+        reason = self.should_block(request.url, request.resource_type)
+        if reason:
+            self.blocked[reason] = self.blocked.get(reason, 0) + 1
+            return True
+        self.allowed += 1
+        return False
+
+    def handle(self, route, request):
+        if self._count(request):
+            route.abort()
+        else:
+            route.continue_()
+
+    async def handle_async(self, route, request):
+        if self._count(request):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        try:
+            self.bytes_received += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    def summary(self):
+        total = sum(self.blocked.values())
+        by_type = ", ".join(f"{k}: {v}" for k, v in sorted(self.blocked.items())) or "none"
+        # Aborted requests never report a size, so only what was actually downloaded is known
+        return (f"Blocked {total} of {total + self.allowed} requests ({by_type}); "
+                f"downloaded {self.bytes_received / 1024:.0f} KB")
+
 
 class ESSScraper:
-    def __init__(self, venue_id, username, password, headless=True):
+    def __init__(self, venue_id, username, password, headless=True, months_ahead=0, parser_backend="auto",
+                 request_filter=None, profile_mode="persistent", session_file="ess_session.json",
+                 keep_alive=False, fingerprints=None, force=False, portal=None, governor=None, base_url=ESS_URL):
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {profile_mode}")
         self.venue_id = venue_id
         self.username = username
         self.password = password
+        # The ESS entry page; benchmarks/fake_ess.py stands in for it offline (ESS_URL)
+        self.base_url = base_url
         self.headless = headless
+        self.months_ahead = months_ahead
+        self.parser_backend = parser_backend
+        self.request_filter = request_filter
+        self.profile_mode = profile_mode
+        self.session_file = session_file
+        # keep_alive leaves Chromium running between scrape_schedule() calls (same thread only)
+        self.keep_alive = keep_alive
+        # FingerprintStore: stop before parsing when no month changed, unless forced
+        self.fingerprints = fingerprints
+        self.force = force
+        # PortalGuard: probe ESS before starting Chromium, skip runs while it's known to be down
+        self.portal = portal
+        # BrowserGovernor: launch flags, page cap, memory sampling and recycling of a warm browser.
+        # Without one the browser launches as it always did, but peak memory is still recorded.
+        self.governor = governor or BrowserGovernor(low_memory=False, max_pages=0, recycle_runs=0, recycle_mb=0)
+        # Months the last scrape parsed completely (see complete_months), for deletions
+        self.months = ()
+        self._parsed = []
+        self._playwright = self._browser = self._context = None
         self.logger = logging.getLogger("ABI_Bot.Scraper")
         self.user_data_dir = os.path.join(os.getcwd(), "bot_profile")
-        if not os.path.exists(self.user_data_dir):
+        if profile_mode != "ephemeral" and not os.path.exists(self.user_data_dir):
             os.makedirs(self.user_data_dir)
 
     def scrape_schedule(self):
         """Scrapes the ESS schedule and returns a list of event dicts."""
         events = []
-        with sync_playwright() as p:
-            self.logger.info(f"Launching Browser (Headless: {self.headless})")
-            browser = p.chromium.launch_persistent_context(
-                self.user_data_dir,
-                headless=self.headless,
-                args=["--disable-blink-features=AutomationControlled"],
-                viewport={"width": 1280, "height": 720}
-            )
-            
-            try:
-                page = browser.pages[0]
-                page.set_default_timeout(20000)
-                
-                # Login
-                self._login(page)
-                
-                # Navigate
-                if not self._navigate_to_schedule(page):
-                    return []
-
-                # Parse
-                events = self._parse_calendar(page)
-                self.logger.info(f"Scraped {len(events)} events.")
-                return events
+        self.months, self._parsed = (), []
+        if self.portal:
+            # Only worth probing when a browser would have to be started for nothing
+            self.portal.check(probe=self._context is None)
+        if self._context is None:
+            self._start()
+        context = self._context
+        if self.request_filter:
+            self.request_filter.reset()
+        self.governor.start_run()
 
-            except Exception as e:
-                self.logger.error(f"Scrape Error: {e}")
+        try:
+            page = context.pages[0] if context.pages else context.new_page()
+            if not self._drive(page, self._open_schedule(context)):
                 return []
-            finally:
-                browser.close()
 
-    def _login(self, page):
+            with scrape_step("fetch"):
+                with span("page.content"):
+                    html = page.content()
+                pages = [html] + self._fetch_next_months(page)
+            if self.portal:
+                self.portal.succeeded()
+            if self.fingerprints:
+                self.fingerprints.check(pages, force=self.force)
+
+            # Parse
+            events = self._merge([self._parse_calendar(html) for html in pages])
+            self.months = complete_months(self._parsed, self.months_ahead)
+            self.logger.info(f"Scraped {len(events)} events across {len(pages)} month(s).")
+            return events
+
+        except ScheduleUnchanged:
+            raise
+        except Exception as e:
+            self.logger.error(f"Scrape Error: {e}")
+            # Don't hand a possibly broken browser to the next run
+            self.close()
+            if self.portal and is_outage(e):
+                self.portal.failed(f"{type(e).__name__}: {e}")
+            return []
+        finally:
+            self.governor.end_run()
+            if self.request_filter:
+                self.logger.info(self.request_filter.summary())
+            if not self.keep_alive:
+                self.close()
+            else:
+                self._recycle_if_needed()
+
+    def _start(self):
+        # Playwright is the heaviest import we have, only pay for it when a browser is needed
+        from playwright.sync_api import sync_playwright
+        self._playwright = sync_playwright().start()
+        self.logger.info(f"Launching Browser (Headless: {self.headless}, Profile: {self.profile_mode})")
+        with span("browser.launch", profile=self.profile_mode):
+            self._browser, self._context = self._launch(self._playwright)
+        BROWSER_LAUNCHES.inc()
+        self.governor.new_browser()
+        self.governor.attach(self._context)
+        if self.request_filter:
+            self.request_filter.attach(self._context)
+
+    def _recycle_if_needed(self):
+        """Closes a warm browser the governor wants replaced, the next run starts a fresh one."""
+        reason = self.governor.recycle_reason() if self._context is not None else None
+        if reason:
+            self.governor.recycled(reason)
+            self.close()
+
+    def close(self):
+        """Shuts the browser down. Only needed with keep_alive, otherwise every run cleans up."""
+        if self._context is None:
+            return
+        for closer in (self._context.close, self._browser.close if self._browser else None, self._playwright.stop):
+            if closer:
+                try:
+                    closer()
+                except Exception as e:
+                    self.logger.debug(f"Ignoring error while closing browser: {e}")
+        self._playwright = self._browser = self._context = None
+
+    def _launch(self, p):
+        """Starts Chromium for the configured profile mode. Returns (browser or None, context)."""
+        args = self.governor.launch_args
+        viewport = self.governor.viewport
+        session = self._load_session()
+
+        if self.profile_mode == "ephemeral":
+            # Nothing on disk but the session snapshot, startup cost never grows
+            browser = p.chromium.launch(headless=self.headless, args=args)
+            context = browser.new_context(viewport=viewport, storage_state=session.get("state"))
+            return browser, context
+
+        if self.profile_mode == "pruned":
+            self._prune_profile()
+        context = p.chromium.launch_persistent_context(
+            self.user_data_dir,
+            headless=self.headless,
+            args=args,
+            viewport=viewport
+        )
+        # ASP.NET session cookies don't survive a browser restart, put them back from the snapshot
+        cookies = session.get("state", {}).get("cookies")
+        if cookies:
+            context.add_cookies(cookies)
+        return None, context
+
+    def _prune_profile(self):
+        removed = 0
+        for base in (self.user_data_dir, os.path.join(self.user_data_dir, "Default")):
+            for name in PROFILE_CACHE_DIRS:
+                path = os.path.join(base, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+        if removed:
+            self.logger.info(f"Pruned {removed} cache folder(s) from the browser profile.")
+
+    def _load_session(self):
+        if not self.session_file or not os.path.exists(self.session_file):
+            return {}
+        try:
+            with open(self.session_file, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable session snapshot: {e}")
+            return {}
+
+    def _drive(self, page, steps):
+        """Runs a page script (see run_steps) on this engine's page."""
+        return run_steps(page, steps)
+
+    # Page scripts: the ESS page sequence, written once for both engines
+
+    def _open_schedule(self, context):
+        """Page script: gets to the schedule through the saved session or a fresh login. False if not found."""
+        yield lambda page: page.set_default_timeout(PAGE_TIMEOUT)
+        with scrape_step("resume"):
+            resumed = yield from self._resume_session()
+        if not resumed:
+            with scrape_step("login"):
+                yield from self._login()
+            with scrape_step("navigation"):
+                found = yield from self._navigate_to_schedule()
+            if not found:
+                return False
+        yield from self._save_session(context)
+        return True
+
+    def _save_session(self, context):
+        """Page script: snapshots cookies/storage and the schedule URL so the next run can skip login."""
+        if not self.session_file:
+            return
+        try:
+            url = yield lambda page: page.url
+            state = yield lambda page: context.storage_state()
+            snapshot = {"schedule_url": url, "saved_at": time.time(), "state": state}
+            with open(self.session_file, "w") as f:
+                json.dump(snapshot, f)
+        except Exception as e:
+            self.logger.warning(f"Could not save session snapshot: {e}")
+
+    def _resume_session(self):
+        """Page script: deep-links to the saved schedule URL. True if the calendar loads without logging in."""
+        session = self._load_session()
+        url = session.get("schedule_url")
+        if not url:
+            return False
+
+        self.logger.info("Trying saved session...")
+        try:
+            with span("page.goto", url="schedule"):
+                yield lambda page: page.goto(url)
+            with span("wait_for_selector", selector=CALENDAR_DAY):
+                yield lambda page: page.wait_for_selector(CALENDAR_DAY, timeout=RESUME_TIMEOUT)
+        except Exception:
+            self.logger.info("Saved session expired, logging in again.")
+            return False
+        self.logger.info("Saved session still valid, skipped login.")
+        return True
+
+    def _login(self):
+        """Page script: the venue and LoginId/PIN forms."""
         self.logger.info("Navigating to ESS...")
         try:
-            page.goto("https://ess.abimm.com/ABIMM_ASP/Request.aspx")
-        except:
+            with span("page.goto", url="login"):
+                yield lambda page: page.goto(self.base_url)
+        except Exception:
             self.logger.warning("Initial load failed, reloading...")
-            page.reload()
+            yield lambda page: page.reload()
 
-        if page.locator("#input_venue").is_visible(timeout=5000):
+        if (yield lambda page: page.locator(VENUE_INPUT).is_visible(timeout=FORM_TIMEOUT)):
             self.logger.info("Entering Venue ID...")
-            page.fill("#input_venue", self.venue_id)
-            page.click("input[type='button'][value='Submit']")
-            page.wait_for_load_state("networkidle")
+            yield lambda page: page.fill(VENUE_INPUT, self.venue_id)
+            yield lambda page: page.click(VENUE_SUBMIT)
+            with span("wait networkidle", after="venue"):
+                yield lambda page: page.wait_for_load_state("networkidle")
 
-        if page.locator("#LoginId").is_visible(timeout=5000):
+        if (yield lambda page: page.locator(LOGIN_INPUT).is_visible(timeout=FORM_TIMEOUT)):
             self.logger.info("Logging in...")
-            page.fill("#LoginId", self.username)
-            page.fill("#PIN", self.password)
-            page.click("#loginButton")
-            page.wait_for_load_state("networkidle")
+            yield lambda page: page.fill(LOGIN_INPUT, self.username)
+            yield lambda page: page.fill(PIN_INPUT, self.password)
+            yield lambda page: page.click(LOGIN_BUTTON)
+            with span("wait networkidle", after="login"):
+                yield lambda page: page.wait_for_load_state("networkidle")
 
-    def _navigate_to_schedule(self, page):
+    def _navigate_to_schedule(self):
+        """Page script: follows the schedule link. True once the calendar is on the page."""
         self.logger.info("Locating Schedule...")
         found = False
-        for link_text in ["My Schedule", "Schedule"]:
-            if page.locator(f"text={link_text}").count() > 0:
-                page.click(f"text={link_text}")
+        for link_text in SCHEDULE_LINKS:
+            if (yield lambda page, link=f"text={link_text}": page.locator(link).count()) > 0:
+                yield lambda page, link=f"text={link_text}": page.click(link)
                 found = True
                 break
-        
-        if not found and "Schedule" not in page.title():
+
+        if not found and "Schedule" not in (yield lambda page: page.title()):
             self.logger.warning("Could not auto-navigate to Schedule.")
             return False
-            
-        page.wait_for_load_state("networkidle")
+
+        with span("wait networkidle", after="schedule link"):
+            yield lambda page: page.wait_for_load_state("networkidle")
         try:
-            page.wait_for_selector(".calendar_day_box", timeout=10000)
+            with span("wait_for_selector", selector=CALENDAR_DAY):
+                yield lambda page: page.wait_for_selector(CALENDAR_DAY, timeout=CALENDAR_TIMEOUT)
             return True
-        except:
+        except Exception:
             self.logger.error("Calendar element not found.")
             return False
 
-    def _parse_calendar(self, page):
-        self.logger.info("Parsing calendar HTML...")
-        soup = BeautifulSoup(page.content(), 'html.parser')
-        events = []
-        
-        month_title = soup.find('span', class_='MonthTitle')
-        if not month_title:
-            return []
+    def _month_links(self):
+        """
+        Page script: the "next month" link's href and, when it is an ASP.NET calendar
+        postback, (event target, [argument per month]). (None, None) without a link.
+        """
+        href = yield lambda page: page.evaluate(NEXT_MONTH_JS)
+        if not href:
+            self.logger.warning("No next-month link found, only the current month is synced.")
+            return None, None
+        return href, month_postbacks(href, self.months_ahead)
 
-        month_year_text = month_title.get_text(strip=True)
+    def _next_month(self, href):
+        """Page script: clicks the month link `href`. Returns (month HTML, next link href), HTML None if it didn't load."""
+        title = yield lambda page: page.inner_text(MONTH_TITLE)
+        yield lambda page: page.click(f"a[href=\"{href}\"]")
         try:
-            current_month_date = datetime.datetime.strptime(month_year_text, "%B %Y")
-        except:
-            self.logger.error(f"Failed to parse month date: {month_year_text}")
+            yield lambda page: page.wait_for_function(MONTH_CHANGED_JS, arg=title)
+        except Exception:
+            self.logger.warning("Next month did not load, stopping here.")
+            return None, None
+        html = yield lambda page: page.content()
+        return html, (yield lambda page: page.evaluate(NEXT_MONTH_JS))
+
+    def _fetch_next_months(self, page):
+        """
+        Returns the HTML of the next `months_ahead` month views.
+        ASP.NET calendar postbacks address a month directly, so every month is
+        requested concurrently from inside the logged-in page. Anything else falls
+        back to clicking through the months one at a time.
+        """
+        if self.months_ahead <= 0:
             return []
 
-        day_boxes = soup.find_all('td', class_='calendar_day_box')
-        
-        for box in day_boxes:
-            if 'other_month_box' in box.get('class', []): continue
-            
-            text = box.get_text(strip=True)
-            if not text: continue
-            
-            match = re.match(r'^(\d{1,2})', text)
-            if not match: continue
-            day_num = int(match.group(1))
-
-            details_div = box.find('div', class_='day_details')
-            if details_div and details_div.find('a'):
-                link = details_div.find('a')
-                href = link.get('href', '')
-                id_match = re.search(r"showDetails\('(\d+)'\)", href)
-                
-                if id_match:
-                    evt_id = id_match.group(1)
-                    time_range = link.get_text(strip=True)
-                    
-                    try:
-                        evt_name_tag = soup.find('div', id=f"{evt_id}evt")
-                        loc_name_tag = soup.find('div', id=f"{evt_id}fac")
-                        
-                        evt_name = evt_name_tag.get_text(strip=True) if evt_name_tag else "Unknown Event"
-                        loc_name = loc_name_tag.get_text(strip=True) if loc_name_tag else "Unknown Location"
-                        
-                        t_match = re.search(r"(\d{1,2}:\d{2}\s*[ap]m)\s*-\s*(\d{1,2}:\d{2}\s*[ap]m)", time_range, re.IGNORECASE)
-                        if t_match:
-                            s_str, e_str = t_match.groups()
-                            base_date = current_month_date.replace(day=day_num)
-                            day_str = base_date.strftime('%Y-%m-%d')
-                            
-                            start_dt = datetime.datetime.strptime(f"{day_str} {s_str}", "%Y-%m-%d %I:%M %p")
-                            end_dt = datetime.datetime.strptime(f"{day_str} {e_str}", "%Y-%m-%d %I:%M %p")
-                            
-                            if end_dt < start_dt:
-                                end_dt += timedelta(days=1)
-                            
-                            events.append({
-                                "summary": evt_name,
-                                "location": loc_name,
-                                "description": f"Shift: {time_range}\nScraped from ESS.",
-                                "start": start_dt,
-                                "end": end_dt,
-                                "time_str": time_range
-                            })
-                    except Exception as e:
-                        self.logger.warning(f"Error parsing event on day {day_num}: {e}")
+        href, postback = self._drive(page, self._month_links())
+        if not href:
+            return []
+        if postback:
+            target, args = postback
+            self.logger.info(f"Fetching {len(args)} more month(s) concurrently...")
+            try:
+                return page.evaluate(FETCH_MONTHS_JS, [target, args])
+            except Exception as e:
+                self.logger.warning(f"Concurrent month fetch failed, clicking through instead: {e}")
 
+        htmls = []
+        for _ in range(self.months_ahead):
+            html, href = self._drive(page, self._next_month(href))
+            if html is None:
+                break
+            htmls.append(html)
+            if not href:
+                break
+        return htmls
+
+    def _merge(self, month_events):
+        """Flattens per-month results, dropping shifts that showed up in more than one view."""
+        seen = set()
+        merged = []
+        for events in month_events:
+            for evt in events:
+                if evt in seen:
+                    continue
+                seen.add(evt)
+                merged.append(evt)
+        merged.sort()
+        return merged
+
+    def _parse_calendar(self, html):
+        self.logger.info("Parsing calendar HTML...")
+        with scrape_step("parse"), profiled():
+            month, events = parse_month(html, self.parser_backend)
+        self._parsed.append(month)
         return events
@@ -1,7 +1,6 @@
 import customtkinter as ctk
 import os
 from tkinter import messagebox
-from dotenv import load_dotenv
 
 # Set Theme
 ctk.set_appearance_mode("Dark")
@@ -0,0 +1,141 @@
+"""
+The shift model.
+
+The parser turns every ESS shift into a ShiftEvent and the rest of the bot
+(sync, ledger, Calendar requests, output) reads it from there. ShiftEvents are
+immutable and slotted. The Calendar event ID, the ledger key, the content hash
+and the Calendar request body are computed the first time they're needed and
+then cached. Equality and ordering go through one precomputed tuple, so
+sorting and de-duplicating many months (or accounts) of shifts stays cheap.
+"""
+import hashlib
+
+from utils import generate_event_id
+
+DESCRIPTION = "Shift: {}\nScraped from ESS."
+
+_CACHED = ("_event_id", "_key", "_content_hash", "_body")
+
+
+class ShiftEvent:
+    __slots__ = ("summary", "location", "start", "end", "time_str", "ess_id", "_order", "_hash") + _CACHED
+
+    def __init__(self, summary, location, start, end, time_str, ess_id=None):
+        init = object.__setattr__
+        init(self, "summary", summary)
+        init(self, "location", location)
+        init(self, "start", start)
+        init(self, "end", end)
+        init(self, "time_str", time_str)
+        init(self, "ess_id", ess_id)
+        # Start first so sorted() puts shifts in calendar order
+        order = (start, end, summary, location, time_str, ess_id or "")
+        init(self, "_order", order)
+        init(self, "_hash", hash(order))
+        for name in _CACHED:
+            init(self, name, None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ShiftEvent is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ShiftEvent is immutable")
+
+    def __reduce__(self):
+        return ShiftEvent, (self.summary, self.location, self.start, self.end, self.time_str, self.ess_id)
+
+    def __repr__(self):
+        return f"ShiftEvent({self.start:%Y-%m-%d} {self.time_str!r}, {self.summary!r}, ess_id={self.ess_id!r})"
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ShiftEvent):
+            return NotImplemented
+        return self._hash == other._hash and self._order == other._order
+
+    def __lt__(self, other):
+        if not isinstance(other, ShiftEvent):
+            return NotImplemented
+        return self._order < other._order
+
+    def __le__(self, other):
+        if not isinstance(other, ShiftEvent):
+            return NotImplemented
+        return self._order <= other._order
+
+    def __gt__(self, other):
+        if not isinstance(other, ShiftEvent):
+            return NotImplemented
+        return self._order > other._order
+
+    def __ge__(self, other):
+        if not isinstance(other, ShiftEvent):
+            return NotImplemented
+        return self._order >= other._order
+
+    @property
+    def description(self):
+        return DESCRIPTION.format(self.time_str)
+
+    @property
+    def shift_date(self):
+        return self.start.date().isoformat()
+
+    @property
+    def event_id(self):
+        """Deterministic Calendar event ID for a shift we insert."""
+        if self._event_id is None:
+            object.__setattr__(self, "_event_id", generate_event_id(self.summary, self.start, self.end))
+        return self._event_id
+
+    @property
+    def key(self):
+        """Stable identity for the ledger across runs: the ESS detail ID when we have it."""
+        if self._key is None:
+            object.__setattr__(self, "_key", f"ess:{self.ess_id}" if self.ess_id else self.event_id)
+        return self._key
+
+    @property
+    def content_hash(self):
+        """Hash of everything we write to the calendar, used to detect changed shifts."""
+        if self._content_hash is None:
+            base_str = "|".join([
+                self.summary,
+                self.location,
+                self.description,
+                self.start.isoformat(),
+                self.end.isoformat(),
+            ])
+            object.__setattr__(self, "_content_hash", hashlib.sha1(base_str.encode('utf-8')).hexdigest())
+        return self._content_hash
+
+    @property
+    def calendar_body(self):
+        """
+        Calendar API request body without the event ID. Built once and shared, so
+        callers copy it (see gcal._build_body) instead of changing it.
+        """
+        if self._body is None:
+            from gcal import TIME_ZONE, BOT_PROPERTY
+
+            object.__setattr__(self, "_body", {
+                'summary': self.summary,
+                'location': self.location,
+                'description': self.description,
+                'start': {
+                    'dateTime': self.start.isoformat(),
+                    'timeZone': TIME_ZONE,
+                },
+                'end': {
+                    'dateTime': self.end.isoformat(),
+                    'timeZone': TIME_ZONE,
+                },
+                'colorId': '6',
+                'reminders': {'useDefault': False, 'overrides': [{'method': 'popup', 'minutes': 24 * 60}]},
+                'extendedProperties': {'private': {BOT_PROPERTY[0]: BOT_PROPERTY[1]}},
+            })
+        return self._body
@@ -0,0 +1,455 @@
+"""
+Calendar sinks: where synced shifts end up.
+
+GOOGLE_CALENDAR_ID lists the Google calendars to sync (comma separated,
+"primary" by default, "none" for no Google at all) and ICS_FILE adds a local
+.ics feed that calendar apps can subscribe to without any API quota.
+build_sinks() turns that into one MultiCalendarSink, which runs every target
+on its own thread so a slow or failing one doesn't hold up the rest.
+
+A sink is used as
+
+    sink.prepare(window)           # optional prefetching, once
+    sink.sync(events, progress)    # once, or once per month in the async pipeline
+    sink.finish(events, months)    # once, with every synced event and the months fully scraped
+    sink.close()
+
+sync() returns (statuses, removed) like sync.sync_shifts(), finish() more removed rows.
+"""
+import os
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gcal import GoogleCalendarManager, calendar_file, TIME_ZONE
+from ledger import SyncLedger
+from sync import sync_shifts, delete_removed, SYNCED_STATUSES
+from metrics import count_event
+
+logger = logging.getLogger("ABI_Bot.Sinks")
+
+# Sync calls one sink may have running at once (the async pipeline syncs several months in parallel)
+CALLS_PER_SINK = 4
+# The more telling status wins when calendars disagree about a shift
+STATUS_RANK = {"UPDATED": 0, "ADDED": 1, "SKIPPED": 2}
+# gcal.TIME_ZONE (America/Denver, US rules since 2007) spelled out for feed readers that
+# don't know the TZID; change it together with TIME_ZONE
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE", f"TZID:{TIME_ZONE}",
+    "BEGIN:DAYLIGHT", "TZOFFSETFROM:-0700", "TZOFFSETTO:-0600", "TZNAME:MDT",
+    "DTSTART:20070311T020000", "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU", "END:DAYLIGHT",
+    "BEGIN:STANDARD", "TZOFFSETFROM:-0600", "TZOFFSETTO:-0700", "TZNAME:MST",
+    "DTSTART:20071104T020000", "RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU", "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+
+class CalendarSink:
+    """Base class; sinks override what they need."""
+    name = "sink"
+
+    def prepare(self, window=None):
+        """Called once before syncing. `window` is the (start, end) the run will cover, if known."""
+
+    def sync(self, events, progress=None):
+        raise NotImplementedError
+
+    def finish(self, events, months=()):
+        """
+        Called once after the last sync() with every synced event and the months ("YYYY-MM")
+        the scrape fully parsed; shifts may only be removed in those. Returns removed rows.
+        """
+        return []
+
+    def close(self):
+        pass
+
+
+class GoogleCalendarSink(CalendarSink):
+    """One Google calendar, with its own ledger when SYNC_LEDGER is on."""
+
+    def __init__(self, gcal, ledger_path=None, incremental=False):
+        self.gcal = gcal
+        self.name = f"google:{gcal.calendar_id}"
+        self.ledger = SyncLedger(ledger_path) if ledger_path else None
+        self.incremental = incremental
+        self.existing = None
+        self._owner = threading.get_ident()
+        self._clients = threading.local()
+
+    def prepare(self, window=None):
+        if not self.gcal.service:
+            raise RuntimeError("Google Calendar is not authorized")
+        if window is None and not self.incremental:
+            # Each sync() lists its own range
+            return
+        client = self._client()
+        try:
+            if self.incremental:
+                self.existing = client.fetch_changed_events()
+            else:
+                self.existing = client.list_bot_events(*window)
+        except Exception as e:
+            logger.warning(f"[{self.name}] Could not prefetch existing events: {e}")
+            self.existing = None
+
+    def _client(self):
+        # httplib2 connections aren't thread-safe: other threads get a forked manager each
+        if threading.get_ident() == self._owner:
+            return self.gcal
+        client = getattr(self._clients, "gcal", None)
+        if client is None:
+            client = self._clients.gcal = self.gcal.fork()
+        return client
+
+    def sync(self, events, progress=None):
+        return sync_shifts(self._client(), events, self.ledger, self.incremental, progress, self.existing)
+
+    def finish(self, events, months=()):
+        # Every deletion happens here, once the months that really were scraped are known
+        if not self.ledger or not events:
+            return []
+        return delete_removed(self._client(), events, self.ledger, months)
+
+    def close(self):
+        if self.ledger:
+            self.ledger.close()
+
+
+class IcsFileSink(CalendarSink):
+    """
+    Subscribable .ics feed. Shifts gone from ESS are dropped only in the months
+    the scrape fully parsed, everything else is kept, and the file is only
+    rewritten (atomically) when its content changed.
+    """
+
+    def __init__(self, path, calendar_name="ESS Shifts"):
+        self.path = path
+        self.calendar_name = calendar_name
+        self.name = f"ics:{path}"
+        self._lock = threading.Lock()
+        self._text = None
+        self._old = None
+        self._new = {}
+
+    def _load(self):
+        """Reads the previous feed. Returns {uid: (shift_date, content_hash, summary, vevent lines)}."""
+        try:
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                self._text = f.read()
+        except FileNotFoundError:
+            self._text = ""
+        except OSError as e:
+            logger.warning(f"[{self.name}] Could not read the feed, writing a new one: {e}")
+            self._text = ""
+
+        known = {}
+        block = None
+        for line in self._text.splitlines():
+            if line == "BEGIN:VEVENT":
+                block = []
+            if block is None:
+                continue
+            block.append(line)
+            if line == "END:VEVENT":
+                fields = _fields(block)
+                if "UID" in fields:
+                    start = fields.get("DTSTART", "")[-15:-7]
+                    shift_date = f"{start[:4]}-{start[4:6]}-{start[6:]}" if len(start) == 8 else ""
+                    known[fields["UID"]] = (shift_date, fields.get("X-ABI-HASH", ""),
+                                            _unescape(fields.get("SUMMARY", "")), block)
+                block = None
+        return known
+
+    def sync(self, events, progress=None):
+        with self._lock:
+            if self._old is None:
+                self._old = self._load()
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        statuses = []
+        for i, evt in enumerate(events):
+            uid = f"{evt.key}@abi-bot"
+            old = self._old.get(uid)
+            if old is not None and old[1] == evt.content_hash:
+                # Kept as it was, DTSTAMP included, so an unchanged schedule means an unchanged file
+                status, entry = "SKIPPED", old
+            else:
+                status = "ADDED" if old is None else "UPDATED"
+                entry = (evt.shift_date, evt.content_hash, evt.summary, _vevent(evt, uid, stamp))
+            with self._lock:
+                self._new[uid] = entry
+            count_event(status, "ics")
+            statuses.append(status)
+            if progress:
+                progress(i, status)
+        return statuses, []
+
+    def finish(self, events, months=()):
+        if not events or self._old is None:
+            # Nothing scraped: leave the feed alone rather than emptying it
+            return []
+        months = set(months)
+        entries = dict(self._new)
+        removed = []
+        for uid, entry in self._old.items():
+            if uid in entries:
+                continue
+            if entry[0][:7] in months:
+                removed.append((entry[0], entry[2], "DELETED"))
+                count_event("DELETED", "ics")
+            else:
+                entries[uid] = entry
+        self._old, self._new = None, {}
+
+        lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//ABI Bot Sync//EN", "CALSCALE:GREGORIAN",
+                 "METHOD:PUBLISH", f"X-WR-CALNAME:{_escape(self.calendar_name)}", f"X-WR-TIMEZONE:{TIME_ZONE}"] + VTIMEZONE
+        for uid in sorted(entries, key=lambda uid: (entries[uid][0], uid)):
+            lines.extend(entries[uid][3])
+        lines.append("END:VCALENDAR")
+        text = "\r\n".join(lines) + "\r\n"
+
+        if text == self._text:
+            logger.info(f"[{self.name}] Feed unchanged, not rewritten")
+            return removed
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+        logger.info(f"[{self.name}] Wrote {len(entries)} events")
+        return removed
+
+
+class MultiCalendarSink(CalendarSink):
+    """
+    Fans every call out to several sinks at once. A sink that raises only fails
+    its own shifts: they get an ERROR status naming the sink and the others carry on.
+    Statuses are merged per shift (any error wins, then UPDATED, ADDED, SKIPPED).
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self.name = ", ".join(sink.name for sink in self.sinks)
+        self.failed = {}
+        # A single sink runs on the calling thread
+        self._pool = None
+        if len(self.sinks) > 1:
+            self._pool = ThreadPoolExecutor(len(self.sinks) * CALLS_PER_SINK, thread_name_prefix="sink")
+
+    def _each(self, call, sinks):
+        """Runs call(sink) for every sink at once. Returns [(sink, result, error)]."""
+        if self._pool is None:
+            results = []
+            for sink in sinks:
+                try:
+                    results.append((sink, call(sink), None))
+                except Exception as e:
+                    results.append((sink, None, e))
+        else:
+            futures = [(sink, self._pool.submit(call, sink)) for sink in sinks]
+            results = []
+            for sink, future in futures:
+                try:
+                    results.append((sink, future.result(), None))
+                except Exception as e:
+                    results.append((sink, None, e))
+        for sink, _, error in results:
+            if error is not None:
+                logger.error(f"[{sink.name}] {type(error).__name__}: {error}")
+        return results
+
+    def prepare(self, window=None):
+        for sink, _, error in self._each(lambda sink: sink.prepare(window), self.sinks):
+            if error is not None:
+                self.failed[sink.name] = error
+        if self.sinks and len(self.failed) == len(self.sinks):
+            raise next(iter(self.failed.values()))
+
+    def sync(self, events, progress=None):
+        if not events:
+            return [], []
+        fan_in = _FanIn(len(events), len(self.sinks), progress, self._merge)
+        live = [sink for sink in self.sinks if sink.name not in self.failed]
+        results = {sink.name: (None, self.failed[sink.name]) for sink in self.sinks if sink.name in self.failed}
+        for sink, result, error in self._each(
+                lambda sink: sink.sync(events, fan_in.reporter(self.sinks.index(sink))), live):
+            results[sink.name] = (result, error)
+
+        columns = []
+        removed = []
+        for k, sink in enumerate(self.sinks):
+            result, error = results[sink.name]
+            if error is not None:
+                statuses = [f"ERROR: {sink.name}: {error}"] * len(events)
+            else:
+                statuses, gone = result
+                removed.extend(gone)
+            fan_in.fill(k, statuses)
+            columns.append(statuses)
+        return [self._merge(list(row)) for row in zip(*columns)], removed
+
+    def _merge(self, statuses):
+        if len(statuses) == 1:
+            return statuses[0]
+        for sink, status in zip(self.sinks, statuses):
+            if status not in SYNCED_STATUSES:
+                if status.startswith(f"ERROR: {sink.name}:"):
+                    return status
+                return f"ERROR: {sink.name}: {status[len('ERROR: '):] if status.startswith('ERROR: ') else status}"
+        return min(statuses, key=STATUS_RANK.get)
+
+    def finish(self, events, months=()):
+        removed = []
+        live = [sink for sink in self.sinks if sink.name not in self.failed]
+        for sink, result, error in self._each(lambda sink: sink.finish(events, months), live):
+            if error is not None:
+                # A failed write has to show up as a failed run so the schedule isn't marked synced
+                removed.append(("-", sink.name, f"ERROR: {error}"))
+            else:
+                removed.extend(result)
+        return removed
+
+    def close(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.debug(f"Ignoring error while closing {sink.name}: {e}")
+        if self._pool:
+            self._pool.shutdown(wait=False)
+
+
+class _FanIn:
+    """Calls progress(i, merged status) once every sink has reported shift i."""
+
+    def __init__(self, count, sinks, progress, merge):
+        self.progress = progress
+        self.merge = merge
+        self.columns = [[None] * count for _ in range(sinks)]
+        self.pending = [sinks] * count
+        self._lock = threading.Lock()
+
+    def reporter(self, k):
+        return lambda i, status: self.report(k, i, status)
+
+    def report(self, k, i, status):
+        with self._lock:
+            if self.columns[k][i] is not None:
+                return
+            self.columns[k][i] = status
+            self.pending[i] -= 1
+            done = self.pending[i] == 0
+            row = [column[i] for column in self.columns] if done else None
+        if done and self.progress:
+            self.progress(i, self.merge(row))
+
+    def fill(self, k, statuses):
+        """Reports whatever sink k didn't (it failed, or skips progress for some statuses)."""
+        for i, status in enumerate(statuses):
+            if self.columns[k][i] is None:
+                self.report(k, i, status)
+
+
+def build_sinks(config, gcal=None, ledger_path="sync_ledger.db"):
+    """
+    The sinks configured in `config` (GOOGLE_CALENDAR_ID, ICS_FILE) as one MultiCalendarSink.
+    `gcal` is an authenticated manager to reuse; one is created if Google is configured and it's None.
+    """
+    sinks = []
+    if config["calendar_ids"]:
+        if gcal is None:
+            gcal = GoogleCalendarManager(max_qps=config["gcal_max_qps"], max_retries=config["gcal_max_retries"],
+                                         api_url=config["gcal_api_url"])
+        for calendar_id in config["calendar_ids"]:
+            sinks.append(GoogleCalendarSink(
+                gcal.for_calendar(calendar_id),
+                ledger_path=calendar_file(ledger_path, calendar_id) if config["use_ledger"] else None,
+                incremental=config["incremental"],
+            ))
+    if config["ics_file"]:
+        sinks.append(IcsFileSink(config["ics_file"]))
+    return MultiCalendarSink(sinks)
+
+
+def _escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _unescape(text):
+    out = []
+    chars = iter(text)
+    for ch in chars:
+        if ch == "\\":
+            nxt = next(chars, "")
+            out.append("\n" if nxt in ("n", "N") else nxt)
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _fold(line):
+    """Splits a content line into 75-octet pieces (RFC 5545 3.1)."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return [line]
+    pieces = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        # Don't split a UTF-8 sequence
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(("" if not pieces else " ") + data[:cut].decode("utf-8"))
+        data = data[cut:]
+        limit = 74
+    return pieces
+
+
+def _fields(block):
+    """{name: value} of a VEVENT's own properties (folded lines joined, alarms skipped)."""
+    fields = {}
+    depth = 0
+    current = None
+    for line in block:
+        if line.startswith((" ", "\t")):
+            if current is not None and depth == 1:
+                fields[current] += line[1:]
+            continue
+        current = None
+        if line.startswith("BEGIN:"):
+            depth += 1
+            continue
+        if line.startswith("END:"):
+            depth -= 1
+            continue
+        if depth != 1 or ":" not in line:
+            continue
+        name, value = line.split(":", 1)
+        current = name.split(";", 1)[0].upper()
+        fields[current] = value
+    return fields
+
+
+def _vevent(evt, uid, stamp):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART;TZID={TIME_ZONE}:{evt.start:%Y%m%dT%H%M%S}",
+        f"DTEND;TZID={TIME_ZONE}:{evt.end:%Y%m%dT%H%M%S}",
+        f"SUMMARY:{_escape(evt.summary)}",
+        f"LOCATION:{_escape(evt.location)}",
+        f"DESCRIPTION:{_escape(evt.description)}",
+        f"X-ABI-HASH:{evt.content_hash}",
+        # Same reminder as the Google events: a day ahead
+        "BEGIN:VALARM",
+        "ACTION:DISPLAY",
+        "TRIGGER:-P1D",
+        f"DESCRIPTION:{_escape(evt.summary)}",
+        "END:VALARM",
+        "END:VEVENT",
+    ]
+    return [piece for line in lines for piece in _fold(line)]
@@ -0,0 +1,103 @@
+import logging
+
+from metrics import count_event
+from tracing import traced, span, profiled
+
+logger = logging.getLogger("ABI_Bot.Sync")
+
+# Statuses that mean the calendar now holds the shift as scraped
+SYNCED_STATUSES = ("ADDED", "UPDATED", "SKIPPED")
+
+
+def sync_succeeded(statuses, removed):
+    """True when every shift is on the calendar as scraped and every removal went through."""
+    return (all(status in SYNCED_STATUSES for status in statuses)
+            and all(status == "DELETED" for _, _, status in removed))
+
+
+@traced("sync_shifts")
+def sync_shifts(gcal, events, ledger=None, incremental=False, progress=None, existing=None):
+    """
+    Pushes scraped events to Google Calendar.
+    With a ledger, unchanged shifts never reach the API and changed shifts patch
+    their original event. Shifts the ledger has never seen go through
+    gcal.reconcile_events(). Shifts gone from ESS are left to delete_removed(),
+    which runs once the whole scrape is in and knows which months it covered.
+    `existing` is a prefetched calendar listing (see gcal.list_bot_events).
+    Returns (statuses, removed) where statuses has one entry per event and
+    removed is a list of (shift_date, summary, status) for deleted shifts,
+    always empty here (kept so every sink returns the same shape).
+    """
+    def report(i, status):
+        if progress:
+            progress(i, status)
+
+    if ledger is None:
+        uids = [evt.event_id for evt in events]
+        return gcal.reconcile_events(events, uids, incremental=incremental, progress=progress,
+                                     existing=existing), []
+
+    with span("ledger.plan", events=len(events)), profiled():
+        plan = ledger.plan(events)
+    statuses = [None] * len(events)
+
+    for i in plan['unchanged']:
+        statuses[i] = "SKIPPED"
+        count_event("SKIPPED", "ledger")
+        report(i, "SKIPPED")
+
+    # Shifts the ledger doesn't know yet may still be on the calendar from an earlier version
+    new_events = [events[i] for i in plan['new']]
+    new_uids = [evt.event_id for evt in new_events]
+    new_statuses = gcal.reconcile_events(
+        new_events, new_uids, incremental=incremental,
+        progress=lambda j, status: report(plan['new'][j], status), existing=existing
+    )
+
+    updates = [(events[i], event_id) for i, event_id in plan['changed']]
+    results = gcal.apply_changes(
+        updates=updates,
+        progress=lambda kind, j, status: report(plan['changed'][j][0], status) if kind == 'updates' else None
+    )
+
+    synced = []
+    for i, uid, status in zip(plan['new'], new_uids, new_statuses):
+        statuses[i] = status
+        if status in SYNCED_STATUSES:
+            synced.append((events[i], uid))
+    for (i, event_id), status in zip(plan['changed'], results['updates']):
+        statuses[i] = status
+        if status in SYNCED_STATUSES:
+            synced.append((events[i], event_id))
+    ledger.record(synced)
+
+    return statuses, []
+
+
+@traced("delete_removed")
+def delete_removed(gcal, events, ledger, months=()):
+    """
+    Deletes the calendar events of ledger shifts in `months` ("YYYY-MM", the months
+    the scrape fully parsed, see scraper.complete_months) that ESS no longer lists.
+    Called once at the end of a run with every synced event. Without months (a month
+    failed to load) nothing is deleted.
+    Returns removed like sync_shifts().
+    """
+    plan = ledger.plan(events, months)
+    ledger.forget(plan['superseded'])
+    if not plan['removed']:
+        return []
+    results = gcal.apply_changes(deletes=[event_id for _, event_id, _, _ in plan['removed']])
+    return _settle_removed(ledger, plan['removed'], results['deletes'])
+
+
+def _settle_removed(ledger, planned, statuses):
+    """Forgets the shifts whose events are gone. Returns (shift_date, summary, status) per shift."""
+    removed = []
+    gone = []
+    for (key, _, shift_date, summary), status in zip(planned, statuses):
+        removed.append((shift_date, summary, status))
+        if status == "DELETED":
+            gone.append(key)
+    ledger.forget(gone)
+    return removed
@@ -0,0 +1,26 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+# The bot is a folder of flat modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shift import ShiftEvent
+
+
+@pytest.fixture
+def march():
+    """The months a scrape of March 2030 parsed, as scraper.months reports them."""
+    return ("2030-03",)
+
+
+@pytest.fixture
+def shift():
+    """Builds 5 pm concert shifts in 2030: shift(day, ess_id=None, month=3)."""
+    def make(day, ess_id=None, month=3, summary="Concert"):
+        start = datetime.datetime(2030, month, day, 17, 0)
+        return ShiftEvent(summary, "Arena", start, start + datetime.timedelta(hours=5), "5:00 pm - 10:00 pm",
+                          ess_id)
+    return make
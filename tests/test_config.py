@@ -0,0 +1,30 @@
+import sys
+
+import pytest
+
+from utils import load_config
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv("ICS_FILE", "shifts.ics")
+    return monkeypatch
+
+
+def test_default_backend_is_accepted(env):
+    assert load_config(require_account=False)["parser_backend"] == "auto"
+
+
+def test_unknown_backend_is_a_config_error(env):
+    env.setenv("PARSER_BACKEND", "foo")
+    with pytest.raises(ValueError, match="PARSER_BACKEND"):
+        load_config(require_account=False)
+
+
+def test_missing_backend_is_a_config_error(env):
+    env.setenv("PARSER_BACKEND", "lxml")
+    # An entry of None makes the import fail as if lxml weren't installed
+    env.setitem(sys.modules, "lxml", None)
+    env.setitem(sys.modules, "lxml.html", None)
+    with pytest.raises(ValueError, match="lxml is not installed"):
+        load_config(require_account=False)
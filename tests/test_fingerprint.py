@@ -0,0 +1,26 @@
+import pytest
+
+from fingerprint import FingerprintStore, ScheduleUnchanged
+
+PAGES = ["<div class='calendar_day_box'>Concert</div>"]
+
+
+def synced(path, targets):
+    store = FingerprintStore(str(path), targets=targets)
+    store.check(PAGES)
+    store.commit()
+
+
+def test_same_schedule_and_calendars_is_unchanged(tmp_path):
+    path = tmp_path / "fingerprints.json"
+    synced(path, [["primary"], None])
+    with pytest.raises(ScheduleUnchanged):
+        FingerprintStore(str(path), targets=[["primary"], None]).check(PAGES)
+
+
+@pytest.mark.parametrize("targets", [[["primary", "work"], None], [["primary"], "shifts.ics"]])
+def test_new_calendar_gets_a_full_sync(tmp_path, targets):
+    path = tmp_path / "fingerprints.json"
+    synced(path, [["primary"], None])
+    # Returns instead of raising: the scrape goes on to parse and sync
+    FingerprintStore(str(path), targets=targets).check(PAGES)
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+
+from benchmarks.fake_ess import FakeESSServer
+from ess_parser import parse_calendar
+from http_scraper import HTTPScraper, MAX_PARALLEL_MONTHS
+
+START = datetime.date(2030, 1, 1)
+
+
+class StubBrowser:
+    """Stands in for the ESSScraper fallback."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def scrape_schedule(self):
+        self.calls += 1
+        return ["from the browser"]
+
+
+@pytest.fixture
+def ess():
+    server = FakeESSServer(venue_id="123", username="u", password="p", start_month=START).start()
+    yield server
+    server.stop()
+
+
+def expected_shifts(server, months_ahead):
+    events = set()
+    for offset in range(months_ahead + 1):
+        month = datetime.date(START.year + offset // 12, offset % 12 + 1, 1)
+        events.update(parse_calendar(server.month_html(month)))
+    return sorted(events)
+
+
+@pytest.mark.parametrize("months_ahead", [0, 2, MAX_PARALLEL_MONTHS * 2 + 1])
+def test_scrapes_what_the_parser_finds(ess, months_ahead):
+    scraper = HTTPScraper("123", "u", "p", months_ahead=months_ahead, base_url=ess.url)
+    events = scraper.scrape_schedule()
+
+    assert events == expected_shifts(ess, months_ahead)
+    assert len(events) == ess.shifts_per_month * (months_ahead + 1)
+    assert len(scraper.months) == months_ahead + 1 and scraper.months[0] == "2030-01"
+    # One session for the login and every concurrent month post
+    assert len(ess.sessions) == 1
+
+
+def test_unsupported_page_falls_back_to_the_browser(ess):
+    browser = StubBrowser()
+    scraper = HTTPScraper("123", "u", "wrong", months_ahead=2, base_url=ess.url, fallback=browser)
+    assert scraper.scrape_schedule() == ["from the browser"]
+    assert browser.calls == 1
+
+
+def test_unsupported_page_without_fallback(ess):
+    scraper = HTTPScraper("999", "u", "p", base_url=ess.url)
+    assert scraper.scrape_schedule() == []
+    assert scraper.months == ()
+
+
+class BrokenMonthESS(FakeESSServer):
+    """Answers the third month with an expired-session page."""
+
+    def month_html(self, month_start):
+        if month_start == datetime.date(2030, 3, 1):
+            return "<html><body>Your session has expired.</body></html>"
+        return super().month_html(month_start)
+
+
+def test_month_without_calendar_falls_back_to_the_browser():
+    server = BrokenMonthESS(venue_id="123", username="u", password="p", start_month=START).start()
+    try:
+        browser = StubBrowser()
+        scraper = HTTPScraper("123", "u", "p", months_ahead=3, base_url=server.url, fallback=browser)
+        assert scraper.scrape_schedule() == ["from the browser"]
+        assert browser.calls == 1
+    finally:
+        server.stop()
@@ -0,0 +1,26 @@
+import io
+import json
+
+import main
+
+CONFIG = {"pipeline": "sequential", "calendar_ids": [], "metrics_textfile": None}
+
+
+class CrashingScraper:
+    fingerprints = None
+    months = ()
+
+    def scrape_schedule(self):
+        raise ValueError("Unknown parser backend: foo")
+
+
+def test_unexpected_error_still_ends_with_a_summary(caplog):
+    stream = io.StringIO()
+    code = main._run_bot(CONFIG, CrashingScraper(), False, main.JsonLines(stream))
+
+    assert code == main.EXIT_FAILED
+    summary = json.loads(stream.getvalue().splitlines()[-1])
+    assert summary["type"] == "summary" and summary["exit_code"] == main.EXIT_FAILED
+    assert "Unknown parser backend: foo" in summary["error"]
+    # The traceback goes to the log
+    assert any(record.exc_info for record in caplog.records)
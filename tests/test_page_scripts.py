@@ -0,0 +1,184 @@
+import json
+import asyncio
+
+import pytest
+from playwright.sync_api import TimeoutError as PlaywrightTimeout
+
+from scraper import (ESSScraper, month_postbacks, NEXT_MONTH_JS, MONTH_CHANGED_JS, VENUE_INPUT, VENUE_SUBMIT, LOGIN_INPUT,
+                     LOGIN_BUTTON, CALENDAR_DAY)
+from async_scraper import AsyncESSScraper
+
+ESS = "https://ess.example/ABIMM_ASP/Request.aspx"
+NEXT_HREF = "javascript:__doPostBack('Calendar1','V11000')"
+
+
+class FakePage:
+    """Sync stand-in for a Playwright page walking through the ESS login; records every call."""
+
+    def __init__(self, goto_fails=False, has_calendar=True, logged_in=False):
+        self.goto_fails = goto_fails
+        self.has_calendar = has_calendar
+        self.stage = "schedule" if logged_in else "venue"
+        self.url = "about:blank"
+        self.month = 1
+        self.calls = []
+
+    def set_default_timeout(self, timeout):
+        self.calls.append(("set_default_timeout", timeout))
+
+    def goto(self, url):
+        self.calls.append(("goto", url))
+        if self.goto_fails:
+            raise PlaywrightTimeout("Page.goto: Timeout 20000ms exceeded.")
+        self.url = url
+
+    def reload(self):
+        self.calls.append(("reload",))
+
+    def locator(self, selector):
+        return FakeLocator(self, selector)
+
+    def fill(self, selector, value):
+        self.calls.append(("fill", selector, value))
+
+    def click(self, selector):
+        self.calls.append(("click", selector))
+        self.stage = {VENUE_SUBMIT: "login", LOGIN_BUTTON: "menu", "text=My Schedule": "schedule"}.get(
+            selector, self.stage)
+        if selector.startswith("a[href="):
+            self.month += 1
+
+    def wait_for_load_state(self, state):
+        self.calls.append(("wait_for_load_state", state))
+
+    def wait_for_selector(self, selector, timeout):
+        self.calls.append(("wait_for_selector", selector, timeout))
+        if self.stage != "schedule" or not self.has_calendar:
+            raise PlaywrightTimeout(f"Page.wait_for_selector: Timeout {timeout}ms exceeded.")
+
+    def wait_for_function(self, js, arg=None):
+        self.calls.append(("wait_for_function", arg))
+        assert js == MONTH_CHANGED_JS
+
+    def title(self):
+        return "ESS Home"
+
+    def inner_text(self, selector):
+        return f"Month {self.month}"
+
+    def content(self):
+        return f"<html>month {self.month}</html>"
+
+    def evaluate(self, js, arg=None):
+        self.calls.append(("evaluate",))
+        assert js == NEXT_MONTH_JS
+        return NEXT_HREF
+
+
+class FakeLocator:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+
+    def is_visible(self, timeout):
+        self.page.calls.append(("is_visible", self.selector, timeout))
+        return (self.page.stage, self.selector) in (("venue", VENUE_INPUT), ("login", LOGIN_INPUT))
+
+    def count(self):
+        return 1 if self.page.stage == "menu" and self.selector == "text=My Schedule" else 0
+
+
+class FakeContext:
+    def storage_state(self):
+        return {"cookies": [{"name": "ASP.NET_SessionId", "value": "abc"}]}
+
+
+class Async:
+    """playwright.async_api look-alike around a fake: every call (but locator()) has to be awaited."""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        if name == "locator":
+            return lambda selector: Async(attr(selector))
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+
+
+def run_both(script, tmp_path=None, session=None, **page_options):
+    """
+    Runs the same page script on both engines, each with its own session file under `tmp_path`
+    (holding `session`, if given). Returns [(result, page, session file)], sync first.
+    """
+    results = []
+    for engine in (ESSScraper, AsyncESSScraper):
+        session_file = None
+        if tmp_path is not None:
+            session_file = str(tmp_path / f"{engine.__name__}.json")
+            if session is not None:
+                with open(session_file, "w") as f:
+                    json.dump(session, f)
+        scraper = engine("123", "u", "p", profile_mode="ephemeral", session_file=session_file,
+                         base_url=ESS, months_ahead=2)
+        page = FakePage(**page_options)
+        if engine is ESSScraper:
+            result = scraper._drive(page, script(scraper, FakeContext()))
+        else:
+            result = asyncio.run(scraper._drive(Async(page), script(scraper, Async(FakeContext()))))
+        results.append((result, page, session_file))
+    return results
+
+
+def open_schedule(scraper, context):
+    return scraper._open_schedule(context)
+
+
+def test_login_flow(tmp_path):
+    (result, page, _), (async_result, async_page, _) = results = run_both(open_schedule, tmp_path)
+    assert result is True and async_result is True
+    assert page.calls == async_page.calls
+    assert ("fill", VENUE_INPUT, "123") in page.calls
+    assert ("fill", LOGIN_INPUT, "u") in page.calls
+    assert ("click", "text=My Schedule") in page.calls
+    for _, _, session_file in results:
+        with open(session_file) as f:
+            snapshot = json.load(f)
+        assert snapshot["schedule_url"] == ESS
+        assert snapshot["state"]["cookies"][0]["value"] == "abc"
+
+
+def test_saved_session_skips_login(tmp_path):
+    session = {"schedule_url": ESS + "?schedule", "state": {}}
+    (result, page, _), (async_result, async_page, _) = run_both(open_schedule, tmp_path, session, logged_in=True)
+    assert result is True and async_result is True
+    assert page.calls == async_page.calls
+    assert page.calls[1] == ("goto", ESS + "?schedule")
+    assert not [call for call in page.calls if call[0] == "fill"]
+
+
+def test_failed_load_is_reloaded():
+    for result, page, _ in run_both(open_schedule, goto_fails=True):
+        assert result is True
+        assert page.calls[1:3] == [("goto", ESS), ("reload",)]
+
+
+def test_missing_calendar():
+    (result, page, _), (async_result, async_page, _) = run_both(open_schedule, has_calendar=False)
+    assert result is False and async_result is False
+    assert page.calls == async_page.calls
+
+
+@pytest.mark.parametrize("script, expected", [
+    (lambda scraper, context: scraper._month_links(), (NEXT_HREF, month_postbacks(NEXT_HREF, 2))),
+    (lambda scraper, context: scraper._next_month(NEXT_HREF), ("<html>month 2</html>", NEXT_HREF)),
+])
+def test_month_scripts(script, expected):
+    (result, page, _), (async_result, async_page, _) = run_both(script)
+    assert result == async_result == expected
+    assert page.calls == async_page.calls
@@ -0,0 +1,29 @@
+import pytest
+from playwright.sync_api import Error, TimeoutError as PlaywrightTimeout
+
+from portal import is_outage
+
+
+@pytest.mark.parametrize("error", [
+    PlaywrightTimeout("Page.goto: Timeout 20000ms exceeded."),
+    PlaywrightTimeout("Page.reload: Timeout 20000ms exceeded."),
+    Error("Page.goto: net::ERR_CONNECTION_REFUSED at https://ess.abimm.com/ABIMM_ASP/Request.aspx"),
+    Error("Page.click: net::ERR_CONNECTION_RESET"),
+    ConnectionResetError(104, "Connection reset by peer"),
+    TimeoutError("timed out"),
+])
+def test_outages(error):
+    assert is_outage(error)
+
+
+@pytest.mark.parametrize("error", [
+    # The login markup changed: ESS is up, the scraper is broken
+    PlaywrightTimeout("Page.click: Timeout 20000ms exceeded."),
+    PlaywrightTimeout("Page.fill: Timeout 20000ms exceeded."),
+    PlaywrightTimeout("Page.wait_for_selector: Timeout 10000ms exceeded."),
+    PlaywrightTimeout("Locator.is_visible: Timeout 5000ms exceeded."),
+    Error("Page.evaluate: TypeError: Cannot read properties of null"),
+    ValueError("no calendar"),
+])
+def test_page_problems_are_not_outages(error):
+    assert not is_outage(error)
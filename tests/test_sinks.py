@@ -0,0 +1,46 @@
+from sinks import IcsFileSink
+
+
+def write_feed(path, events, months):
+    sink = IcsFileSink(str(path))
+    statuses, _ = sink.sync(events)
+    return statuses, sink.finish(events, months)
+
+
+def uids(path):
+    return sorted(line[4:] for line in path.read_text(encoding="utf-8").splitlines() if line.startswith("UID:"))
+
+
+def test_partial_scrape_keeps_the_feed(tmp_path, shift, march):
+    feed = tmp_path / "shifts.ics"
+    april = [shift(2, "a2", month=4)]
+    write_feed(feed, [shift(1, "1"), shift(31, "31")] + april, march + ("2030-04",))
+    everything = uids(feed)
+
+    # April failed to load: no months were fully parsed, so nothing is dropped
+    statuses, removed = write_feed(feed, [shift(1, "1")], ())
+    assert statuses == ["SKIPPED"] and removed == []
+    assert uids(feed) == everything
+
+    # Only March was parsed: March's gone shift goes, April stays
+    statuses, removed = write_feed(feed, [shift(1, "1")], march)
+    assert removed == [("2030-03-31", "Concert", "DELETED")]
+    assert uids(feed) == sorted(f"{evt.key}@abi-bot" for evt in [shift(1, "1")] + april)
+
+
+def test_unchanged_feed_is_not_rewritten(tmp_path, shift, march):
+    feed = tmp_path / "shifts.ics"
+    write_feed(feed, [shift(1, "1"), shift(15, "15")], march)
+    before = feed.read_bytes()
+    statuses, removed = write_feed(feed, [shift(1, "1"), shift(15, "15")], march)
+    assert statuses == ["SKIPPED", "SKIPPED"] and removed == []
+    assert feed.read_bytes() == before
+
+
+def test_feed_defines_its_time_zone(tmp_path, shift, march):
+    feed = tmp_path / "shifts.ics"
+    write_feed(feed, [shift(1, "1")], march)
+    lines = feed.read_text(encoding="utf-8").splitlines()
+    assert lines.index("BEGIN:VTIMEZONE") < lines.index("BEGIN:VEVENT")
+    assert "TZID:America/Denver" in lines
+    assert "DTSTART;TZID=America/Denver:20300301T170000" in lines
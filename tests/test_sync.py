@@ -0,0 +1,91 @@
+import pytest
+
+from ledger import SyncLedger
+from sync import sync_shifts, delete_removed
+from scraper import complete_months
+
+
+class StubCalendar:
+    """Just enough of GoogleCalendarManager for sync_shifts(): events by ID, in memory."""
+
+    def __init__(self):
+        self.events = {}
+
+    def reconcile_events(self, events, unique_ids, incremental=False, progress=None, existing=None):
+        statuses = []
+        for evt, uid in zip(events, unique_ids):
+            statuses.append("SKIPPED" if uid in self.events else "ADDED")
+            self.events[uid] = evt
+        return statuses
+
+    def apply_changes(self, adds=(), updates=(), deletes=(), progress=None):
+        results = {'adds': [], 'updates': [], 'deletes': []}
+        for evt, event_id in updates:
+            self.events[event_id] = evt
+            results['updates'].append("UPDATED")
+        for event_id in deletes:
+            results['deletes'].append("DELETED" if self.events.pop(event_id, None) else "ERROR: 404")
+        return results
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = SyncLedger(str(tmp_path / "ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+@pytest.mark.parametrize("old_id, new_id", [(None, "123"), ("123", "456")])
+def test_rekeyed_shift_keeps_its_event(ledger, shift, march, old_id, new_id):
+    # Same shift, same Calendar event ID, but a new ledger key (it got an ESS ID, or ESS reissued it)
+    gcal = StubCalendar()
+    statuses, removed = sync_shifts(gcal, [shift(10, old_id)], ledger)
+    assert statuses == ["ADDED"]
+
+    statuses, removed = sync_shifts(gcal, [shift(10, new_id)], ledger)
+    assert statuses == ["SKIPPED"]
+    assert delete_removed(gcal, [shift(10, new_id)], ledger, march) == []
+    assert list(gcal.events) == [shift(10).event_id]
+
+    # The old key is gone from the ledger, so later runs don't try to delete the event either
+    assert ledger.plan([shift(10, new_id)], march)['superseded'] == []
+    statuses, removed = sync_shifts(gcal, [shift(10, new_id)], ledger)
+    assert statuses == ["SKIPPED"] and removed == []
+    assert list(gcal.events) == [shift(10).event_id]
+
+
+def test_sync_leaves_deletions_to_the_end_of_the_run(ledger, shift):
+    gcal = StubCalendar()
+    sync_shifts(gcal, [shift(1, "1"), shift(15, "15")], ledger)
+    assert sync_shifts(gcal, [shift(1, "1")], ledger) == (["SKIPPED"], [])
+    assert len(gcal.events) == 2
+
+
+@pytest.mark.parametrize("kept, gone", [((1, 15), 31), ((15, 31), 1)])
+def test_removed_at_the_month_edges(ledger, shift, march, kept, gone):
+    gcal = StubCalendar()
+    sync_shifts(gcal, [shift(day, str(day)) for day in (1, 15, 31)], ledger)
+
+    scraped = [shift(day, str(day)) for day in kept]
+    removed = delete_removed(gcal, scraped, ledger, march)
+    assert removed == [(f"2030-03-{gone:02d}", "Concert", "DELETED")]
+    assert shift(gone).event_id not in gcal.events
+    assert len(gcal.events) == 2
+
+
+def test_partial_scrape_deletes_nothing(ledger, shift):
+    gcal = StubCalendar()
+    april = [shift(2, "a2", month=4), shift(20, "a20", month=4)]
+    sync_shifts(gcal, [shift(1, "1"), shift(15, "15")] + april, ledger)
+
+    # Two months asked for, only March came back (April didn't load): nothing may go
+    scraped = [shift(1, "1")]
+    months = complete_months(["2030-03", None], months_ahead=1)
+    assert months == ()
+    assert delete_removed(gcal, scraped, ledger, months) == []
+    assert len(gcal.events) == 4
+
+    # A run that only covers March cleans up March and nothing else
+    assert delete_removed(gcal, scraped, ledger, complete_months(["2030-03"], 0)) == [
+        ("2030-03-15", "Concert", "DELETED")]
+    assert all(evt.event_id in gcal.events for evt in april)
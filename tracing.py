@@ -0,0 +1,184 @@
+"""
+Span tracing and an opt-in profiler for single runs.
+
+    with span("login"):
+        ...
+
+While a trace is running every span becomes a complete ("X") event in a
+Chrome trace-event file, which chrome://tracing and ui.perfetto.dev open
+directly. Spans on worker threads and asyncio tasks get their own track.
+With tracing off, span() hands back a shared no-op context manager, so the
+instrumentation costs one global lookup.
+
+profiled() marks the CPU-bound stages (parsing, fingerprints, diffing); with
+profiling on they run under one cProfile.Profile that is dumped at the end.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import datetime
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("ABI_Bot.Tracing")
+
+_NOOP = nullcontext()
+_tracer = None
+_profiler = None
+
+
+def run_path(directory, prefix, suffix):
+    """Timestamped file name for one run, e.g. traces/trace-20240101-120000.json."""
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{prefix}-{datetime.datetime.now():%Y%m%d-%H%M%S}{suffix}")
+
+
+class _Tracer:
+    def __init__(self, path):
+        self.path = path
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = []
+        self.tracks = {}
+        self._lock = threading.Lock()
+
+    def now_us(self):
+        return (time.perf_counter_ns() - self.origin) / 1000
+
+    def track(self):
+        """Track ID for the current asyncio task, or the current thread outside of one."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = ("task", id(task)) if task else ("thread", threading.get_ident())
+        tid = self.tracks.get(key)
+        if tid is None:
+            with self._lock:
+                tid = self.tracks.setdefault(key, len(self.tracks) + 1)
+            label = task.get_name() if task else threading.current_thread().name
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                                "args": {"name": label}})
+        return tid
+
+    def write(self):
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def _span(tracer, name, cat, args):
+    tid = tracer.track()
+    started = tracer.now_us()
+    try:
+        yield
+    except BaseException as e:
+        args = dict(args, error=type(e).__name__)
+        raise
+    finally:
+        # list.append is atomic, spans from other threads can't interleave badly
+        tracer.events.append({"name": name, "cat": cat, "ph": "X", "ts": started,
+                              "dur": tracer.now_us() - started, "pid": tracer.pid, "tid": tid, "args": args})
+
+
+def span(name, cat="bot", **args):
+    """Times the with-block as one trace event when tracing is on."""
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP
+    return _span(tracer, name, cat, args)
+
+
+def traced(name, cat="bot"):
+    """Decorator version of span() for whole functions."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(*args, **kwargs)
+            with _span(tracer, name, cat, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _Profiler:
+    def __init__(self, path):
+        import cProfile
+
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.owner = None
+        self.depth = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def run(self):
+        me = threading.get_ident()
+        with self._lock:
+            # One profiler at a time: another thread's stage just runs unprofiled
+            if self.owner not in (None, me):
+                mine = False
+            else:
+                mine = True
+                self.owner = me
+                self.depth += 1
+                if self.depth == 1:
+                    try:
+                        self.profile.enable()
+                    except ValueError:
+                        # Some other profiler (a debugger, coverage) is already active
+                        self.depth, self.owner, mine = 0, None, False
+        try:
+            yield
+        finally:
+            if mine:
+                with self._lock:
+                    self.depth -= 1
+                    if self.depth == 0:
+                        self.profile.disable()
+                        self.owner = None
+
+
+def profiled():
+    """Marks a CPU-bound stage; runs it under cProfile when profiling is on."""
+    profiler = _profiler
+    if profiler is None:
+        return _NOOP
+    return profiler.run()
+
+
+def start(trace_path=None, profile_path=None):
+    """Starts tracing to `trace_path` and/or profiling to `profile_path` for this run."""
+    global _tracer, _profiler
+    if trace_path:
+        _tracer = _Tracer(trace_path)
+    if profile_path:
+        _profiler = _Profiler(profile_path)
+
+
+def finish():
+    """Stops tracing and profiling and writes the files. Returns the paths written."""
+    global _tracer, _profiler
+    tracer, profiler = _tracer, _profiler
+    _tracer = _profiler = None
+    written = []
+    if tracer:
+        try:
+            tracer.write()
+            written.append(tracer.path)
+            logger.info(f"Trace written to {tracer.path} ({len(tracer.events)} events)")
+        except OSError as e:
+            logger.warning(f"Could not write trace: {e}")
+    if profiler:
+        try:
+            profiler.profile.dump_stats(profiler.path)
+            written.append(profiler.path)
+            logger.info(f"Profile written to {profiler.path} (python -m pstats {profiler.path})")
+        except OSError as e:
+            logger.warning(f"Could not write profile: {e}")
+    return written
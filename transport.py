@@ -0,0 +1,158 @@
+"""
+Retry, backoff and client-side pacing for Google Calendar API calls.
+
+Errors are classified from the HttpError status and reason instead of the
+message text. Rate limits and transient server/network failures are retried
+with jittered exponential backoff, and RateLimiter keeps the request rate
+under a QPS budget that shrinks when Google pushes back and grows again
+while calls succeed.
+"""
+import json
+import time
+import random
+import logging
+import threading
+
+from metrics import CALENDAR_SECONDS
+from tracing import span
+
+logger = logging.getLogger("ABI_Bot.Transport")
+
+# Outcome classes returned by classify_error()
+DUPLICATE = "duplicate"
+NOT_FOUND = "not_found"
+GONE = "gone"
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+RETRYABLE = (RATE_LIMITED, TRANSIENT)
+
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+def error_reason(exc):
+    """First 'reason' from a Google API error payload, or None."""
+    details = getattr(exc, "error_details", None)
+    if isinstance(details, list):
+        for item in details:
+            if isinstance(item, dict) and item.get("reason"):
+                return item["reason"]
+    content = getattr(exc, "content", None)
+    if content:
+        try:
+            error = json.loads(content.decode("utf-8") if isinstance(content, bytes) else content)["error"]
+            for item in error.get("errors", []):
+                if item.get("reason"):
+                    return item["reason"]
+            return error.get("status")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+    return None
+
+
+def classify_error(exc):
+    """Maps an exception from a Calendar call to one of the outcome classes above."""
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    if status is None:
+        # No HTTP response at all: dropped connection, timeout, DNS hiccup
+        if isinstance(exc, OSError) or type(exc).__module__.split(".")[0] == "httplib2":
+            return TRANSIENT
+        return FATAL
+
+    status = int(status)
+    if status == 409:
+        return DUPLICATE
+    if status == 404:
+        return NOT_FOUND
+    if status == 410:
+        return GONE
+    if status == 429:
+        return RATE_LIMITED
+    if status == 403 and error_reason(exc) in RATE_LIMIT_REASONS:
+        return RATE_LIMITED
+    if status >= 500:
+        return TRANSIENT
+    return FATAL
+
+
+def backoff_delay(attempt, base=1.0, cap=32.0):
+    """Full-jitter exponential backoff: uniform between 0 and min(cap, base * 2^attempt)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimiter:
+    """
+    Token bucket that paces API calls under `max_qps`.
+    The rate is halved whenever a call is rate limited and creeps back up
+    by `increase` QPS per successful round, never below `min_qps`.
+    Up to `burst_seconds` worth of calls may go out at once.
+    """
+
+    def __init__(self, max_qps=10.0, min_qps=0.5, increase=0.5, burst_seconds=5.0):
+        self.max_qps = float(max_qps)
+        self.min_qps = min(float(min_qps), self.max_qps)
+        self.increase = increase
+        self.burst_seconds = burst_seconds
+        self.rate = self.max_qps
+        self.tokens = self.rate * burst_seconds
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate * self.burst_seconds, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, n=1):
+        """Takes n tokens, sleeping until the bucket can pay for them."""
+        with self._lock:
+            self._refill()
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_rate_limited(self):
+        with self._lock:
+            self.rate = max(self.min_qps, self.rate / 2)
+            # Drop any saved-up burst so the next round really slows down
+            self.tokens = min(self.tokens, 0.0)
+        logger.warning(f"Rate limited by Google, pacing at {self.rate:.1f} requests/s")
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_qps, self.rate + self.increase)
+
+
+def execute_with_retry(request, limiter=None, max_retries=5, sleep=time.sleep):
+    """Executes a single googleapiclient request, retrying rate limits and transient failures."""
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        try:
+            method = _method_name(request)
+            with CALENDAR_SECONDS.time(method=method), span(f"gcal.{method}", cat="calendar", attempt=attempt):
+                result = request.execute()
+        except Exception as e:
+            kind = classify_error(e)
+            if kind not in RETRYABLE or attempt >= max_retries:
+                raise
+            if kind == RATE_LIMITED and limiter:
+                limiter.on_rate_limited()
+            delay = backoff_delay(attempt)
+            logger.info(f"Retrying after {kind} error in {delay:.1f}s: {e}")
+            sleep(delay)
+            attempt += 1
+            continue
+        if limiter:
+            limiter.on_success()
+        return result
+
+
+def _method_name(request):
+    """'events.list' for a calendar.events.list request."""
+    method = getattr(request, "methodId", None) or "unknown"
+    return method.split(".", 1)[-1] if method.startswith("calendar.") else method
@@ -5,80 +5,64 @@ import subprocess
 import sys
 import os
 import threading
-import time
-from dotenv import load_dotenv
-
-# Global lock to prevent simultaneous syncs settings
-sync_lock = threading.Lock()
-stop_event = threading.Event()
-
-def get_interval():
-    """Load interval from .env, default to 24 hours."""
-    env_path = os.path.join(os.path.dirname(__file__), ".env")
-    # Reload env file manually to get fresh values
-    vals = {}
-    if os.path.exists(env_path):
-        with open(env_path, "r") as f:
-            for line in f:
-                if "=" in line:
-                    k, v = line.strip().split("=", 1)
-                    vals[k] = v
-    
+import logging
+
+from utils import setup_logging, load_config
+import metrics
+from worker import SyncWorker
+from scheduler import AdaptiveScheduler
+
+# Created in main(); keeps Google auth (and optionally the browser) warm between syncs
+worker = None
+# Created in main(); decides when the next sync runs
+scheduler = None
+tray_icon = None
+
+def describe_result(result):
+    """Short notification text for a worker result."""
+    if result.get("unavailable"):
+        retry = f" (retrying in {result['retry_in'] / 60:.0f} min)" if result.get("retry_in") is not None else ""
+        return f"{result['error']}{retry}"
+    if result.get("error"):
+        return f"Sync Failed: {result['error']}"
+    if result.get("unchanged"):
+        return f"Schedule unchanged ({result['duration']:.0f}s)"
+    counts = result.get("counts", {})
+    parts = [f"{counts[k]} {k.lower()}" for k in ("ADDED", "UPDATED", "DELETED", "ERROR") if counts.get(k)]
+    unchanged = counts.get("SKIPPED", 0)
+    if unchanged:
+        parts.append(f"{unchanged} unchanged")
+    return f"Sync Complete: {', '.join(parts) or 'nothing to do'} ({result['duration']:.0f}s)"
+
+def run_sync_process(manual=False):
+    """Runs one sync on the warm worker (called from the scheduler thread). Returns the result."""
+    icon = tray_icon
     try:
-        return float(vals.get("SYNC_INTERVAL_HOURS", 24))
-    except:
-        return 24.0
+        if icon:
+            icon.notify("Starting Sync...", "ABI Bot")
+
+        result = worker.submit().result()
 
-def run_sync_process(icon=None):
-    """Runs the sync process safely."""
-    if sync_lock.acquire(blocking=False):
-        try:
-            if icon:
-                icon.notify("Starting Sync...", "ABI Bot")
-            
-            # Run main.py
-            subprocess.run(
-                [sys.executable, "main.py"],
-                cwd=os.path.dirname(os.path.abspath(__file__)),
-                creationflags=subprocess.CREATE_NO_WINDOW # Run mostly silent for background
-            )
-            
-            if icon:
-                icon.notify("Sync Complete!", "ABI Bot")
-                
-        except Exception as e:
-            if icon:
-                icon.notify(f"Sync Failed: {e}", "Error")
-        finally:
-            sync_lock.release()
-    else:
         if icon:
-            icon.notify("Sync already in progress.", "ABI Bot")
+            icon.notify(describe_result(result), "ABI Bot" if not result.get("error") else "Error")
+        return result
+    except Exception as e:
+        if icon:
+            icon.notify(f"Sync Failed: {e}", "Error")
+        return None
 
-def scheduler_loop(icon):
-    """Background loop to run sync at intervals."""
-    last_run = 0
-    
-    while not stop_event.is_set():
-        interval_hours = get_interval()
-        interval_seconds = interval_hours * 3600
-        
-        now = time.time()
-        
-        # If never run, or time elapsed
-        if (now - last_run) > interval_seconds:
-            # We delay the VERY first run slightly to let system startup finish if needed, 
-            # but user wants "forever start at system startup", implying active usage.
-            # Let's run.
-            print(f"Auto-sync triggering. Interval: {interval_hours}h")
-            run_sync_process(icon) # Optional: Don't notify on auto-runs to avoid spam? 
-            # User might want to know. Let's keep notifications for now or simple log.
-            # actually run_sync_process sends notifications.
-            
-            last_run = time.time()
-        
-        # Check every minute
-        time.sleep(60)
+def start_metrics():
+    """Restores saved metrics and, with METRICS_PORT set, serves them on localhost."""
+    try:
+        config = load_config()
+    except ValueError:
+        return
+    metrics.setup(config)
+    if config["metrics_port"]:
+        try:
+            metrics.serve(config["metrics_port"])
+        except OSError as e:
+            logging.getLogger("ABI_Bot.Tray").warning(f"Metrics endpoint not started: {e}")
 
 def create_image(width, height, color1, color2):
     image = Image.new('RGB', (width, height), color1)
@@ -92,29 +76,45 @@ def create_image(width, height, color1, color2):
     return image
 
 def on_sync(icon, item):
-    # Run in thread so we don't block the UI loop for the few seconds checks take
-    threading.Thread(target=run_sync_process, args=(icon,)).start()
+    # A pending automatic run is pulled forward rather than queued behind this one
+    if not scheduler.request_now():
+        icon.notify("Sync already in progress.", "ABI Bot")
 
 def on_settings(icon, item):
     try:
-        subprocess.Popen(
+        proc = subprocess.Popen(
             [sys.executable, "settings_ui.py"],
             cwd=os.path.dirname(os.path.abspath(__file__))
         )
     except Exception as e:
         icon.notify(f"Failed to launch settings: {e}", "Error")
+        return
+
+    # Let the scheduler pick up a new interval as soon as the window closes
+    def wait_for_settings():
+        proc.wait()
+        scheduler.config_changed()
+    threading.Thread(target=wait_for_settings, daemon=True).start()
 
 def on_exit(icon, item):
-    stop_event.set()
+    scheduler.stop()
     icon.stop()
+    worker.stop()
 
 def setup(icon):
+    global tray_icon
     icon.visible = True
-    # Start scheduler thread
-    t = threading.Thread(target=scheduler_loop, args=(icon,), daemon=True)
-    t.start()
+    tray_icon = icon
+    scheduler.start()
 
 def main():
+    global worker, scheduler
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    setup_logging()
+    worker = SyncWorker()
+    scheduler = AdaptiveScheduler(run_sync_process)
+    start_metrics()
+
     image = create_image(64, 64, 'black', 'orange')
     
     menu = (
@@ -1,21 +1,33 @@
 import os
 import hashlib
 import logging
-from rich.logging import RichHandler
-from dotenv import load_dotenv
-
-# Load env immediately
-load_dotenv()
-
-def setup_logging():
-    """Configures logging to file and console."""
-    logging.basicConfig(
-        level="INFO",
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.FileHandler("bot.log"),
-            RichHandler(rich_tracebacks=True, markup=True)
-        ]
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+# Variables set by the shell always win over .env (same as load_dotenv's default)
+_SHELL_ENV = set(os.environ)
+_loaded_keys = None
+
+def _ensure_env():
+    """Loads .env the first time a setting is read instead of at import."""
+    if _loaded_keys is None:
+        reload_env()
+
+def setup_logging(console=True):
+    """
+    Configures logging to the rotating log file (LOG_* settings, see logs.py)
+    and, with a terminal attached, the console. Without `console` (JSON output
+    on stdout) only warnings and errors go to stderr, as plain text.
+    """
+    import logs
+
+    logs.setup(
+        path=get_env("LOG_FILE", "bot.log"),
+        fmt=get_env("LOG_FORMAT", "text").strip().lower(),
+        rotate=get_env("LOG_ROTATE", "size").strip().lower(),
+        max_mb=float(get_env("LOG_MAX_MB", "5")),
+        backups=int(get_env("LOG_BACKUPS", "5")),
+        console=console,
     )
     return logging.getLogger("ABI_Bot")
 
@@ -24,8 +36,147 @@ def generate_event_id(summary, start_dt, end_dt):
     base_str = f"{summary}{start_dt.isoformat()}{end_dt.isoformat()}"
     return hashlib.md5(base_str.encode('utf-8')).hexdigest()
 
+def process_tree_rss_mb(children_only=False):
+    """
+    Resident memory of this process plus its children (Chromium) in MB, or with
+    `children_only` just the children (the Playwright driver and the browsers).
+    Uses psutil when installed, /proc on Linux otherwise. None if it can't be measured.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return _proc_tree_rss_mb(children_only)
+    try:
+        me = psutil.Process()
+        procs = ([] if children_only else [me]) + me.children(recursive=True)
+        total = 0
+        for proc in procs:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+    except psutil.Error:
+        return None
+
+def _proc_tree_rss_mb(children_only=False):
+    if not os.path.isdir("/proc/self"):
+        return None
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name may contain spaces, the parent PID comes right after its ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    todo = list(children.get(os.getpid(), ())) if children_only else [os.getpid()]
+    while todo:
+        pid = todo.pop()
+        todo.extend(children.get(pid, ()))
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+    return total / (1024 * 1024)
+
 def get_env(key, default=None, required=False):
+    _ensure_env()
     val = os.getenv(key, default)
     if required and not val:
         raise ValueError(f"Missing required environment variable: {key}")
     return val
+
+def reload_env():
+    """Re-reads .env into the environment so long-running processes see saved settings."""
+    global _loaded_keys
+    from dotenv import dotenv_values
+
+    values = {k: v for k, v in dotenv_values(ENV_PATH).items() if v is not None and k not in _SHELL_ENV}
+    for key in (_loaded_keys or set()) - set(values):
+        os.environ.pop(key, None)
+    os.environ.update(values)
+    _loaded_keys = set(values)
+
+def load_config(require_account=True):
+    """
+    Reads all bot settings from the environment. Raises ValueError on missing or bad values.
+    Fleet mode reads the ESS logins from its accounts file and passes require_account=False.
+    """
+    def flag(key, default):
+        return get_env(key, default).lower() == "true"
+
+    config = {
+        "venue_id": get_env("ESS_VENUE_ID", required=require_account),
+        "username": get_env("ESS_USERNAME", required=require_account),
+        "password": get_env("ESS_PASSWORD", required=require_account),
+        "headless": flag("HEADLESS", "False"),
+        "incremental": flag("GCAL_INCREMENTAL", "False"),
+        "use_ledger": flag("SYNC_LEDGER", "True"),
+        "months_ahead": int(get_env("SYNC_MONTHS_AHEAD", "1")),
+        "parser_backend": get_env("PARSER_BACKEND", "auto"),
+        "block_resources": flag("BLOCK_RESOURCES", "True"),
+        "block_allow": [a.strip() for a in get_env("BLOCK_ALLOW", "").split(",") if a.strip()],
+        "profile_mode": get_env("PROFILE_MODE", "persistent").lower(),
+        "session_file": "ess_session.json" if flag("SESSION_REUSE", "True") else None,
+        "fingerprint_file": "schedule_fingerprints.json" if flag("SKIP_UNCHANGED", "True") else None,
+        "engine": get_env("SCRAPER_ENGINE", "playwright").lower(),
+        "warm_browser": flag("WARM_BROWSER", "False"),
+        "gcal_max_qps": float(get_env("GCAL_MAX_QPS", "10")),
+        "gcal_max_retries": int(get_env("GCAL_MAX_RETRIES", "5")),
+        "pipeline": get_env("SYNC_PIPELINE", "sequential").lower(),
+        "fleet_accounts_file": get_env("FLEET_ACCOUNTS_FILE", "accounts.json"),
+        "fleet_workers": int(get_env("FLEET_WORKERS", "3")),
+        "fleet_memory_mb": int(get_env("FLEET_MEMORY_MB", "0")),
+        "metrics_textfile": get_env("METRICS_TEXTFILE", "") or None,
+        "metrics_port": int(get_env("METRICS_PORT", "0")),
+        "trace_dir": get_env("TRACE_DIR", "") or None,
+        "calendar_ids": calendar_ids(get_env("GOOGLE_CALENDAR_ID", "primary")),
+        "ics_file": get_env("ICS_FILE", "") or None,
+        "ess_probe": flag("ESS_PROBE", "True"),
+        "ess_probe_timeout": float(get_env("ESS_PROBE_TIMEOUT", "5")),
+        "ess_breaker_file": "ess_breaker.json" if flag("ESS_BREAKER", "True") else None,
+        "ess_retry_minutes": float(get_env("ESS_RETRY_MINUTES", "5")),
+        "ess_max_retry_hours": float(get_env("ESS_MAX_RETRY_HOURS", "6")),
+        "browser_low_memory": flag("BROWSER_LOW_MEMORY", "True"),
+        "browser_max_pages": int(get_env("BROWSER_MAX_PAGES", "2")),
+        "browser_max_contexts": int(get_env("BROWSER_MAX_CONTEXTS", "0")),
+        "browser_recycle_runs": int(get_env("BROWSER_RECYCLE_RUNS", "20")),
+        "browser_recycle_mb": int(get_env("BROWSER_RECYCLE_MB", "1024")),
+        # Stand-in servers for offline runs (benchmarks/bench_e2e.py); empty means the real ones
+        "ess_url": get_env("ESS_URL", "") or None,
+        "gcal_api_url": get_env("GCAL_API_URL", "") or None,
+    }
+    if config["gcal_max_qps"] <= 0:
+        raise ValueError("GCAL_MAX_QPS must be greater than 0")
+    if config["engine"] not in ("playwright", "http"):
+        raise ValueError("SCRAPER_ENGINE must be 'playwright' or 'http'")
+    if config["pipeline"] not in ("sequential", "async"):
+        raise ValueError("SYNC_PIPELINE must be 'sequential' or 'async'")
+    # Imported here: ess_parser needs utils itself (through shift)
+    from ess_parser import resolve_backend
+    try:
+        resolve_backend(config["parser_backend"])
+    except (ValueError, ImportError) as e:
+        raise ValueError(f"PARSER_BACKEND: {e}")
+    if config["fleet_workers"] < 1:
+        raise ValueError("FLEET_WORKERS must be at least 1")
+    if config["ess_probe_timeout"] <= 0:
+        raise ValueError("ESS_PROBE_TIMEOUT must be greater than 0")
+    if not config["calendar_ids"] and not config["ics_file"]:
+        raise ValueError("Nothing to sync to: set GOOGLE_CALENDAR_ID and/or ICS_FILE")
+    return config
+
+def calendar_ids(value):
+    """GOOGLE_CALENDAR_ID as a list: comma separated IDs, 'none' (or empty) for no Google calendar."""
+    if isinstance(value, str):
+        value = value.split(",")
+    ids = [v.strip() for v in value if v and v.strip()]
+    return [] if [v.lower() for v in ids] == ["none"] else ids
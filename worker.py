@@ -0,0 +1,280 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+from utils import load_config, reload_env
+from scraper import ESSScraper, RequestFilter, ESS_URL
+from portal import PortalGuard, CircuitBreaker, PortalUnavailable
+from governor import BrowserGovernor
+from gcal import GoogleCalendarManager
+from sync import sync_succeeded
+from sinks import build_sinks
+from fingerprint import FingerprintStore, ScheduleUnchanged
+from tracing import span
+import tracing
+import metrics
+
+logger = logging.getLogger("ABI_Bot.Worker")
+
+
+def portal_guard(config):
+    """The ESS probe and circuit breaker for `config` (see portal.py), None with both turned off."""
+    if not config["ess_probe"] and not config["ess_breaker_file"]:
+        return None
+    breaker = None
+    if config["ess_breaker_file"]:
+        breaker = CircuitBreaker(config["ess_breaker_file"], base_delay=config["ess_retry_minutes"] * 60,
+                                 max_delay=config["ess_max_retry_hours"] * 3600)
+    return PortalGuard(config["ess_url"] or ESS_URL, breaker, timeout=config["ess_probe_timeout"],
+                       probe=config["ess_probe"])
+
+
+def browser_governor(config):
+    """The BrowserGovernor for `config` (BROWSER_* settings, see governor.py)."""
+    return BrowserGovernor(
+        low_memory=config["browser_low_memory"], max_pages=config["browser_max_pages"],
+        max_contexts=config["browser_max_contexts"], recycle_runs=config["browser_recycle_runs"],
+        recycle_mb=config["browser_recycle_mb"],
+    )
+
+
+def browser_options(config, force=False):
+    """
+    ESSScraper keyword arguments for `config` (see utils.load_config).
+    `force` syncs even when the schedule fingerprints match the last sync.
+    """
+    return dict(
+        venue_id=config["venue_id"], username=config["username"], password=config["password"],
+        base_url=config["ess_url"] or ESS_URL, headless=config["headless"], months_ahead=config["months_ahead"],
+        parser_backend=config["parser_backend"],
+        request_filter=RequestFilter(allow=config["block_allow"]) if config["block_resources"] else None,
+        profile_mode=config["profile_mode"], session_file=config["session_file"],
+        fingerprints=(FingerprintStore(config["fingerprint_file"], targets=[config["calendar_ids"], config["ics_file"]])
+                      if config["fingerprint_file"] else None),
+        force=force, portal=portal_guard(config), governor=browser_governor(config),
+    )
+
+
+def build_scraper(config, keep_alive=False, force=False):
+    """
+    Creates the scraper engine described by `config` (see utils.load_config).
+    scrape_schedule() raises ScheduleUnchanged when no month changed since the last sync
+    and PortalUnavailable when ESS is down (see portal.py).
+    """
+    options = browser_options(config, force=force)
+    scraper = ESSScraper(keep_alive=keep_alive, **options)
+    if config["engine"] == "http":
+        from http_scraper import HTTPScraper
+
+        # Browserless first, Chromium only if the portal serves something unexpected
+        scraper = HTTPScraper(
+            config["venue_id"], config["username"], config["password"],
+            months_ahead=config["months_ahead"], parser_backend=config["parser_backend"], base_url=options["base_url"],
+            fallback=scraper, fingerprints=options["fingerprints"], force=force, portal=options["portal"]
+        )
+    return scraper
+
+
+def sync_scraped(config, gcal, events, progress=None, fingerprints=None, months=()):
+    """
+    Syncs `events` to every configured sink (see sinks.build_sinks) at once.
+    `gcal` is the authenticated manager, or None without Google calendars.
+    `fingerprints` (the scraper's FingerprintStore) is committed if everything synced.
+    `months` (the scraper's .months) are the months shifts may be deleted in.
+    """
+    sink = build_sinks(config, gcal)
+    try:
+        statuses, removed = sink.sync(events, progress)
+        removed = removed + sink.finish(events, months)
+        if fingerprints and sync_succeeded(statuses, removed):
+            fingerprints.commit()
+        return statuses, removed
+    finally:
+        sink.close()
+
+
+def summarize(statuses, removed):
+    """Counts per status, with every ERROR: ... folded into ERROR."""
+    counts = {}
+    for status in list(statuses) + [status for _, _, status in removed]:
+        key = "ERROR" if status.startswith("ERROR") else status
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+class SyncWorker:
+    """
+    Long-lived sync worker for the tray agent.
+    Jobs run one at a time on a dedicated thread that keeps the authenticated
+    Calendar service and, with WARM_BROWSER=True, a running Chromium between
+    runs. Playwright's sync API is bound to the thread that started it, which
+    is why every job runs on this one thread.
+    """
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sync-worker", daemon=True)
+        self._gcal = None
+        self._scraper = None
+        self._scraper_config = None
+        self._busy = threading.Event()
+        self._config = None
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._busy.is_set()
+
+    def submit(self, on_progress=None, on_result=None):
+        """
+        Queues a sync. on_progress(stage, done, total) reports progress,
+        on_result(result) gets the result dict. Returns a Future for the result.
+        """
+        future = Future()
+        self._jobs.put((future, on_progress, on_result))
+        return future
+
+    def stop(self):
+        self._jobs.put(None)
+        self._thread.join(timeout=30)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, on_progress, on_result = job
+            self._busy.set()
+            try:
+                result = self._sync(on_progress)
+            except Exception as e:
+                logger.exception("Sync job crashed")
+                result = {"ok": False, "error": str(e), "events": 0, "counts": {}, "duration": 0.0}
+            finally:
+                self._busy.clear()
+            metrics.record_run(result["ok"], result["duration"], unchanged=result.get("unchanged", False),
+                               textfile=self._config["metrics_textfile"] if self._config else None,
+                               unavailable=result.get("unavailable", False))
+            if on_result:
+                try:
+                    on_result(result)
+                except Exception as e:
+                    logger.error(f"Result callback failed: {e}")
+            future.set_result(result)
+        self._close_scraper()
+
+    def _sync(self, on_progress):
+        def report(stage, done=0, total=0):
+            if on_progress:
+                on_progress(stage, done, total)
+
+        started = time.time()
+        reload_env()
+        config = self._config = load_config()
+        if not config["trace_dir"]:
+            return self._sync_job(config, report, started)
+
+        # TRACE_DIR: one trace file per tray sync
+        tracing.start(trace_path=tracing.run_path(config["trace_dir"], "trace", ".json"))
+        try:
+            with span("tray.sync", pipeline=config["pipeline"], engine=config["engine"]):
+                return self._sync_job(config, report, started)
+        finally:
+            tracing.finish()
+
+    def _sync_job(self, config, report, started):
+        if config["calendar_ids"] and (self._gcal is None or not self._gcal.service):
+            report("auth")
+            self._gcal = GoogleCalendarManager(
+                max_qps=config["gcal_max_qps"], max_retries=config["gcal_max_retries"],
+                api_url=config["gcal_api_url"]
+            )
+            if not self._gcal.service:
+                raise RuntimeError("Google Calendar is not authorized (run main.py once)")
+
+        if config["pipeline"] == "async":
+            return self._sync_async(config, report, started)
+
+        report("scrape")
+        scraper = self._get_scraper(config)
+        try:
+            events = scraper.scrape_schedule()
+        except ScheduleUnchanged:
+            return self._unchanged(started)
+        except PortalUnavailable as e:
+            return self._unavailable(e, started)
+        finally:
+            if not config["warm_browser"]:
+                self._close_scraper()
+        if not events:
+            return {"ok": False, "error": "No events found or scraping failed",
+                    "events": 0, "counts": {}, "duration": time.time() - started}
+
+        report("sync", 0, len(events))
+        done = [0]
+
+        def on_event(i, status):
+            done[0] += 1
+            report("sync", done[0], len(events))
+
+        statuses, removed = sync_scraped(config, self._gcal, events, progress=on_event,
+                                         fingerprints=scraper.fingerprints, months=scraper.months)
+        counts = summarize(statuses, removed)
+        return {"ok": not counts.get("ERROR"), "error": None, "events": len(events), "counts": counts,
+                "duration": time.time() - started}
+
+    def _sync_async(self, config, report, started):
+        """SYNC_PIPELINE=async: scrape and sync overlapped. The browser is never kept warm here."""
+        from pipeline import run_pipeline
+
+        self._close_scraper()
+        report("scrape")
+        done = [0]
+
+        def on_event(evt, status):
+            # Called from sync threads, the total isn't known until the scrape ends
+            done[0] += 1
+            report("sync", done[0], 0)
+
+        try:
+            events, statuses, removed = asyncio.run(run_pipeline(config, gcal=self._gcal, on_event=on_event))
+        except ScheduleUnchanged:
+            return self._unchanged(started)
+        except PortalUnavailable as e:
+            return self._unavailable(e, started)
+        if not events:
+            return {"ok": False, "error": "No events found or scraping failed",
+                    "events": 0, "counts": {}, "duration": time.time() - started}
+        counts = summarize(statuses, removed)
+        return {"ok": not counts.get("ERROR"), "error": None, "events": len(events), "counts": counts,
+                "duration": time.time() - started}
+
+    def _unchanged(self, started):
+        return {"ok": True, "error": None, "unchanged": True, "events": 0, "counts": {},
+                "duration": time.time() - started}
+
+    def _unavailable(self, error, started):
+        # Not "no events": the scheduler comes back when the breaker allows the next try
+        return {"ok": False, "error": str(error), "unavailable": True, "retry_in": error.retry_in,
+                "events": 0, "counts": {}, "duration": time.time() - started}
+
+    def _get_scraper(self, config):
+        # Settings changed since the browser was started, start over with the new ones
+        if self._scraper is not None and config != self._scraper_config:
+            self._close_scraper()
+        if self._scraper is None:
+            self._scraper = build_scraper(config, keep_alive=config["warm_browser"])
+            self._scraper_config = config
+        return self._scraper
+
+    def _close_scraper(self):
+        if self._scraper is None:
+            return
+        browser = getattr(self._scraper, "fallback", None) or self._scraper
+        if hasattr(browser, "close"):
+            browser.close()
+        self._scraper = None
+        self._scraper_config = None